@@ -0,0 +1,306 @@
+"""
+Priority-aware admission control for the model-backed endpoints.
+
+Every request that runs an agent or model call is admitted by one scheduler
+before its handler runs, in one of three priority classes:
+
+    interactive  /chat, /chat/stream, /submit-onboarding (a player is waiting)
+    standard     titles, prologues, content validation, narrative enhancement
+    background   compiles, gameplay simulation, book validation
+
+The scheduler runs at most TOTAL_SLOTS requests at once. A free slot goes to the
+highest-priority class with a queued request that is under its own max_running.
+The standard and background caps are well below TOTAL_SLOTS, so authoring load
+can never take the capacity interactive turns need. Within a class, users share
+slots by weighted fair queuing rather than arrival order, so one author queueing
+ten compiles doesn't delay everyone else's. A user's weight is 1 unless it is
+set in LITREALMS_ADMISSION_USER_WEIGHTS (e.g. "alice=2,bob=0.5").
+
+Requests are identified by user through the X-LitRealms-User header, falling
+back to the client address. A request is turned away rather than queued when:
+- its user already has max_queued_per_user requests waiting in the class (429);
+- the class queue holds max_queue requests (503);
+- it waited max_wait seconds without getting a slot (503).
+Each rejection carries a Retry-After estimated from the class's recent service
+times. Queue time per class is recorded as admission.{class}.queue and the
+rejection rate as admission.{class}.rejected (mean = fraction rejected).
+
+Submitting a background job (?async=true, see jobs.py) isn't admitted - it returns
+at once - but the job is, in the background class, when a worker runs it.
+Admission is per process, like the LLM gateway's limits it sits in front of.
+"""
+
+import asyncio
+import math
+import os
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import parse_qs
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+import metrics
+
+INTERACTIVE = 'interactive'
+STANDARD = 'standard'
+BACKGROUND = 'background'
+
+ENABLED = os.getenv("LITREALMS_ADMISSION", "1") != "0"
+TOTAL_SLOTS = int(os.getenv("LITREALMS_ADMISSION_SLOTS", os.getenv("LITREALMS_LLM_CONCURRENCY", "32")))
+USER_HEADER = b"x-litrealms-user"
+
+USER_WEIGHTS: Dict[str, float] = {}
+for _entry in filter(None, os.getenv("LITREALMS_ADMISSION_USER_WEIGHTS", "").split(",")):
+    _user, _weight = _entry.split("=", 1)
+    USER_WEIGHTS[_user.strip()] = float(_weight)
+
+
+class PriorityClass:
+    def __init__(self, name: str, rank: int, max_running: int, max_queue: int, max_queued_per_user: int, max_wait: float):
+        self.name = name
+        self.rank = rank  # lower is served first
+        self.max_running = max_running
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait  # seconds
+
+        self.running = 0
+        self.queued = 0
+        self.queues: Dict[str, Deque[asyncio.Future]] = {}  # user -> waiting requests, oldest first
+        self.finish: Dict[str, float] = {}  # user -> virtual finish time of their last admitted request
+        self.virtual_time = 0.0
+        self.service_time = 5.0  # moving average of seconds a request holds its slot
+
+
+CLASSES: Dict[str, PriorityClass] = {
+    INTERACTIVE: PriorityClass(
+        INTERACTIVE, 0,
+        max_running=int(os.getenv("LITREALMS_ADMISSION_INTERACTIVE_RUNNING", str(TOTAL_SLOTS))),
+        max_queue=int(os.getenv("LITREALMS_ADMISSION_INTERACTIVE_QUEUE", "256")),
+        max_queued_per_user=16,
+        max_wait=30.0,
+    ),
+    STANDARD: PriorityClass(
+        STANDARD, 1,
+        max_running=int(os.getenv("LITREALMS_ADMISSION_STANDARD_RUNNING", "8")),
+        max_queue=int(os.getenv("LITREALMS_ADMISSION_STANDARD_QUEUE", "64")),
+        max_queued_per_user=4,
+        max_wait=60.0,
+    ),
+    BACKGROUND: PriorityClass(
+        BACKGROUND, 2,
+        max_running=int(os.getenv("LITREALMS_ADMISSION_BACKGROUND_RUNNING", "4")),
+        max_queue=int(os.getenv("LITREALMS_ADMISSION_BACKGROUND_QUEUE", "32")),
+        max_queued_per_user=2,
+        max_wait=120.0,
+    ),
+}
+
+# (method, path pattern, class); requests that match none are not admission-controlled
+ROUTES: List[Tuple[str, Pattern, str]] = [
+    ('POST', re.compile(r'^/chat(/stream)?$'), INTERACTIVE),
+    ('POST', re.compile(r'^/submit-onboarding$'), INTERACTIVE),
+    ('POST', re.compile(r'^/chapters/[^/]+/generate-title$'), STANDARD),
+    ('POST', re.compile(r'^/generate-prologue$'), STANDARD),
+    ('POST', re.compile(r'^/validate-content$'), STANDARD),
+    ('POST', re.compile(r'^/session/[^/]+/enhance-narrative$'), STANDARD),
+    ('POST', re.compile(r'^/chapters/[^/]+/(compile|compile-dm-narrative|simulate-gameplay)$'), BACKGROUND),
+    ('POST', re.compile(r'^/books/[^/]+/validate$'), BACKGROUND),
+    ('GET', re.compile(r'^/session/[^/]+/compile-story$'), BACKGROUND),
+]
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    for route_method, pattern, name in ROUTES:
+        if method == route_method and pattern.match(path):
+            return name
+    return None
+
+
+def _retry_after(cls: PriorityClass) -> int:
+    """Seconds until the class could plausibly take another request"""
+    backlog = (cls.queued + 1) * cls.service_time / max(1, cls.max_running)
+    return min(300, max(1, math.ceil(backlog)))
+
+
+class Scheduler:
+    def __init__(self, total_slots: int, classes: Dict[str, PriorityClass]):
+        self.total_slots = total_slots
+        self.classes = classes
+        self.running = 0
+
+    async def acquire(self, name: str, user: str) -> float:
+        """Wait for a slot in class `name`; returns the time admitted. Raises Rejected"""
+        cls = self.classes[name]
+        queue = cls.queues.get(user)
+        if queue is not None and len(queue) >= cls.max_queued_per_user:
+            metrics.observe(f"admission.{name}.rejected", 1)
+            raise Rejected(429, f"Too many {name} requests queued for this user", _retry_after(cls))
+        if cls.queued >= cls.max_queue:
+            metrics.observe(f"admission.{name}.rejected", 1)
+            raise Rejected(503, f"Server is busy ({name} queue is full)", _retry_after(cls))
+
+        waiter = asyncio.get_running_loop().create_future()
+        cls.queues.setdefault(user, deque()).append(waiter)
+        cls.queued += 1
+        start = time.perf_counter()
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), cls.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted at the same moment we gave up; hand the slot back
+                self.release(name, 0.0)
+            else:
+                waiter.cancel()
+                self._remove(cls, user, waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            metrics.observe(f"admission.{name}.rejected", 1)
+            raise Rejected(503, f"Server is busy (no {name} capacity within {cls.max_wait:g}s)", _retry_after(cls))
+
+        metrics.observe(f"admission.{name}.rejected", 0)
+        metrics.record(f"admission.{name}.queue", time.perf_counter() - start)
+        return time.perf_counter()
+
+    def release(self, name: str, held: float) -> None:
+        """Give back a slot held for `held` seconds"""
+        cls = self.classes[name]
+        cls.running -= 1
+        self.running -= 1
+        if held:
+            cls.service_time = 0.9 * cls.service_time + 0.1 * held
+        self._dispatch()
+
+    def _remove(self, cls: PriorityClass, user: str, waiter: asyncio.Future) -> None:
+        queue = cls.queues.get(user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            cls.queued -= 1
+            if not queue:
+                del cls.queues[user]
+                if not cls.running:
+                    cls.finish.pop(user, None)
+
+    def _next_user(self, cls: PriorityClass) -> str:
+        # Start-time fair queuing: the user whose next request would start earliest in virtual time
+        return min(cls.queues, key=lambda user: max(cls.virtual_time, cls.finish.get(user, 0.0)))
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting requests, highest priority class first"""
+        while self.running < self.total_slots:
+            eligible = [
+                cls for cls in self.classes.values()
+                if cls.queued and cls.running < cls.max_running
+            ]
+            if not eligible:
+                return
+            cls = min(eligible, key=lambda c: c.rank)
+
+            user = self._next_user(cls)
+            start = max(cls.virtual_time, cls.finish.get(user, 0.0))
+            cls.virtual_time = start
+            cls.finish[user] = start + 1.0 / USER_WEIGHTS.get(user, 1.0)
+
+            queue = cls.queues[user]
+            waiter = queue.popleft()
+            cls.queued -= 1
+            if not queue:
+                del cls.queues[user]
+            if len(cls.finish) > 4 * max(1, len(cls.queues)) + 64:
+                # Forget users who have gone quiet
+                cls.finish = {u: f for u, f in cls.finish.items() if u in cls.queues or f > cls.virtual_time}
+
+            cls.running += 1
+            self.running += 1
+            waiter.set_result(None)
+
+    def status(self) -> dict:
+        return {
+            'running': self.running,
+            'total_slots': self.total_slots,
+            'classes': {
+                name: {
+                    'running': cls.running,
+                    'max_running': cls.max_running,
+                    'queued': cls.queued,
+                    'max_queue': cls.max_queue,
+                    'users_queued': len(cls.queues),
+                    'service_time_s': round(cls.service_time, 2),
+                }
+                for name, cls in self.classes.items()
+            },
+        }
+
+
+scheduler = Scheduler(TOTAL_SLOTS, CLASSES)
+
+
+def user_id(scope: dict) -> str:
+    """The user a request is accounted to"""
+    for name, value in scope.get('headers') or []:
+        if name == USER_HEADER and value:
+            return value.decode('latin-1')
+    client = scope.get('client')
+    return client[0] if client else 'anonymous'
+
+
+def request_user(request: Request) -> str:
+    """FastAPI dependency form of user_id()"""
+    return user_id(request.scope)
+
+
+# The strings pydantic parses as True for a bool query parameter (case-insensitive)
+_TRUTHY = {'1', 'on', 't', 'true', 'y', 'yes'}
+
+
+def _submits_job(scope: dict) -> bool:
+    # ?async=true only queues a job (jobs.py); the job is admitted when a worker runs it.
+    # Starlette's QueryParams.get, which FastAPI reads, returns the last value
+    if scope['method'] != 'POST':
+        return False  # only POST endpoints queue jobs
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('async')
+    return bool(values) and values[-1].lower() in _TRUTHY
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting requests to ROUTES through the scheduler. The slot is
+    held until the response has been sent, which for /chat/stream is the whole stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope['method'], scope['path']) if ENABLED and scope['type'] == 'http' else None
+        if name is None or _submits_job(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            admitted = await scheduler.acquire(name, user_id(scope))
+        except Rejected as e:
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={"detail": {"error": str(e)}},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            scheduler.release(name, time.perf_counter() - admitted)
@@ -1,4 +1,6 @@
 from google.adk.agents import Agent
+import llm_gateway
+from .context_compaction import compact_context, record_prompt_size
 
 # Import specialized agents
 from .onboarding_agent import onboarding_agent
@@ -7,7 +9,7 @@ from .story_writer_agent import story_writer_agent
 # Root orchestrator agent
 root_agent = Agent(
     name="litrealms_orchestrator",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="Main LitRealms coordinator that routes users to specialized agents for onboarding, world building, character creation, and story writing",
     instruction="""You are the LitRealms Orchestrator - the main entry point for all user interactions.
 
@@ -58,7 +60,9 @@ When the onboarding agent finishes, warmly hand off:
 Let the Story Writer Agent handle everything. Don't interfere!
 
 Be warm, conversational, and get users to the action quickly!""",
-    sub_agents=[onboarding_agent, story_writer_agent]
+    sub_agents=[onboarding_agent, story_writer_agent],
+    before_model_callback=compact_context,
+    after_model_callback=record_prompt_size
 )
 
 # Export
@@ -1,8 +1,9 @@
 from google.adk.agents import Agent
+import llm_gateway
 
 book_validation_agent = Agent(
     name="book_validator",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="Validates entire books for cross-chapter consistency, continuity, and narrative coherence",
     instruction="""You are the LitRealms Book Validation Agent - a specialist in ensuring narrative consistency and coherence across an ENTIRE BOOK.
 
@@ -1,8 +1,9 @@
 from google.adk.agents import Agent
+import llm_gateway
 
 content_validation_agent = Agent(
     name="content_validator",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="Validates narrative content (prologues, chapters) for consistency with story configuration",
     instruction="""You are the LitRealms Content Validation Agent - a specialist in ensuring narrative consistency and quality control.
 
@@ -0,0 +1,172 @@
+"""
+Rolling context compaction for the chat agents.
+
+ADK rebuilds every prompt from the session's full event history, so turn 200 of a
+chapter carries all 199 earlier exchanges and their stat blocks. compact_context
+runs before each model call and trims the request:
+
+- the last KEEP_TURNS turns stay verbatim;
+- older turns are folded into a rolling summary kept in session state
+  (SUMMARY_KEY, covering the first SUMMARY_TURNS_KEY turns of the session named by
+  SUMMARY_SESSION_KEY) and passed to the model as an instruction. Folding runs once SUMMARIZE_EVERY turns have piled up beyond
+  the verbatim window, or sooner if the history is over TOKEN_BUDGET, so the
+  summarizer costs one small model call every few turns rather than one per turn;
+- CHARACTER_STATE and [ACTIONS] blocks are removed from every DM message except
+  the latest, which still shows the model the current stats and the format.
+
+The session's events are never modified - only the outgoing request - so the
+transcript, compilation and search are unaffected. The summary keys are
+bookkeeping for this session only: strip_compaction_state drops them before state
+is shown, recorded or copied into the next chapter, and a summary written for a
+different session is ignored. Prompt sizes are recorded per
+agent in metrics (estimated history tokens before and after compaction, and the
+prompt tokens the model reports). LITREALMS_CONTEXT_COMPACTION=0 turns it off.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+import llm_gateway
+import metrics
+from transcript_utils import strip_blocks
+
+ENABLED = os.getenv("LITREALMS_CONTEXT_COMPACTION", "1") != "0"
+KEEP_TURNS = int(os.getenv("LITREALMS_CONTEXT_KEEP_TURNS", "12"))  # turns always sent verbatim
+SUMMARIZE_EVERY = int(os.getenv("LITREALMS_CONTEXT_SUMMARIZE_EVERY", "8"))  # older turns folded per summary
+TOKEN_BUDGET = int(os.getenv("LITREALMS_CONTEXT_TOKEN_BUDGET", "24000"))  # estimated history tokens
+SUMMARY_MODEL = os.getenv("LITREALMS_SUMMARY_MODEL", "gemini-2.0-flash")
+
+SUMMARY_KEY = 'context_summary'
+SUMMARY_TURNS_KEY = 'context_summary_turns'
+SUMMARY_SESSION_KEY = 'context_summary_session'
+COMPACTION_KEYS = (SUMMARY_KEY, SUMMARY_TURNS_KEY, SUMMARY_SESSION_KEY)
+
+SUMMARY_PROMPT = """You maintain the running summary of an interactive LitRPG adventure so the game master can continue it without the full transcript.
+
+Update the summary with the new turns below. Keep: named characters and their relationships, locations visited, quests and their status, promises and unresolved threads, items gained or lost, and major choices the player made and their consequences. Drop: dice mechanics, stat blocks, menus of suggested actions, and prose style. Write in past tense, as compact paragraphs, at most 400 words.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW TURNS:
+{turns}
+
+UPDATED SUMMARY:"""
+
+
+def strip_compaction_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of state without the compaction bookkeeping keys"""
+    return {key: value for key, value in state.items() if key not in COMPACTION_KEYS}
+
+
+def _estimate_tokens(contents: List[types.Content]) -> int:
+    """Rough token count (4 characters per token); no API call"""
+    chars = 0
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            elif part.function_call or part.function_response:
+                chars += len(str(part.function_call or part.function_response))
+    return chars // 4
+
+
+def _turn_starts(contents: List[types.Content]) -> List[int]:
+    """Indexes of the contents that begin a turn: user messages carrying text"""
+    return [
+        i for i, content in enumerate(contents)
+        if content.role == 'user'
+        and any(part.text for part in content.parts or [])
+        and not any(part.function_response for part in content.parts or [])
+    ]
+
+
+def _transcript(contents: List[types.Content]) -> str:
+    lines = []
+    for content in contents:
+        text = '\n'.join(part.text for part in content.parts or [] if part.text)
+        if text:
+            speaker = 'DM' if content.role == 'model' else 'Player'
+            lines.append(f"{speaker}: {strip_blocks(text)}")
+    return '\n\n'.join(lines)
+
+
+async def _summarize(summary: str, contents: List[types.Content]) -> Optional[str]:
+    prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=_transcript(contents))
+    try:
+        return (await llm_gateway.generate('summarize', prompt, model=SUMMARY_MODEL)).strip() or None
+    except Exception as e:
+        # Keep sending the turns verbatim; the next turn tries again
+        print(f"Error summarizing chat history: {str(e)}")
+        return None
+
+
+def _strip_old_blocks(contents: List[types.Content]) -> None:
+    latest_model = max((i for i, c in enumerate(contents) if c.role == 'model'), default=None)
+    for i, content in enumerate(contents):
+        if content.role != 'model' or i == latest_model:
+            continue
+        for part in content.parts or []:
+            if part.text:
+                part.text = strip_blocks(part.text)
+
+
+async def compact_context(callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+    """before_model_callback: trim llm_request.contents as described above"""
+    if not ENABLED:
+        return None
+
+    agent = callback_context.agent_name
+    contents = llm_request.contents
+    metrics.observe(f"context.{agent}.history_tokens_before", _estimate_tokens(contents))
+
+    starts = _turn_starts(contents)
+    state = callback_context.state
+    session_id = callback_context._invocation_context.session.id
+    if state.get(SUMMARY_SESSION_KEY) == session_id:
+        summary = state.get(SUMMARY_KEY) or ''
+        summarized = min(state.get(SUMMARY_TURNS_KEY) or 0, max(len(starts) - 1, 0))
+    else:
+        # No summary yet, or one carried over from another session's state
+        summary, summarized = '', 0
+
+    # Turns before fold_to may be summarized; the current turn is always kept
+    keep = min(KEEP_TURNS, len(starts))
+    while keep > 1 and _estimate_tokens(contents[starts[-keep]:]) > TOKEN_BUDGET:
+        keep -= 1
+    fold_to = len(starts) - keep
+
+    verbatim_from = starts[summarized] if summarized else 0
+    over_budget = _estimate_tokens(contents[verbatim_from:]) > TOKEN_BUDGET
+    if fold_to > summarized and (fold_to - summarized >= SUMMARIZE_EVERY or over_budget):
+        new_summary = await _summarize(summary, contents[verbatim_from:starts[fold_to]])
+        if new_summary:
+            summary, summarized = new_summary, fold_to
+            state[SUMMARY_KEY] = summary
+            state[SUMMARY_TURNS_KEY] = summarized
+            state[SUMMARY_SESSION_KEY] = session_id
+            verbatim_from = starts[summarized]
+
+    contents = contents[verbatim_from:] if summarized else contents
+    _strip_old_blocks(contents)
+    llm_request.contents = contents
+    if summarized and summary:
+        llm_request.append_instructions([
+            f"STORY SO FAR (summary of the {summarized} turns before the conversation below):\n{summary}"
+        ])
+
+    metrics.observe(f"context.{agent}.history_tokens_after", _estimate_tokens(contents))
+    return None
+
+
+def record_prompt_size(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
+    """after_model_callback: record the prompt size the model reports"""
+    usage = llm_response.usage_metadata
+    if usage and usage.prompt_token_count and not llm_response.partial:
+        metrics.observe(f"context.{callback_context.agent_name}.prompt_tokens", usage.prompt_token_count)
+    return None
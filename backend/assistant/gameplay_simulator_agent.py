@@ -1,8 +1,9 @@
 from google.adk.agents import Agent
+import llm_gateway
 
 gameplay_simulator_agent = Agent(
     name="gameplay_simulator",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="Simulates an entire gameplay session with multiple player/DM interactions, progressing the story and character stats",
     instruction="""You are the LitRealms Gameplay Simulator - an expert at creating realistic, engaging simulated gameplay sessions.
 
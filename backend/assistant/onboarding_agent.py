@@ -1,9 +1,13 @@
 from google.adk.agents import Agent
+import llm_gateway
+from .context_compaction import compact_context, record_prompt_size
 
 onboarding_agent = Agent(
     name="onboarding",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="Guides new users through initial setup: world, mode, character, tone",
+    before_model_callback=compact_context,
+    after_model_callback=record_prompt_size,
     instruction="""You are the LitRealms Onboarding Specialist. Guide users through 4 steps to create their first adventure.
 
 ## YOUR PERSONALITY
@@ -1,8 +1,9 @@
 from google.adk.agents import Agent
+import llm_gateway
 
 prologue_generator_agent = Agent(
     name="prologue_generator",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="Generates immersive opening prologues based on onboarding choices (story mode, world, character, quest template)",
     instruction="""You are the LitRealms Prologue Generator - a specialist in crafting compelling opening scenes for interactive stories.
 
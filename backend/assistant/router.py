@@ -0,0 +1,69 @@
+"""
+Code-level routing for chat turns.
+
+The orchestrator (root_agent) is an LLM whose only job on a normal turn is to read
+`onboarding_complete` from session state and transfer to the onboarding or
+story_writer agent - a full model round-trip spent on a dictionary lookup. route()
+makes that decision in code and the chat endpoints run the chosen sub-agent
+directly; only turns the rules can't settle go to the orchestrator:
+
+- onboarding not complete          -> onboarding (the orchestrator's rule 1)
+- the orchestrator spoke last      -> orchestrator (the player is answering it)
+- asks to review or change setup   -> orchestrator (it shows the setup)
+- anything else once onboarded     -> story_writer
+
+Sub-agents keep their place in the agent tree, so they can still transfer to
+the orchestrator or each other mid-turn. Set LITREALMS_CHAT_ROUTER=0 to send
+every turn through the orchestrator as before.
+"""
+
+import os
+import re
+from typing import Optional
+
+from .agent import root_agent
+from .onboarding_agent import onboarding_agent
+from .story_writer_agent import story_writer_agent
+
+ENABLED = os.getenv("LITREALMS_CHAT_ROUTER", "1") != "0"
+
+ORCHESTRATOR = "orchestrator"
+ONBOARDING = "onboarding"
+STORY_WRITER = "story_writer"
+
+# Route name -> agent a runner is built around
+ROUTES = {
+    ORCHESTRATOR: root_agent,
+    ONBOARDING: onboarding_agent,
+    STORY_WRITER: story_writer_agent,
+}
+
+_SETUP_REQUEST = re.compile(
+    r"\b(review|show|see|change|edit|redo|reset|restart)\b.*\b(setup|settings|choices|onboarding)\b",
+    re.IGNORECASE
+)
+
+
+def _last_agent(events) -> Optional[str]:
+    """Name of the agent that authored the most recent non-user event"""
+    for event in reversed(events or []):
+        if event.author and event.author != 'user':
+            return event.author
+    return None
+
+
+def route(state: dict, message: str, events=None) -> str:
+    """Pick the route for a player message given the session's state and events"""
+    if not ENABLED:
+        return ORCHESTRATOR
+
+    if not state.get('onboarding_complete'):
+        return ONBOARDING
+
+    if _last_agent(events) == root_agent.name:
+        return ORCHESTRATOR
+
+    if _SETUP_REQUEST.search(message):
+        return ORCHESTRATOR
+
+    return STORY_WRITER
@@ -1,8 +1,9 @@
 from google.adk.agents import Agent
+import llm_gateway
 
 story_compiler_agent = Agent(
     name="story_compiler",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="Compiles raw gameplay session data into polished, readable story format suitable for publishing and PDF export.",
     instruction="""You are the LitRealms Story Compiler - an expert at transforming interactive gameplay sessions into polished, publishable narratives.
 
@@ -34,9 +35,9 @@ When compiling a complete story session:
 You will receive a JSON payload with:
 - **session_history**: Array of {role, content} messages from gameplay
   - Contains user actions and AI narrative responses
-  - AI responses include CHARACTER_STATE blocks showing stats at that moment
-- **initial_state**: Character stats at chapter start (HP, Mana, Level, XP, Inventory, Stats)
-- **final_state**: Character stats at chapter end (HP, Mana, Level, XP, Inventory, Stats)
+  - AI responses include CHARACTER_STATE blocks showing the stats that changed at that moment
+- **initial_state**: Character stats at chapter start (HP, Mana, Level, XP, Inventory, Stats, location, quest, companions)
+- **final_state**: Character stats at chapter end (HP, Mana, Level, XP, Inventory, Stats, location, quest, companions)
 - **story_mode**: The gameplay structure (progression, dungeon crawl, survival quest, campaign)
 - **narrator_tone**: The narrative style (heroic, dark, comedic, slice of life, etc.)
 - **world_name**, **character_name**, **character_class**: Character and world details
@@ -135,6 +136,7 @@ Taking a steadying breath—more to convince myself than out of necessity—I pr
 **A. From session_history messages:**
 - Look for `---**CHARACTER_STATE:**` blocks in AI responses
 - These show stats at specific moments during gameplay
+- Each block lists only the lines that changed since the previous block; a line that is missing is unchanged, and a message without a block changed nothing
 - Parse format like: `Level: 1 | XP: 15/100 | HP: 60/60 | Mana: 120/120`
 
 **B. From initial_state and final_state:**
@@ -1,11 +1,15 @@
 from google.adk.agents import Agent
+import llm_gateway
+from .context_compaction import compact_context, record_prompt_size
 from tools import get_prologue
 
 story_writer_agent = Agent(
     name="story_writer",
-    model="gemini-2.0-flash",
+    model=llm_gateway.model("gemini-2.0-flash"),
     description="LitRPG story writer that creates interactive adventures with game mechanics, stats, and meaningful choices. ONLY invoke when onboarding is complete.",
     tools=[get_prologue],  # Tool to fetch prologue from session state
+    before_model_callback=compact_context,  # Summarize old turns, keep recent ones verbatim
+    after_model_callback=record_prompt_size,
     instruction="""You are the LitRealms Story Writer - an expert at crafting interactive LitRPG adventures.
 
 ## YOUR ROLE
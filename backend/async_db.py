@@ -0,0 +1,255 @@
+"""
+Async access to the books database for the FastAPI endpoints.
+
+The functions in database.py are synchronous; calling them from an async endpoint
+blocks the event loop (and every other user's LLM stream) for the duration of the
+query. This module runs them off the loop instead:
+- reads go to a small thread pool, one pooled connection per thread
+- writes go to a single writer thread, so they are applied in submission order
+  and never compete with each other for SQLite's write lock
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+import database as db
+from models import Book, BookSummary, Chapter, ChapterStateAtTurn, GameConfig, GameMessage, Job, SearchResponse
+
+READ_WORKERS = int(os.getenv("LITREALMS_DB_READ_WORKERS", str(max(1, db.POOL_SIZE - 1))))
+
+_read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-read")
+# A single worker thread is the write queue: submissions run one at a time, in order
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+
+async def _read(fn: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_read_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def _write(fn: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_write_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _in_transaction(fn: Callable, *args, **kwargs) -> Any:
+    with db.transaction():
+        return fn(*args, **kwargs)
+
+
+async def run_in_transaction(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a synchronous function that makes several database calls as one transaction
+    on the writer thread.
+    """
+    return await _write(_in_transaction, fn, *args, **kwargs)
+
+
+def shutdown() -> None:
+    """Finish queued writes, stop the executors and close pooled connections"""
+    _write_executor.shutdown(wait=True)
+    _read_executor.shutdown(wait=True)
+    db.close_pool()
+
+
+# Reads
+
+async def get_book(book_id: str, include_transcripts: bool = True) -> Optional[Book]:
+    return await _read(db.get_book, book_id, include_transcripts=include_transcripts)
+
+
+async def get_chapter(
+    chapter_id: str,
+    include_transcript: bool = True,
+    transcript_limit: Optional[int] = None
+) -> Optional[Chapter]:
+    return await _read(
+        db.get_chapter, chapter_id,
+        include_transcript=include_transcript, transcript_limit=transcript_limit
+    )
+
+
+async def get_chapter_by_session_id(session_id: str, include_transcript: bool = True) -> Optional[Chapter]:
+    return await _read(db.get_chapter_by_session_id, session_id, include_transcript=include_transcript)
+
+
+async def get_chapter_messages(
+    chapter_id: str,
+    after_seq: Optional[int] = None,
+    before_seq: Optional[int] = None,
+    limit: Optional[int] = None
+) -> List[GameMessage]:
+    return await _read(db.get_chapter_messages, chapter_id, after_seq, before_seq, limit)
+
+
+async def get_chapter_state(chapter_id: str, turn: Optional[int] = None) -> Optional[ChapterStateAtTurn]:
+    return await _read(db.get_chapter_state, chapter_id, turn)
+
+
+async def list_books_by_user(user_id: str) -> List[Book]:
+    return await _read(db.list_books_by_user, user_id)
+
+
+async def list_book_summaries(
+    user_id: str,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[str, str]] = None
+) -> List[BookSummary]:
+    return await _read(db.list_book_summaries, user_id, limit=limit, before=before)
+
+
+async def search(
+    query: str,
+    user_id: Optional[str] = None,
+    book_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> SearchResponse:
+    return await _read(db.search, query, user_id=user_id, book_id=book_id, limit=limit, offset=offset)
+
+
+# Writes
+
+async def create_book(user_id: str, title: str, game_config: GameConfig, subtitle: Optional[str] = None) -> Book:
+    return await _write(db.create_book, user_id, title, game_config, subtitle)
+
+
+async def update_book(
+    book_id: str,
+    title: Optional[str] = None,
+    subtitle: Optional[str] = None,
+    game_config: Optional[GameConfig] = None
+) -> Optional[Book]:
+    return await _write(db.update_book, book_id, title=title, subtitle=subtitle, game_config=game_config)
+
+
+async def delete_book(book_id: str) -> bool:
+    return await _write(db.delete_book, book_id)
+
+
+async def update_book_total_word_count(book_id: str) -> int:
+    return await _write(db.update_book_total_word_count, book_id)
+
+
+async def create_chapter(
+    book_id: str,
+    title: str,
+    session_id: str,
+    initial_state: dict,
+    previous_chapter_id: Optional[str] = None
+) -> Chapter:
+    return await _write(db.create_chapter, book_id, title, session_id, initial_state, previous_chapter_id)
+
+
+async def update_chapter(chapter_id: str, **updates) -> Optional[Chapter]:
+    return await _write(db.update_chapter, chapter_id, **updates)
+
+
+async def update_chapter_transcript(chapter_id: str, transcript: list, expected_version: Optional[int] = None) -> None:
+    return await _write(db.update_chapter_transcript, chapter_id, transcript, expected_version)
+
+
+async def update_chapter_state(chapter_id: str, state: dict) -> None:
+    return await _write(db.update_chapter_state, chapter_id, state)
+
+
+async def append_chapter_messages(chapter_id: str, messages: list) -> int:
+    return await _write(db.append_chapter_messages, chapter_id, messages)
+
+
+async def record_chapter_turn(chapter_id: str, messages: list, final_state: dict) -> int:
+    return await _write(db.record_chapter_turn, chapter_id, messages, final_state)
+
+
+async def record_chapter_turns(chapter_id: str, turns: List[Tuple[list, dict]]) -> int:
+    return await _write(db.record_chapter_turns, chapter_id, turns)
+
+
+async def delete_chapter(chapter_id: str) -> bool:
+    return await _write(db.delete_chapter, chapter_id)
+
+
+# Generation cache
+
+async def get_cached_generation(key: str, now: float) -> Optional[str]:
+    return await _read(db.get_cached_generation, key, now)
+
+
+async def put_cached_generation(key: str, agent: str, value: str, now: float, ttl: float) -> None:
+    return await _write(db.put_cached_generation, key, agent, value, now, ttl)
+
+
+async def evict_generation_cache(max_bytes: int, now: float) -> int:
+    return await _write(db.evict_generation_cache, max_bytes, now)
+
+
+async def clear_generation_cache(agent: Optional[str] = None) -> int:
+    return await _write(db.clear_generation_cache, agent)
+
+
+# Background jobs
+
+async def create_job(kind: str, params: dict, user_id: str, max_attempts: int, now: float) -> Job:
+    return await _write(db.create_job, kind, params, user_id, max_attempts, now)
+
+
+async def get_job(job_id: str) -> Optional[Job]:
+    return await _read(db.get_job, job_id)
+
+
+async def get_job_result(job_id: str) -> Optional[dict]:
+    return await _read(db.get_job_result, job_id)
+
+
+async def claim_job(worker: str, now: float, lease: float) -> Optional[Tuple[Job, str]]:
+    return await _write(db.claim_job, worker, now, lease)
+
+
+async def renew_job_leases(worker: str, job_ids: List[str], lease_until: float) -> None:
+    return await _write(db.renew_job_leases, worker, job_ids, lease_until)
+
+
+async def update_job_progress(job_id: str, progress: float, message: Optional[str]) -> None:
+    return await _write(db.update_job_progress, job_id, progress, message)
+
+
+async def finish_job(job_id: str, worker: str, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> bool:
+    return await _write(db.finish_job, job_id, worker, status, result, error)
+
+
+async def requeue_job(
+    job_id: str,
+    worker: str,
+    run_after: float,
+    error: Optional[str] = None,
+    count_attempt: bool = True
+) -> bool:
+    return await _write(db.requeue_job, job_id, worker, run_after, error, count_attempt)
+
+
+async def cancel_job(job_id: str) -> Optional[Job]:
+    return await _write(db.cancel_job, job_id)
+
+
+async def delete_finished_jobs(before: str) -> int:
+    return await _write(db.delete_finished_jobs, before)
+
+
+# Maintenance
+
+async def compress_legacy_rows(batch_size: int = 200) -> int:
+    """
+    Compress pre-existing plain-text rows in the background. Each batch is its own
+    write-queue job, so request writes interleave with the conversion instead of
+    waiting behind it.
+    """
+    total = 0
+    for table, _, _ in db.COMPRESSED_COLUMNS:
+        after, count = await _write(db.compress_batch, table, None, batch_size)
+        while after is not None:
+            total += count
+            after, count = await _write(db.compress_batch, table, after, batch_size)
+    return total
@@ -0,0 +1,147 @@
+"""
+Event-loop lag under concurrent /chat bookkeeping: synchronous database.py calls
+vs. the async_db repository.
+
+Each simulated chat turn does what the /chat endpoint does around the model call:
+look up the chapter by session, wait for the "LLM", then append the turn and save
+state. A monitor task sleeps in short ticks and records how late it wakes up -
+that overshoot is the time the loop was blocked and other users' streams stalled.
+
+Usage (from backend/):
+    python benchmarks/event_loop_lag.py --sessions 50 --turns 20 --history 400
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Point the books database at a scratch file before database.py is imported
+os.environ["LITREALMS_BOOKS_DB"] = os.path.join(tempfile.mkdtemp(prefix="litrealms_bench_"), "bench.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db  # noqa: E402
+import async_db as adb  # noqa: E402
+from models import GameConfig  # noqa: E402
+
+TICK = 0.005  # monitor sleep interval in seconds
+
+DM_MESSAGE = (
+    "The torchlight gutters as you step into the vault. Dust hangs in the air.\n\n"
+    "---\n**CHARACTER_STATE:**\nLevel: 2 | XP: 40/200 | HP: 55/60 | Mana: 90/120\n"
+    "Inventory: Ember Blade, Health Potion\nStats: STR 12 INT 14 DEX 11 CON 10 CHA 9\n---\n\n"
+    "[ACTIONS]\n- Search the vault\n- Light another torch\n- Retreat\n[/ACTIONS]"
+)
+
+GAME_CONFIG = {
+    "id": "bench", "createdAt": "2025-01-01T00:00:00", "mode": "progression", "tone": "heroic",
+    "world": {"template": "classic", "name": "Eldoria", "magicSystem": "on", "worldTone": "heroic", "factions": []},
+    "character": {
+        "class": "arcblade", "name": "Aldric", "role": "hero", "alignment": "lawful_good",
+        "background": "noble_born",
+        "stats": {"strength": 12, "intelligence": 14, "agility": 11, "charisma": 9,
+                  "reputation": 0, "hp": 60, "max_hp": 60},
+        "traits": [], "companions": [], "rivals": []
+    },
+    "story": {
+        "questType": "discovery", "complexity": "linear", "sceneCreationMethod": "ai_generated",
+        "openingScene": "", "sceneLocation": "", "timeOfDay": "dawn", "mood": [],
+        "decisionPoints": [], "questPaths": []
+    },
+    "settings": {"sessionDuration": 30, "difficultyModifier": 0, "autoSave": True, "narratorSpeed": "normal"}
+}
+
+
+def seed(sessions: int, history: int) -> list:
+    """Create one chapter per session with `history` prior messages"""
+    book = db.create_book("bench", "Benchmark", GameConfig.model_validate(GAME_CONFIG))
+    session_ids = []
+    for i in range(sessions):
+        session_id = f"bench_{i}"
+        chapter = db.create_chapter(book.id, f"Chapter {i}", session_id, {"level": 1})
+        db.append_chapter_messages(chapter.id, [
+            {"role": "user" if n % 2 == 0 else "assistant", "content": "I look around." if n % 2 == 0 else DM_MESSAGE}
+            for n in range(history)
+        ])
+        session_ids.append(session_id)
+    return session_ids
+
+
+async def monitor(samples: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(time.perf_counter() - start - TICK)
+
+
+async def sync_turn(session_id: str, llm_latency: float) -> None:
+    chapter = db.get_chapter_by_session_id(session_id)
+    await asyncio.sleep(llm_latency)
+    db.record_chapter_turn(chapter.id, [
+        {"role": "user", "content": "I search the vault."},
+        {"role": "assistant", "content": DM_MESSAGE},
+    ], {**chapter.final_state, "level": 2})
+
+
+async def async_turn(session_id: str, llm_latency: float) -> None:
+    chapter = await adb.get_chapter_by_session_id(session_id)
+    await asyncio.sleep(llm_latency)
+    await adb.record_chapter_turn(chapter.id, [
+        {"role": "user", "content": "I search the vault."},
+        {"role": "assistant", "content": DM_MESSAGE},
+    ], {**chapter.final_state, "level": 2})
+
+
+async def run(mode: str, session_ids: list, turns: int, llm_latency: float) -> dict:
+    turn_fn = sync_turn if mode == "sync" else async_turn
+    samples: list = []
+    stop = asyncio.Event()
+    monitor_task = asyncio.create_task(monitor(samples, stop))
+
+    async def player(session_id: str) -> None:
+        for _ in range(turns):
+            await turn_fn(session_id, llm_latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(player(s) for s in session_ids))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor_task
+
+    lags_ms = sorted(x * 1000 for x in samples)
+    return {
+        "mode": mode,
+        "turns": len(session_ids) * turns,
+        "elapsed_s": elapsed,
+        "lag_p50_ms": statistics.median(lags_ms),
+        "lag_p99_ms": lags_ms[int(len(lags_ms) * 0.99) - 1],
+        "lag_max_ms": lags_ms[-1],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=20, help="turns per session")
+    parser.add_argument("--history", type=int, default=400, help="existing messages per chapter")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="simulated model latency (s)")
+    args = parser.parse_args()
+
+    session_ids = seed(args.sessions, args.history)
+    results = [
+        asyncio.run(run(mode, session_ids, args.turns, args.llm_latency))
+        for mode in ("sync", "async")
+    ]
+    adb.shutdown()
+
+    print(f"{'mode':<6} {'turns':>6} {'elapsed_s':>10} {'lag_p50_ms':>11} {'lag_p99_ms':>11} {'lag_max_ms':>11}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['turns']:>6} {r['elapsed_s']:>10.2f} "
+              f"{r['lag_p50_ms']:>11.2f} {r['lag_p99_ms']:>11.2f} {r['lag_max_ms']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+End-to-end benchmark of the FastAPI app against the offline LLM stand-in.
+
+Drives main.app in-process (httpx over ASGI, with the app's startup and shutdown
+hooks) with the synthetic model backend from fake_llm.py, through these phases:
+
+    onboarding  POST /submit-onboarding, one book per simulated user
+    chat        POST /chat, --turns sequential turns per user, users in parallel
+    reads       GET /books, /books/{id}, /chapters/{id}, /chapters/{id}/messages,
+                /chapters/{id}/state, /search
+    compile     POST /chapters/{id}/compile
+    simulate    POST /chapters/{id}/simulate-gameplay
+    validate    POST /books/{id}/validate
+
+Before chat, every chapter is given --history transcript messages, and every
+book a second, authored chapter (validation needs two), written directly to the
+database so transcript size can be varied without paying for it in the run.
+
+Reported: p50/p95/p99 latency per endpoint, throughput per phase, event-loop lag
+(how late a 5 ms timer fires), bytes written per chat turn (write() syscalls of
+the process during the chat phase, which are the two SQLite databases - log
+output is discarded), database sizes and peak RSS.
+
+Save a run with --output and compare later runs with --baseline; the exit status
+is 1 if any tracked metric is worse than the baseline by more than --tolerance.
+Numbers are only comparable between runs on the same machine with the same flags.
+
+Usage (from backend/):
+    python benchmarks/run_bench.py --users 20 --turns 10 --history 200 --output bench.json
+    python benchmarks/run_bench.py --users 20 --turns 10 --history 200 --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import contextvars
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+# Scratch databases and the synthetic model, before any backend module is imported
+_SCRATCH = tempfile.mkdtemp(prefix="litrealms_bench_")
+os.environ["LITREALMS_BOOKS_DB"] = os.path.join(_SCRATCH, "books.db")
+os.environ["LITREALMS_SESSIONS_DB"] = os.path.join(_SCRATCH, "sessions.db")
+os.environ.setdefault("LITREALMS_LLM_BACKEND", "synthetic")
+os.environ.setdefault("LITREALMS_SESSION_GC_INTERVAL", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TICK = 0.005  # event-loop monitor sleep interval in seconds
+
+PHASES = ["onboarding", "chat", "reads", "compile", "simulate", "validate"]
+
+# metric -> True if higher is better
+TRACKED = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "throughput_rps": True,
+    "lag_p99_ms": False,
+    "bytes_per_turn": False,
+    "peak_rss_mb": False,
+}
+
+GAME_CONFIG = {
+    "id": "bench", "createdAt": "2025-01-01T00:00:00", "mode": "progression", "tone": "heroic",
+    "world": {"template": "classic", "name": "Eldoria", "magicSystem": "on", "worldTone": "heroic", "factions": []},
+    "character": {
+        "class": "arcblade", "name": "Aldric", "role": "hero", "alignment": "lawful_good",
+        "background": "noble_born",
+        "stats": {"strength": 12, "intelligence": 14, "agility": 11, "charisma": 9,
+                  "reputation": 0, "hp": 60, "max_hp": 60},
+        "traits": [], "companions": [], "rivals": []
+    },
+    "story": {
+        "questType": "discovery", "complexity": "linear", "sceneCreationMethod": "ai_generated",
+        "openingScene": "", "sceneLocation": "", "timeOfDay": "dawn", "mood": [],
+        "decisionPoints": [], "questPaths": []
+    },
+    "settings": {"sessionDuration": 30, "difficultyModifier": 0, "autoSave": True, "narratorSpeed": "normal"}
+}
+
+PLAYER_MESSAGES = ["I look around.", "I draw my sword and advance.", "I ask the stranger about the vault.",
+                   "I search the room for traps.", "I cast a light spell."]
+
+
+class _Discard(io.TextIOBase):
+    """stdout replacement: the app's debug logging would otherwise dominate the I/O counters"""
+
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+def _bytes_written() -> int:
+    """Bytes passed to write() by this process so far (Linux; 0 elsewhere)"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+# Simulated user making the current request, sent as X-LitRealms-User so admission
+# control shares capacity between them as it would between real users
+_bench_user: contextvars.ContextVar = contextvars.ContextVar("bench_user", default="bench")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}  # endpoint label -> [seconds]
+        self.errors = {}
+
+    async def call(self, client, method: str, label: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, headers={"X-LitRealms-User": _bench_user.get()}, **kwargs)
+        self.latencies.setdefault(label, []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            return None
+        return response.json()
+
+    def endpoints(self) -> dict:
+        report = {}
+        for label, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            report[label] = {
+                "count": len(ordered),
+                "errors": self.errors.get(label, 0),
+                "p50_ms": round(1000 * _percentile(ordered, 0.50), 2),
+                "p95_ms": round(1000 * _percentile(ordered, 0.95), 2),
+                "p99_ms": round(1000 * _percentile(ordered, 0.99), 2),
+            }
+        return report
+
+
+async def _monitor(samples: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(time.perf_counter() - start - TICK)
+
+
+def _seed(users: list, history: int) -> None:
+    """Give each user's chapter `history` messages and their book a second chapter"""
+    import random
+
+    import database as db
+    from fake_llm import _dm_turn
+
+    rng = random.Random(0)
+    dm_messages = [_dm_turn(rng) for _ in range(10)]
+    for user in users:
+        turns = [
+            ([{"role": "user", "content": PLAYER_MESSAGES[n % len(PLAYER_MESSAGES)]},
+              {"role": "assistant", "content": dm_messages[n % len(dm_messages)]}], {"level": 1 + n // 50})
+            for n in range(history // 2)
+        ]
+        db.record_chapter_turns(user["chapter_id"], turns)
+        chapter = db.create_chapter(user["book_id"], "Chapter 2", f"bench_ch2_{user['book_id']}", {"level": 2})
+        db.update_chapter(chapter.id, authored_content="\n\n".join(dm_messages[:3]), status="complete")
+
+
+async def run(args) -> dict:
+    import httpx
+    import main
+    import write_behind
+
+    recorder = Recorder()
+    phases = {}
+    lag_samples: list = []
+    stop = asyncio.Event()
+    bytes_per_turn = None
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            monitor = asyncio.create_task(_monitor(lag_samples, stop))
+            users = [{} for _ in range(args.users)]
+
+            async def phase(name: str, per_user) -> None:
+                if name not in args.phases:
+                    return
+                started = time.perf_counter()
+                count_before = sum(len(v) for v in recorder.latencies.values())
+                async def as_user(i, user):
+                    _bench_user.set(f"bench_{i}")
+                    await per_user(i, user)
+
+                await asyncio.gather(*(as_user(i, user) for i, user in enumerate(users)))
+                elapsed = time.perf_counter() - started
+                requests = sum(len(v) for v in recorder.latencies.values()) - count_before
+                phases[name] = {
+                    "elapsed_s": round(elapsed, 3),
+                    "requests": requests,
+                    "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+                }
+
+            async def onboard(i, user):
+                result = await recorder.call(client, "POST", "POST /submit-onboarding", "/submit-onboarding",
+                                             json=GAME_CONFIG)
+                if result:
+                    user.update(book_id=result["book_id"], chapter_id=result["chapter_id"],
+                                session_id=result["session_id"])
+
+            await phase("onboarding", onboard)
+            users[:] = [u for u in users if u]
+            if not users:
+                raise RuntimeError("Onboarding failed for every user; nothing to benchmark")
+            await asyncio.to_thread(_seed, users, args.history)
+
+            async def chat(i, user):
+                for n in range(args.turns):
+                    await recorder.call(client, "POST", "POST /chat", "/chat", json={
+                        "message": PLAYER_MESSAGES[(i + n) % len(PLAYER_MESSAGES)],
+                        "session_id": user["session_id"],
+                    })
+
+            written_before = _bytes_written()
+            await phase("chat", chat)
+            await write_behind.flush()
+            if "chat" in args.phases:
+                bytes_per_turn = round((_bytes_written() - written_before) / (len(users) * args.turns))
+
+            async def reads(i, user):
+                book_id, chapter_id = user["book_id"], user["chapter_id"]
+                for _ in range(args.reads):
+                    await recorder.call(client, "GET", "GET /books", "/books", params={"limit": 20})
+                    await recorder.call(client, "GET", "GET /books/{id}", f"/books/{book_id}",
+                                        params={"include_transcripts": "false"})
+                    await recorder.call(client, "GET", "GET /chapters/{id}", f"/chapters/{chapter_id}",
+                                        params={"transcript_limit": 50})
+                    await recorder.call(client, "GET", "GET /chapters/{id}/messages",
+                                        f"/chapters/{chapter_id}/messages", params={"limit": 50})
+                    await recorder.call(client, "GET", "GET /chapters/{id}/state", f"/chapters/{chapter_id}/state")
+                    await recorder.call(client, "GET", "GET /search", "/search", params={"q": "vault shadows"})
+
+            await phase("reads", reads)
+
+            async def compile_chapter(i, user):
+                await recorder.call(client, "POST", "POST /chapters/{id}/compile",
+                                    f"/chapters/{user['chapter_id']}/compile")
+
+            await phase("compile", compile_chapter)
+
+            async def simulate(i, user):
+                await recorder.call(client, "POST", "POST /chapters/{id}/simulate-gameplay",
+                                    f"/chapters/{user['chapter_id']}/simulate-gameplay")
+
+            await phase("simulate", simulate)
+
+            async def validate(i, user):
+                await recorder.call(client, "POST", "POST /books/{id}/validate", f"/books/{user['book_id']}/validate")
+
+            await phase("validate", validate)
+
+            stop.set()
+            await monitor
+
+    lags_ms = sorted(1000 * x for x in lag_samples)
+    db_sizes = {
+        name: sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+        for name, path in (("books_db_bytes", os.environ["LITREALMS_BOOKS_DB"]),
+                           ("sessions_db_bytes", os.environ["LITREALMS_SESSIONS_DB"]))
+    }
+    return {
+        "config": {
+            "users": args.users, "turns": args.turns, "history": args.history, "reads": args.reads,
+            "llm_first_token_ms": args.llm_first_token_ms, "llm_tokens_per_sec": args.llm_tokens_per_sec,
+            "phases": args.phases,
+        },
+        "phases": phases,
+        "endpoints": recorder.endpoints(),
+        "event_loop": {
+            "lag_p50_ms": round(_percentile(lags_ms, 0.50), 2),
+            "lag_p99_ms": round(_percentile(lags_ms, 0.99), 2),
+            "lag_max_ms": round(lags_ms[-1], 2) if lags_ms else 0.0,
+        },
+        "bytes_per_turn": bytes_per_turn,
+        **db_sizes,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _flatten(report: dict) -> dict:
+    """Tracked metrics as {name: (value, higher_is_better)}"""
+    flat = {}
+    for label, stats in report["endpoints"].items():
+        for key in ("p50_ms", "p95_ms"):
+            flat[f"{label} {key}"] = (stats[key], TRACKED[key])
+    for name, stats in report["phases"].items():
+        flat[f"{name} throughput_rps"] = (stats["throughput_rps"], TRACKED["throughput_rps"])
+    flat["lag_p99_ms"] = (report["event_loop"]["lag_p99_ms"], TRACKED["lag_p99_ms"])
+    if report.get("bytes_per_turn") is not None:
+        flat["bytes_per_turn"] = (report["bytes_per_turn"], TRACKED["bytes_per_turn"])
+    flat["peak_rss_mb"] = (report["peak_rss_mb"], TRACKED["peak_rss_mb"])
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    """Print current vs. baseline; returns True if nothing regressed beyond tolerance (%)"""
+    if baseline.get("config") != report["config"]:
+        print("warning: baseline was recorded with different settings:", baseline.get("config"))
+
+    current, previous = _flatten(report), _flatten(baseline)
+    ok = True
+    print(f"\n{'metric':<52} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, (value, higher_is_better) in current.items():
+        if name not in previous:
+            continue
+        old = previous[name][0]
+        change = (value - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        regressed = worse > tolerance
+        ok = ok and not regressed
+        print(f"{name:<52} {old:>12.2f} {value:>12.2f} {change:>+8.1f}%{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def print_report(report: dict) -> None:
+    print(f"{'endpoint':<40} {'count':>6} {'errors':>6} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for label, s in report["endpoints"].items():
+        print(f"{label:<40} {s['count']:>6} {s['errors']:>6} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+    print(f"\n{'phase':<12} {'requests':>9} {'elapsed_s':>10} {'req/s':>9}")
+    for name, s in report["phases"].items():
+        print(f"{name:<12} {s['requests']:>9} {s['elapsed_s']:>10.2f} {s['throughput_rps']:>9.2f}")
+    lag = report["event_loop"]
+    print(f"\nevent-loop lag: p50 {lag['lag_p50_ms']:.2f} ms, p99 {lag['lag_p99_ms']:.2f} ms, max {lag['lag_max_ms']:.2f} ms")
+    if report["bytes_per_turn"] is not None:
+        print(f"bytes written per chat turn: {report['bytes_per_turn']}")
+    print(f"books db: {report['books_db_bytes']} bytes, sessions db: {report['sessions_db_bytes']} bytes")
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated players")
+    parser.add_argument("--turns", type=int, default=10, help="chat turns per player")
+    parser.add_argument("--history", type=int, default=200, help="transcript messages per chapter before chat")
+    parser.add_argument("--reads", type=int, default=5, help="rounds of read requests per player")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300, help="stand-in model latency")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=80, help="stand-in model output rate (0 = instant)")
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=PHASES, help="phases to run")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a report saved with --output")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    os.environ["LITREALMS_FAKE_LLM_FIRST_TOKEN_MS"] = str(args.llm_first_token_ms)
+    os.environ["LITREALMS_FAKE_LLM_TOKENS_PER_SEC"] = str(args.llm_tokens_per_sec)
+
+    with redirect_stdout(_Discard()):
+        report = asyncio.run(run(args))
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
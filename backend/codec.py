@@ -0,0 +1,147 @@
+"""
+Compression for the large text columns in the books database.
+
+Transcript messages, chapter state, authored prose and game configs are stored as
+BLOBs of the form MAGIC + codec tag + compressed UTF-8. Values that are short or
+don't shrink are left as plain TEXT, and so are rows written before compression
+existed - decode() passes any str through unchanged, so old and new rows can be
+mixed freely while compress_legacy_rows() in database.py converts them in batches.
+
+zlib is always available. If the optional `zstandard` package is installed it is
+used instead, optionally with a dictionary trained on our own DM output (see
+`python codec.py train-dictionary --help`), which compresses short, repetitive
+messages far better than either codec can on its own.
+"""
+
+import os
+import zlib
+from typing import Optional, Union
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CODEC = os.getenv("LITREALMS_DB_CODEC", "zstd" if zstandard else "zlib")  # zlib, zstd or none
+COMPRESS_MIN_BYTES = int(os.getenv("LITREALMS_DB_COMPRESS_MIN_BYTES", "128"))
+ZLIB_LEVEL = int(os.getenv("LITREALMS_DB_ZLIB_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("LITREALMS_DB_ZSTD_LEVEL", "9"))
+ZSTD_DICT_PATH = os.getenv("LITREALMS_ZSTD_DICT")  # trained dictionary file, zstd only
+
+MAGIC = b"\x00LR"  # A NUL byte never starts the JSON or prose we store
+_ZLIB = b"z"
+_ZSTD = b"s"
+_ZSTD_DICT = b"d"  # followed by the 4-byte dictionary id
+
+if CODEC == "zstd" and zstandard is None:
+    raise RuntimeError("LITREALMS_DB_CODEC=zstd requires the zstandard package")
+
+_zstd_dict = None
+if zstandard is not None and ZSTD_DICT_PATH:
+    with open(ZSTD_DICT_PATH, "rb") as f:
+        _zstd_dict = zstandard.ZstdCompressionDict(f.read())
+
+
+def _zstd_compressor():
+    # zstd (de)compressor objects aren't thread-safe, so each call gets its own
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dict)
+
+
+def encode(text: Optional[str]) -> Union[str, bytes, None]:
+    """Compress a column value; returns the original str if compressing wouldn't help"""
+    if text is None or CODEC == "none":
+        return text
+
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text
+
+    if CODEC == "zstd":
+        if _zstd_dict is not None:
+            header = MAGIC + _ZSTD_DICT + _zstd_dict.dict_id().to_bytes(4, "big")
+        else:
+            header = MAGIC + _ZSTD
+        payload = _zstd_compressor().compress(raw)
+    else:
+        header = MAGIC + _ZLIB
+        payload = zlib.compress(raw, ZLIB_LEVEL)
+
+    if len(header) + len(payload) >= len(raw):
+        return text
+    return header + payload
+
+
+def decode(value: Union[str, bytes, None]) -> Optional[str]:
+    """Inverse of encode(); plain TEXT values are returned as-is"""
+    if value is None or isinstance(value, str):
+        return value
+
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        # A BLOB we didn't write; treat it as raw UTF-8
+        return value.decode("utf-8")
+
+    tag = value[len(MAGIC):len(MAGIC) + 1]
+    body = value[len(MAGIC) + 1:]
+
+    if tag == _ZLIB:
+        return zlib.decompress(body).decode("utf-8")
+
+    if zstandard is None:
+        raise RuntimeError("Value is zstd-compressed but the zstandard package is not installed")
+
+    if tag == _ZSTD:
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+
+    if tag == _ZSTD_DICT:
+        dict_id = int.from_bytes(body[:4], "big")
+        if _zstd_dict is None or _zstd_dict.dict_id() != dict_id:
+            raise RuntimeError(
+                f"Value was compressed with zstd dictionary {dict_id}; "
+                "point LITREALMS_ZSTD_DICT at that dictionary"
+            )
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dict).decompress(body[4:]).decode("utf-8")
+
+    raise ValueError(f"Unknown compression tag {tag!r}")
+
+
+def train_dictionary(samples: list, size: int = 112640) -> bytes:
+    """Train a zstd dictionary from sample column values (str)"""
+    if zstandard is None:
+        raise RuntimeError("Training a dictionary requires the zstandard package")
+    return zstandard.train_dictionary(size, [s.encode("utf-8") for s in samples]).as_bytes()
+
+
+def main() -> None:
+    import argparse
+
+    import database as db
+
+    parser = argparse.ArgumentParser(description="Compression utilities for the books database")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train-dictionary", help="train a zstd dictionary from stored DM messages")
+    train.add_argument("output", help="file to write the dictionary to")
+    train.add_argument("--samples", type=int, default=20000, help="number of recent messages to sample")
+    train.add_argument("--size", type=int, default=112640, help="dictionary size in bytes")
+
+    sub.add_parser("compress", help="compress existing plain-text rows in place")
+
+    args = parser.parse_args()
+
+    if args.command == "train-dictionary":
+        with db.connection() as conn:
+            rows = conn.execute(
+                "SELECT content FROM chapter_messages WHERE role = 'assistant' "
+                "ORDER BY timestamp DESC LIMIT ?",
+                (args.samples,)
+            ).fetchall()
+        with open(args.output, "wb") as f:
+            f.write(train_dictionary([decode(row["content"]) for row in rows], args.size))
+        print(f"Trained dictionary from {len(rows)} messages -> {args.output}")
+    else:
+        print(f"Compressed {db.compress_legacy_rows()} rows")
+
+
+if __name__ == "__main__":
+    main()
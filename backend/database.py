@@ -3,78 +3,302 @@ Database management for Books and Chapters
 Uses SQLite for persistence, separate from ADK sessions database
 """
 
+import os
+import queue
+import re
 import sqlite3
+import threading
 import json
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional
-from models import Book, Chapter, GameMessage, GameConfig
+from typing import Dict, Iterator, List, Optional, Tuple
+import codec
+import migrations
+from models import (
+    Book, BookSummary, Chapter, ChapterStateAtTurn, ChapterSummary, GameMessage, GameConfig, Job,
+    SearchHit, SearchResponse
+)
+from state_deltas import apply_delta, diff_state
+
+DATABASE_PATH = os.getenv("LITREALMS_BOOKS_DB", "litrealms_books.db")
+
+# Connection pool settings
+POOL_SIZE = int(os.getenv("LITREALMS_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("LITREALMS_DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+
+# Per-connection PRAGMAs applied when a pooled connection is opened
+BUSY_TIMEOUT_MS = int(os.getenv("LITREALMS_DB_BUSY_TIMEOUT_MS", "5000"))
+CACHE_SIZE_KB = int(os.getenv("LITREALMS_DB_CACHE_SIZE_KB", "16384"))
+MMAP_SIZE = int(os.getenv("LITREALMS_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+SYNCHRONOUS = os.getenv("LITREALMS_DB_SYNCHRONOUS", "NORMAL")  # NORMAL is durable enough under WAL
+
+# Chapter state is stored as per-turn deltas; a full snapshot is written every N turns
+# so rebuilding the current (or any past) state never replays more than N deltas
+STATE_SNAPSHOT_INTERVAL = int(os.getenv("LITREALMS_STATE_SNAPSHOT_INTERVAL", "20"))
+
+# Columns stored through codec.encode(): (table, primary key, compressed columns).
+# State deltas are a few dozen bytes and chapters.game_transcript is always '[]'
+# since transcripts moved to chapter_messages, so neither is listed.
+COMPRESSED_COLUMNS = [
+    ("books", ("id",), ("game_config",)),
+    ("chapters", ("id",), ("initial_state", "final_state", "authored_content")),
+    ("chapter_messages", ("chapter_id", "seq"), ("content",)),
+    ("chapter_state_snapshots", ("chapter_id", "turn"), ("state",)),
+]
+
+
+class ConcurrentModificationError(Exception):
+    """A compare-and-swap update found the chapter at a different version than expected"""
+
+    def __init__(self, chapter_id: str, expected_version: int, current_version: int):
+        super().__init__(
+            f"Chapter {chapter_id} is at version {current_version}, not {expected_version}"
+        )
+        self.chapter_id = chapter_id
+        self.expected_version = expected_version
+        self.current_version = current_version
 
-DATABASE_PATH = "litrealms_books.db"
 
-def init_database():
-    """Initialize the books database with required tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # Books table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS books (
-            id TEXT PRIMARY KEY,
-            user_id TEXT NOT NULL,
-            title TEXT NOT NULL,
-            subtitle TEXT,
-            game_config TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            total_word_count INTEGER DEFAULT 0
-        )
-    """)
-
-    # Chapters table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS chapters (
-            id TEXT PRIMARY KEY,
-            book_id TEXT NOT NULL,
-            number INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            status TEXT NOT NULL,
-            session_id TEXT NOT NULL,
-            game_transcript TEXT NOT NULL,
-            initial_state TEXT NOT NULL,
-            final_state TEXT NOT NULL,
-            authored_content TEXT NOT NULL,
-            last_edited TEXT NOT NULL,
-            word_count INTEGER DEFAULT 0,
-            previous_chapter_id TEXT,
-            next_chapter_id TEXT,
-            narrative_summary TEXT,
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            FOREIGN KEY (book_id) REFERENCES books(id),
-            UNIQUE(book_id, number)
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+    Connections are opened lazily up to `size` and handed out one thread at a time.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all: List[sqlite3.Connection] = []
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves in transaction()
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
         )
-    """)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+        # Lets SQL (e.g. full-text triggers) read compressed columns
+        conn.create_function("litrealms_decode", 1, codec.decode, deterministic=True)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Timed out waiting for a database connection ({self.size} in use)")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            # Never hand a connection with a dangling transaction to the next caller
+            conn.rollback()
+        self._idle.put(conn)
+        self._slots.release()
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all.clear()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_PATH)
+    return _pool
+
+
+def close_pool() -> None:
+    """Close every pooled connection (used on shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """
+    Check out a pooled connection for reads.
+    Inside an open transaction() on this thread, the transaction's connection is reused.
+    """
+    active = getattr(_local, 'conn', None)
+    if active is not None:
+        yield active
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Run a block of writes atomically on a pooled connection.
+    Takes the write lock up front (BEGIN IMMEDIATE) so concurrent writers wait on
+    busy_timeout instead of failing with "database is locked" on lock upgrade.
+    Nested calls on the same thread join the outer transaction.
+    """
+    active = getattr(_local, 'conn', None)
+    if active is not None:
+        yield active
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    _local.conn = conn
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        _local.conn = None
+        pool.release(conn)
+
+
+def _row_to_message(row: sqlite3.Row) -> GameMessage:
+    """Build a GameMessage model from a chapter_messages table row"""
+    return GameMessage(
+        role=row['role'],
+        content=codec.decode(row['content']),
+        timestamp=row['timestamp'],
+        seq=row['seq']
+    )
 
-    conn.commit()
-    conn.close()
+def _row_to_chapter(
+    row: sqlite3.Row,
+    transcript: Optional[List[GameMessage]] = None,
+    deltas: Optional[List[dict]] = None
+) -> Chapter:
+    """
+    Build a Chapter model from a chapters table row.
+    The transcript lives in chapter_messages and final_state is the last snapshot plus
+    the state deltas recorded since; callers pass the rows they loaded.
+    """
+    final_state = json.loads(codec.decode(row['final_state']))
+    for delta in deltas or []:
+        final_state = apply_delta(final_state, delta)
+
+    return Chapter(
+        id=row['id'],
+        book_id=row['book_id'],
+        number=row['number'],
+        title=row['title'],
+        status=row['status'],
+        session_id=row['session_id'],
+        game_transcript=transcript or [],
+        initial_state=json.loads(codec.decode(row['initial_state'])),
+        final_state=final_state,
+        authored_content=codec.decode(row['authored_content']),
+        last_edited=row['last_edited'],
+        word_count=row['word_count'],
+        previous_chapter_id=row['previous_chapter_id'],
+        next_chapter_id=row['next_chapter_id'],
+        narrative_summary=row['narrative_summary'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+        version=row['version']
+    )
+
+def _row_to_book(book_row: sqlite3.Row, chapters: list) -> Book:
+    """Build a Book model from a books table row and its loaded chapters"""
+    return Book(
+        id=book_row['id'],
+        user_id=book_row['user_id'],
+        title=book_row['title'],
+        subtitle=book_row['subtitle'],
+        game_config=GameConfig.model_validate_json(codec.decode(book_row['game_config'])),
+        chapters=chapters,
+        created_at=book_row['created_at'],
+        updated_at=book_row['updated_at'],
+        total_word_count=book_row['total_word_count']
+    )
+
+def _load_pending_deltas(conn: sqlite3.Connection, scope: str, params: tuple) -> Dict[str, List[dict]]:
+    """
+    Load the state deltas recorded after each chapter's last snapshot, keyed by chapter id.
+    `scope` is a WHERE clause over chapters `c` (and books `b`) selecting the chapters.
+    """
+    rows = conn.execute(f"""
+        SELECT d.chapter_id, d.delta FROM chapter_state_deltas d
+        JOIN chapters c ON c.id = d.chapter_id
+        JOIN books b ON b.id = c.book_id
+        WHERE {scope} AND d.turn > c.state_turn
+        ORDER BY d.chapter_id, d.turn
+    """, params).fetchall()
+
+    deltas: Dict[str, List[dict]] = {}
+    for row in rows:
+        deltas.setdefault(row['chapter_id'], []).append(json.loads(row['delta']))
+    return deltas
+
+def init_database():
+    """Bring the books database schema up to date"""
+    with connection() as conn:
+        applied = migrations.apply_migrations(conn)
+
+    if applied:
+        print(f"Applied schema migrations: {', '.join(str(v) for v in applied)}")
     print(f"Database initialized at {DATABASE_PATH}")
 
 def create_book(user_id: str, title: str, game_config: GameConfig, subtitle: Optional[str] = None) -> Book:
     """Create a new book"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
     book_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
 
-    cursor.execute("""
-        INSERT INTO books (id, user_id, title, subtitle, game_config, created_at, updated_at, total_word_count)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (book_id, user_id, title, subtitle, game_config.model_dump_json(), now, now, 0))
-
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO books (id, user_id, title, subtitle, game_config, created_at, updated_at, total_word_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (book_id, user_id, title, subtitle, codec.encode(game_config.model_dump_json()), now, now, 0))
 
     return Book(
         id=book_id,
@@ -88,61 +312,39 @@ def create_book(user_id: str, title: str, game_config: GameConfig, subtitle: Opt
         total_word_count=0
     )
 
-def get_book(book_id: str) -> Optional[Book]:
-    """Get a book with all its chapters"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def get_book(book_id: str, include_transcripts: bool = True) -> Optional[Book]:
+    """Get a book with all its chapters (and, unless disabled, their transcripts)"""
+    with connection() as conn:
+        book_row = conn.execute("SELECT * FROM books WHERE id = ?", (book_id,)).fetchone()
 
-    cursor.execute("SELECT * FROM books WHERE id = ?", (book_id,))
-    book_row = cursor.fetchone()
+        if not book_row:
+            return None
 
-    if not book_row:
-        conn.close()
-        return None
+        # Get all chapters
+        chapter_rows = conn.execute(
+            "SELECT * FROM chapters WHERE book_id = ? ORDER BY number", (book_id,)
+        ).fetchall()
+
+        # Get every chapter's transcript in one pass
+        message_rows = conn.execute("""
+            SELECT m.* FROM chapter_messages m
+            JOIN chapters c ON c.id = m.chapter_id
+            WHERE c.book_id = ?
+            ORDER BY m.chapter_id, m.seq
+        """, (book_id,)).fetchall() if include_transcripts else []
 
-    # Get all chapters
-    cursor.execute("SELECT * FROM chapters WHERE book_id = ? ORDER BY number", (book_id,))
-    chapter_rows = cursor.fetchall()
+        deltas = _load_pending_deltas(conn, "c.book_id = ?", (book_id,))
 
-    conn.close()
+    transcripts = {}
+    for row in message_rows:
+        transcripts.setdefault(row['chapter_id'], []).append(_row_to_message(row))
 
     chapters = [
-        Chapter(
-            id=row['id'],
-            book_id=row['book_id'],
-            number=row['number'],
-            title=row['title'],
-            status=row['status'],
-            session_id=row['session_id'],
-            game_transcript=json.loads(row['game_transcript']),
-            initial_state=json.loads(row['initial_state']),
-            final_state=json.loads(row['final_state']),
-            authored_content=row['authored_content'],
-            last_edited=row['last_edited'],
-            word_count=row['word_count'],
-            previous_chapter_id=row['previous_chapter_id'],
-            next_chapter_id=row['next_chapter_id'],
-            narrative_summary=row['narrative_summary'],
-            created_at=row['created_at'],
-            updated_at=row['updated_at']
-        )
+        _row_to_chapter(row, transcripts.get(row['id']), deltas.get(row['id']))
         for row in chapter_rows
     ]
 
-    game_config = GameConfig.model_validate_json(book_row['game_config'])
-
-    return Book(
-        id=book_row['id'],
-        user_id=book_row['user_id'],
-        title=book_row['title'],
-        subtitle=book_row['subtitle'],
-        game_config=game_config,
-        chapters=chapters,
-        created_at=book_row['created_at'],
-        updated_at=book_row['updated_at'],
-        total_word_count=book_row['total_word_count']
-    )
+    return _row_to_book(book_row, chapters)
 
 def create_chapter(
     book_id: str,
@@ -152,41 +354,41 @@ def create_chapter(
     previous_chapter_id: Optional[str] = None
 ) -> Chapter:
     """Create a new chapter"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # Get the next chapter number
-    cursor.execute("SELECT MAX(number) FROM chapters WHERE book_id = ?", (book_id,))
-    result = cursor.fetchone()
-    next_number = (result[0] or 0) + 1
-
     chapter_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
 
-    cursor.execute("""
-        INSERT INTO chapters (
-            id, book_id, number, title, status, session_id, game_transcript,
-            initial_state, final_state, authored_content, last_edited, word_count,
-            previous_chapter_id, next_chapter_id, narrative_summary, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        chapter_id, book_id, next_number, title, 'draft', session_id,
-        json.dumps([]),  # Empty transcript
-        json.dumps(initial_state),
-        json.dumps(initial_state),  # Final state starts same as initial
-        '',  # Empty authored content
-        now, 0, previous_chapter_id, None, None, now, now
-    ))
-
-    # Update previous chapter's next_chapter_id
-    if previous_chapter_id:
-        cursor.execute(
-            "UPDATE chapters SET next_chapter_id = ?, updated_at = ? WHERE id = ?",
-            (chapter_id, now, previous_chapter_id)
+    with transaction() as conn:
+        # Get the next chapter number
+        result = conn.execute("SELECT MAX(number) FROM chapters WHERE book_id = ?", (book_id,)).fetchone()
+        next_number = (result[0] or 0) + 1
+
+        conn.execute("""
+            INSERT INTO chapters (
+                id, book_id, number, title, status, session_id, game_transcript,
+                initial_state, final_state, authored_content, last_edited, word_count,
+                previous_chapter_id, next_chapter_id, narrative_summary, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            chapter_id, book_id, next_number, title, 'draft', session_id,
+            json.dumps([]),  # Empty transcript
+            codec.encode(json.dumps(initial_state)),
+            codec.encode(json.dumps(initial_state)),  # Final state starts same as initial
+            '',  # Empty authored content
+            now, 0, previous_chapter_id, None, None, now, now
+        ))
+
+        # Turn 0 snapshot: state at chapter start
+        conn.execute(
+            "INSERT INTO chapter_state_snapshots (chapter_id, turn, state, created_at) VALUES (?, ?, ?, ?)",
+            (chapter_id, 0, codec.encode(json.dumps(initial_state)), now)
         )
 
-    conn.commit()
-    conn.close()
+        # Update previous chapter's next_chapter_id
+        if previous_chapter_id:
+            conn.execute(
+                "UPDATE chapters SET next_chapter_id = ?, updated_at = ? WHERE id = ?",
+                (chapter_id, now, previous_chapter_id)
+            )
 
     return Chapter(
         id=chapter_id,
@@ -208,133 +410,448 @@ def create_chapter(
         updated_at=now
     )
 
-def get_chapter(chapter_id: str) -> Optional[Chapter]:
-    """Get a single chapter"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def get_chapter(
+    chapter_id: str,
+    include_transcript: bool = True,
+    transcript_limit: Optional[int] = None
+) -> Optional[Chapter]:
+    """
+    Get a single chapter. With transcript_limit, game_transcript only holds the
+    latest that many messages; page back with get_chapter_messages(before_seq=...).
+    """
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM chapters WHERE id = ?", (chapter_id,)).fetchone()
+
+        if not row:
+            return None
+
+        transcript = _load_messages(conn, chapter_id, limit=transcript_limit) if include_transcript else None
+        deltas = _load_pending_deltas(conn, "c.id = ?", (chapter_id,))
+
+    return _row_to_chapter(row, transcript, deltas.get(chapter_id))
+
+def _message_dict(msg) -> dict:
+    """Normalize a GameMessage or plain dict into a message dict"""
+    if hasattr(msg, 'model_dump'):
+        msg = msg.model_dump()
+    return {
+        'role': msg['role'],
+        'content': msg['content'],
+        'timestamp': msg.get('timestamp') or datetime.utcnow().isoformat()
+    }
+
+def _insert_messages(conn: sqlite3.Connection, chapter_id: str, messages: list, start_seq: int) -> int:
+    """Insert messages with consecutive seq numbers starting at start_seq. Returns the last seq."""
+    rows = []
+    for offset, msg in enumerate(messages):
+        msg = _message_dict(msg)
+        rows.append((chapter_id, start_seq + offset, msg['role'], codec.encode(msg['content']), msg['timestamp']))
+
+    conn.executemany(
+        "INSERT INTO chapter_messages (chapter_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    return start_seq + len(rows) - 1
+
+def _load_messages(
+    conn: sqlite3.Connection,
+    chapter_id: str,
+    after_seq: Optional[int] = None,
+    before_seq: Optional[int] = None,
+    limit: Optional[int] = None
+) -> List[GameMessage]:
+    """
+    Read a range of a chapter's messages in seq order. With a limit, a window that
+    only has after_seq pages forward from it; otherwise the window is the latest
+    `limit` messages before before_seq (or the end of the transcript).
+    """
+    query = "SELECT * FROM chapter_messages WHERE chapter_id = ?"
+    params: list = [chapter_id]
+
+    if after_seq is not None:
+        query += " AND seq > ?"
+        params.append(after_seq)
+    if before_seq is not None:
+        query += " AND seq < ?"
+        params.append(before_seq)
+
+    newest_first = limit is not None and after_seq is None
+    query += " ORDER BY seq DESC" if newest_first else " ORDER BY seq"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    rows = conn.execute(query, params).fetchall()
+    if newest_first:
+        rows.reverse()
+    return [_row_to_message(row) for row in rows]
+
+def get_chapter_messages(
+    chapter_id: str,
+    after_seq: Optional[int] = None,
+    before_seq: Optional[int] = None,
+    limit: Optional[int] = None
+) -> List[GameMessage]:
+    """
+    Get a range of a chapter's transcript messages, oldest first.
+    after_seq/before_seq are exclusive bounds on the message sequence number; with a
+    limit and no after_seq the latest messages in range are returned.
+    """
+    with connection() as conn:
+        return _load_messages(conn, chapter_id, after_seq, before_seq, limit)
 
-    cursor.execute("SELECT * FROM chapters WHERE id = ?", (chapter_id,))
-    row = cursor.fetchone()
-    conn.close()
+def append_chapter_messages(chapter_id: str, messages: list) -> int:
+    """
+    Append messages to a chapter's transcript without touching earlier rows.
+    Returns the seq of the last appended message.
+    """
+    now = datetime.utcnow().isoformat()
 
-    if not row:
-        return None
+    with transaction() as conn:
+        last_seq = conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM chapter_messages WHERE chapter_id = ?",
+            (chapter_id,)
+        ).fetchone()[0]
+        last_seq = _insert_messages(conn, chapter_id, messages, start_seq=last_seq + 1)
+        conn.execute("UPDATE chapters SET updated_at = ? WHERE id = ?", (now, chapter_id))
 
-    return Chapter(
-        id=row['id'],
-        book_id=row['book_id'],
-        number=row['number'],
-        title=row['title'],
-        status=row['status'],
-        session_id=row['session_id'],
-        game_transcript=json.loads(row['game_transcript']),
-        initial_state=json.loads(row['initial_state']),
-        final_state=json.loads(row['final_state']),
-        authored_content=row['authored_content'],
-        last_edited=row['last_edited'],
-        word_count=row['word_count'],
-        previous_chapter_id=row['previous_chapter_id'],
-        next_chapter_id=row['next_chapter_id'],
-        narrative_summary=row['narrative_summary'],
-        created_at=row['created_at'],
-        updated_at=row['updated_at']
-    )
+    return last_seq
+
+def record_chapter_turns(chapter_id: str, turns: List[Tuple[list, dict]]) -> int:
+    """
+    Append several turns in one transaction. Each turn is (messages, state after the turn);
+    only the change from the previous state is stored. Returns the seq of the last message.
+    """
+    last_seq = 0
+    with transaction() as conn:
+        for messages, state in turns:
+            last_seq = append_chapter_messages(chapter_id, messages)
+            _record_state(conn, chapter_id, state, message_seq=last_seq)
 
-def update_chapter(chapter_id: str, **updates) -> Optional[Chapter]:
-    """Update a chapter with provided fields"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    return last_seq
 
+def record_chapter_turn(chapter_id: str, messages: list, final_state: dict) -> int:
+    """
+    Append a turn's messages and record the resulting state in one transaction.
+    Returns the seq of the last appended message.
+    """
+    return record_chapter_turns(chapter_id, [(messages, final_state)])
+
+def _replace_messages(conn: sqlite3.Connection, chapter_id: str, transcript: list) -> None:
+    """Replace a chapter's whole transcript (compatibility path for full rewrites)"""
+    conn.execute("DELETE FROM chapter_messages WHERE chapter_id = ?", (chapter_id,))
+    _insert_messages(conn, chapter_id, transcript, start_seq=1)
+
+def _update_chapter_row(
+    conn: sqlite3.Connection,
+    chapter_id: str,
+    expected_version: Optional[int],
+    set_clause: str,
+    values: list
+) -> None:
+    """
+    Apply an UPDATE to a chapter row and bump its version. With expected_version the
+    update only applies if the row is still at that version; otherwise
+    ConcurrentModificationError is raised (and the surrounding transaction rolls back).
+    """
+    query = f"UPDATE chapters SET {set_clause}, version = version + 1 WHERE id = ?"
+    params = values + [chapter_id]
+    if expected_version is not None:
+        query += " AND version = ?"
+        params.append(expected_version)
+
+    if conn.execute(query, params).rowcount == 0 and expected_version is not None:
+        row = conn.execute("SELECT version FROM chapters WHERE id = ?", (chapter_id,)).fetchone()
+        if row:
+            raise ConcurrentModificationError(chapter_id, expected_version, row['version'])
+
+def update_chapter(chapter_id: str, expected_version: Optional[int] = None, **updates) -> Optional[Chapter]:
+    """
+    Update a chapter with provided fields.
+    Pass expected_version (the `version` the changes were based on) to make it a
+    compare-and-swap: raises ConcurrentModificationError if someone else updated first.
+    Turns appended through append_chapter_messages/record_chapter_turns don't change the
+    version - they never overwrite anything, so they can't conflict with an edit.
+    """
     now = datetime.utcnow().isoformat()
     updates['updated_at'] = now
 
+    # The transcript is stored as chapter_messages rows, not in the chapters table
+    transcript = updates.pop('game_transcript', None)
+    if isinstance(transcript, str):
+        transcript = json.loads(transcript)
+
+    # final_state is recorded as a delta against the current state
+    final_state = updates.pop('final_state', None)
+    if isinstance(final_state, str):
+        final_state = json.loads(final_state)
+
+    for column in ('initial_state', 'authored_content'):
+        if column in updates:
+            value = updates[column]
+            updates[column] = codec.encode(value if isinstance(value, str) else json.dumps(value))
+
     # Build dynamic UPDATE query
     set_clause = ', '.join(f"{key} = ?" for key in updates.keys())
-    values = list(updates.values()) + [chapter_id]
+    values = list(updates.values())
 
-    cursor.execute(f"UPDATE chapters SET {set_clause} WHERE id = ?", values)
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        _update_chapter_row(conn, chapter_id, expected_version, set_clause, values)
+        if transcript is not None:
+            _replace_messages(conn, chapter_id, transcript)
+        if final_state is not None:
+            _record_state(conn, chapter_id, final_state)
 
     return get_chapter(chapter_id)
 
-def update_chapter_transcript(chapter_id: str, transcript: list) -> None:
-    """Update a chapter's game_transcript"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def update_chapter_transcript(chapter_id: str, transcript: list, expected_version: Optional[int] = None) -> None:
+    """
+    Replace a chapter's game_transcript. Prefer append_chapter_messages for new turns.
+    A full rewrite is read-modify-write, so it bumps the version and takes expected_version
+    like update_chapter.
+    """
     now = datetime.utcnow().isoformat()
 
-    cursor.execute(
-        "UPDATE chapters SET game_transcript = ?, updated_at = ? WHERE id = ?",
-        (json.dumps(transcript), now, chapter_id)
+    with transaction() as conn:
+        _update_chapter_row(conn, chapter_id, expected_version, "updated_at = ?", [now])
+        _replace_messages(conn, chapter_id, transcript)
+
+def _current_state(conn: sqlite3.Connection, chapter_id: str) -> Tuple[dict, int, int]:
+    """Return (latest state, latest turn, last snapshot turn) for a chapter"""
+    row = conn.execute(
+        "SELECT final_state, state_turn FROM chapters WHERE id = ?", (chapter_id,)
+    ).fetchone()
+    state = json.loads(codec.decode(row['final_state']))
+
+    deltas = conn.execute(
+        "SELECT delta FROM chapter_state_deltas WHERE chapter_id = ? AND turn > ? ORDER BY turn",
+        (chapter_id, row['state_turn'])
+    ).fetchall()
+    for delta_row in deltas:
+        state = apply_delta(state, json.loads(delta_row['delta']))
+
+    return state, row['state_turn'] + len(deltas), row['state_turn']
+
+def _record_state(
+    conn: sqlite3.Connection,
+    chapter_id: str,
+    state: dict,
+    message_seq: Optional[int] = None
+) -> Optional[int]:
+    """
+    Record a new chapter state as a delta against the current one.
+    Every STATE_SNAPSHOT_INTERVAL turns the full state is written as a snapshot and
+    becomes chapters.final_state. Returns the new turn, or None if nothing changed.
+    """
+    current, turn, snapshot_turn = _current_state(conn, chapter_id)
+    delta = diff_state(current, state)
+    if not delta:
+        return None
+
+    turn += 1
+    now = datetime.utcnow().isoformat()
+    conn.execute(
+        "INSERT INTO chapter_state_deltas (chapter_id, turn, delta, message_seq, created_at) VALUES (?, ?, ?, ?, ?)",
+        (chapter_id, turn, json.dumps(delta), message_seq, now)
     )
-    conn.commit()
-    conn.close()
+
+    if turn - snapshot_turn >= STATE_SNAPSHOT_INTERVAL:
+        state_blob = codec.encode(json.dumps(state))
+        conn.execute(
+            "INSERT OR REPLACE INTO chapter_state_snapshots (chapter_id, turn, state, created_at) VALUES (?, ?, ?, ?)",
+            (chapter_id, turn, state_blob, now)
+        )
+        conn.execute(
+            "UPDATE chapters SET final_state = ?, state_turn = ? WHERE id = ?",
+            (state_blob, turn, chapter_id)
+        )
+
+    return turn
 
 def update_chapter_state(chapter_id: str, state: dict) -> None:
-    """Update a chapter's final_state"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    """Update a chapter's final_state (stored as a delta against the current state)"""
     now = datetime.utcnow().isoformat()
 
-    cursor.execute(
-        "UPDATE chapters SET final_state = ?, updated_at = ? WHERE id = ?",
-        (json.dumps(state), now, chapter_id)
+    with transaction() as conn:
+        _record_state(conn, chapter_id, state)
+        conn.execute("UPDATE chapters SET updated_at = ? WHERE id = ?", (now, chapter_id))
+
+def get_chapter_state(chapter_id: str, turn: Optional[int] = None) -> Optional[ChapterStateAtTurn]:
+    """
+    Reconstruct a chapter's state as of a state turn (latest if omitted).
+    Starts from the nearest snapshot at or before the turn, so at most
+    STATE_SNAPSHOT_INTERVAL deltas are replayed.
+    """
+    with connection() as conn:
+        row = conn.execute("SELECT state_turn FROM chapters WHERE id = ?", (chapter_id,)).fetchone()
+        if not row:
+            return None
+
+        latest_turn = conn.execute(
+            "SELECT MAX(turn) FROM chapter_state_deltas WHERE chapter_id = ?", (chapter_id,)
+        ).fetchone()[0] or 0
+        latest_turn = max(latest_turn, row['state_turn'])
+        turn = latest_turn if turn is None else max(0, min(turn, latest_turn))
+
+        snapshot = conn.execute("""
+            SELECT turn, state FROM chapter_state_snapshots
+            WHERE chapter_id = ? AND turn <= ?
+            ORDER BY turn DESC LIMIT 1
+        """, (chapter_id, turn)).fetchone()
+        if snapshot:
+            snapshot_turn, state = snapshot['turn'], json.loads(codec.decode(snapshot['state']))
+        else:
+            initial = conn.execute("SELECT initial_state FROM chapters WHERE id = ?", (chapter_id,)).fetchone()
+            snapshot_turn, state = 0, json.loads(codec.decode(initial['initial_state']))
+
+        deltas = conn.execute("""
+            SELECT turn, delta, message_seq FROM chapter_state_deltas
+            WHERE chapter_id = ? AND turn > ? AND turn <= ?
+            ORDER BY turn
+        """, (chapter_id, snapshot_turn, turn)).fetchall()
+
+        message_seq = None
+        for delta_row in deltas:
+            state = apply_delta(state, json.loads(delta_row['delta']))
+            message_seq = delta_row['message_seq']
+
+        if not deltas and turn > 0:
+            seq_row = conn.execute(
+                "SELECT message_seq FROM chapter_state_deltas WHERE chapter_id = ? AND turn = ?",
+                (chapter_id, turn)
+            ).fetchone()
+            message_seq = seq_row['message_seq'] if seq_row else None
+
+    return ChapterStateAtTurn(
+        chapter_id=chapter_id,
+        turn=turn,
+        latest_turn=latest_turn,
+        message_seq=message_seq,
+        state=state
     )
-    conn.commit()
-    conn.close()
 
-def get_chapter_by_session_id(session_id: str) -> Optional[Chapter]:
+def get_chapter_by_session_id(session_id: str, include_transcript: bool = True) -> Optional[Chapter]:
     """Get a chapter by its session_id"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM chapters WHERE session_id = ?", (session_id,)).fetchone()
 
-    cursor.execute("SELECT * FROM chapters WHERE session_id = ?", (session_id,))
-    row = cursor.fetchone()
-    conn.close()
+        if not row:
+            return None
 
-    if not row:
-        return None
+        transcript = _load_messages(conn, row['id']) if include_transcript else None
+        deltas = _load_pending_deltas(conn, "c.id = ?", (row['id'],))
 
-    return Chapter(
-        id=row['id'],
-        book_id=row['book_id'],
-        number=row['number'],
-        title=row['title'],
-        status=row['status'],
-        session_id=row['session_id'],
-        game_transcript=json.loads(row['game_transcript']),
-        initial_state=json.loads(row['initial_state']),
-        final_state=json.loads(row['final_state']),
-        authored_content=row['authored_content'],
-        last_edited=row['last_edited'],
-        word_count=row['word_count'],
-        previous_chapter_id=row['previous_chapter_id'],
-        next_chapter_id=row['next_chapter_id'],
-        narrative_summary=row['narrative_summary'],
-        created_at=row['created_at'],
-        updated_at=row['updated_at']
-    )
+    return _row_to_chapter(row, transcript, deltas.get(row['id']))
+
+def get_chapter_id_by_session_id(session_id: str) -> Optional[str]:
+    """Get the id of the chapter played in a session, without loading the chapter"""
+    with connection() as conn:
+        row = conn.execute("SELECT id FROM chapters WHERE session_id = ?", (session_id,)).fetchone()
+
+    return row['id'] if row else None
 
 def list_books_by_user(user_id: str) -> List[Book]:
-    """Get all books for a user"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    """
+    Get all books for a user with their chapters and transcripts.
+    Loads everything in four queries regardless of how many books the user has.
+    """
+    with connection() as conn:
+        book_rows = conn.execute(
+            "SELECT * FROM books WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
+        ).fetchall()
+
+        chapter_rows = conn.execute("""
+            SELECT c.* FROM chapters c
+            JOIN books b ON b.id = c.book_id
+            WHERE b.user_id = ?
+            ORDER BY c.book_id, c.number
+        """, (user_id,)).fetchall()
+
+        message_rows = conn.execute("""
+            SELECT m.* FROM chapter_messages m
+            JOIN chapters c ON c.id = m.chapter_id
+            JOIN books b ON b.id = c.book_id
+            WHERE b.user_id = ?
+            ORDER BY m.chapter_id, m.seq
+        """, (user_id,)).fetchall()
+
+        deltas = _load_pending_deltas(conn, "b.user_id = ?", (user_id,))
+
+    transcripts = {}
+    for row in message_rows:
+        transcripts.setdefault(row['chapter_id'], []).append(_row_to_message(row))
+
+    chapters_by_book = {}
+    for row in chapter_rows:
+        chapters_by_book.setdefault(row['book_id'], []).append(
+            _row_to_chapter(row, transcripts.get(row['id']), deltas.get(row['id']))
+        )
 
-    cursor.execute("SELECT id FROM books WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    book_ids = [row['id'] for row in cursor.fetchall()]
-    conn.close()
+    return [_row_to_book(row, chapters_by_book.get(row['id'], [])) for row in book_rows]
 
-    return [get_book(book_id) for book_id in book_ids if get_book(book_id)]
+def list_book_summaries(
+    user_id: str,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[str, str]] = None
+) -> List[BookSummary]:
+    """
+    Get the library listing for a user, newest first: book metadata plus chapter headers.
+    Never reads transcripts or chapter state, and runs two queries total.
+    For keyset paging pass `limit` and, for later pages, `before` = (created_at, id)
+    of the last book already returned.
+    """
+    query = "SELECT * FROM books WHERE user_id = ?"
+    params: list = [user_id]
+    if before is not None:
+        query += " AND (created_at, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    with connection() as conn:
+        book_rows = conn.execute(query, params).fetchall()
+        book_ids = [row['id'] for row in book_rows]
+
+        chapter_rows = conn.execute(f"""
+            SELECT c.id, c.book_id, c.number, c.title, c.status, c.word_count,
+                   c.last_edited, c.created_at, c.updated_at
+            FROM chapters c
+            WHERE c.book_id IN ({', '.join('?' for _ in book_ids)})
+            ORDER BY c.book_id, c.number
+        """, book_ids).fetchall() if book_ids else []
+
+    chapters_by_book = {}
+    for row in chapter_rows:
+        chapters_by_book.setdefault(row['book_id'], []).append(ChapterSummary(
+            id=row['id'],
+            number=row['number'],
+            title=row['title'],
+            status=row['status'],
+            word_count=row['word_count'],
+            last_edited=row['last_edited'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at']
+        ))
+
+    return [
+        BookSummary(
+            id=row['id'],
+            user_id=row['user_id'],
+            title=row['title'],
+            subtitle=row['subtitle'],
+            game_config=GameConfig.model_validate_json(codec.decode(row['game_config'])),
+            chapters=chapters_by_book.get(row['id'], []),
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
+            total_word_count=row['total_word_count']
+        )
+        for row in book_rows
+    ]
 
 def update_book(book_id: str, title: Optional[str] = None, subtitle: Optional[str] = None, game_config: Optional[GameConfig] = None) -> Optional[Book]:
     """Update book metadata"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
     now = datetime.utcnow().isoformat()
     updates = {'updated_at': now}
 
@@ -343,32 +860,22 @@ def update_book(book_id: str, title: Optional[str] = None, subtitle: Optional[st
     if subtitle is not None:
         updates['subtitle'] = subtitle
     if game_config is not None:
-        updates['game_config'] = game_config.model_dump_json()
+        updates['game_config'] = codec.encode(game_config.model_dump_json())
 
     # Build dynamic UPDATE query
     set_clause = ', '.join(f"{key} = ?" for key in updates.keys())
     values = list(updates.values()) + [book_id]
 
-    cursor.execute(f"UPDATE books SET {set_clause} WHERE id = ?", values)
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(f"UPDATE books SET {set_clause} WHERE id = ?", values)
 
     return get_book(book_id)
 
 def delete_book(book_id: str) -> bool:
     """Delete a book and all its chapters"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # First delete all chapters associated with the book
-    cursor.execute("DELETE FROM chapters WHERE book_id = ?", (book_id,))
-
-    # Then delete the book itself
-    cursor.execute("DELETE FROM books WHERE id = ?", (book_id,))
-
-    deleted_count = cursor.rowcount
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        # Chapters and their transcripts go with it via ON DELETE CASCADE
+        deleted_count = conn.execute("DELETE FROM books WHERE id = ?", (book_id,)).rowcount
 
     return deleted_count > 0
 
@@ -377,25 +884,19 @@ def update_book_total_word_count(book_id: str) -> int:
     Recalculate and update the book's total_word_count by summing all chapter word counts.
     Returns the new total word count.
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # Sum all chapter word counts for this book
-    cursor.execute(
-        "SELECT COALESCE(SUM(word_count), 0) FROM chapters WHERE book_id = ?",
-        (book_id,)
-    )
-    total = cursor.fetchone()[0]
-
-    # Update the book's total_word_count
-    now = datetime.utcnow().isoformat()
-    cursor.execute(
-        "UPDATE books SET total_word_count = ?, updated_at = ? WHERE id = ?",
-        (total, now, book_id)
-    )
-
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        # Sum all chapter word counts for this book
+        total = conn.execute(
+            "SELECT COALESCE(SUM(word_count), 0) FROM chapters WHERE book_id = ?",
+            (book_id,)
+        ).fetchone()[0]
+
+        # Update the book's total_word_count
+        now = datetime.utcnow().isoformat()
+        conn.execute(
+            "UPDATE books SET total_word_count = ?, updated_at = ? WHERE id = ?",
+            (total, now, book_id)
+        )
 
     return total
 
@@ -405,44 +906,393 @@ def delete_chapter(chapter_id: str) -> bool:
     Delete a chapter and update chapter links.
     When deleting a middle chapter, links the previous and next chapters together.
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    with transaction() as conn:
+        # First, get the chapter's previous and next links
+        result = conn.execute(
+            "SELECT previous_chapter_id, next_chapter_id FROM chapters WHERE id = ?",
+            (chapter_id,)
+        ).fetchone()
+
+        if not result:
+            return False
+
+        previous_chapter_id, next_chapter_id = result
+
+        # Update the previous chapter's next_chapter_id to skip over the deleted chapter
+        if previous_chapter_id:
+            conn.execute(
+                "UPDATE chapters SET next_chapter_id = ? WHERE id = ?",
+                (next_chapter_id, previous_chapter_id)
+            )
+
+        # Update the next chapter's previous_chapter_id to skip over the deleted chapter
+        if next_chapter_id:
+            conn.execute(
+                "UPDATE chapters SET previous_chapter_id = ? WHERE id = ?",
+                (previous_chapter_id, next_chapter_id)
+            )
+
+        # Delete the chapter (its transcript is removed via ON DELETE CASCADE)
+        deleted_count = conn.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,)).rowcount
 
-    # First, get the chapter's previous and next links
-    cursor.execute(
-        "SELECT previous_chapter_id, next_chapter_id FROM chapters WHERE id = ?",
-        (chapter_id,)
-    )
-    result = cursor.fetchone()
+    return deleted_count > 0
+
+# Markers snippet() wraps matched terms in; stripped into highlight offsets
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+SNIPPET_TOKENS = 16  # words of context per search snippet
+
+def _fts_query(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last one as a
+    prefix (so results show up while typing) and "quoted phrases" are kept together.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\w+)', query):
+        words = re.findall(r'\w+', phrase) if phrase else [word]
+        if words:
+            terms.append('"' + ' '.join(words) + '"')
+    if terms and not query.rstrip().endswith('"'):
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def _split_highlights(snippet: str) -> Tuple[str, List[List[int]]]:
+    text = []
+    highlights = []
+    length = 0
+    for part in re.split(f'([{_HIGHLIGHT_START}{_HIGHLIGHT_END}])', snippet):
+        if part == _HIGHLIGHT_START:
+            highlights.append([length, length])
+        elif part == _HIGHLIGHT_END:
+            highlights[-1][1] = length
+        else:
+            text.append(part)
+            length += len(part)
+    return ''.join(text), highlights
+
+def search(
+    query: str,
+    user_id: Optional[str] = None,
+    book_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> SearchResponse:
+    """
+    Ranked full-text search over transcript messages, authored content and chapter
+    summaries, scoped to a user's library or a single book. Ranking runs on the FTS
+    index alone; text is only decoded to build snippets for the returned page.
+    """
+    match = _fts_query(query)
+    if not match:
+        return SearchResponse(query=query, total=0, limit=limit, offset=offset, results=[])
+
+    scope = []
+    params: list = [match]
+    if user_id is not None:
+        scope.append("b.user_id = ?")
+        params.append(user_id)
+    if book_id is not None:
+        scope.append("c.book_id = ?")
+        params.append(book_id)
+    where = " AND ".join(["search_index MATCH ?"] + scope)
+
+    joins = """
+        FROM search_index
+        JOIN search_docs d ON d.id = search_index.rowid
+        JOIN chapters c ON c.id = d.chapter_id
+        JOIN books b ON b.id = c.book_id
+    """
+
+    with connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) {joins} WHERE {where}", params).fetchone()[0]
+
+        rows = conn.execute(f"""
+            SELECT d.id, d.kind, d.seq, c.id AS chapter_id, c.number, c.title AS chapter_title,
+                   b.id AS book_id, b.title AS book_title, bm25(search_index) AS score
+            {joins}
+            WHERE {where}
+            ORDER BY score
+            LIMIT ? OFFSET ?
+        """, params + [limit, offset]).fetchall()
+
+        snippets = {}
+        if rows:
+            ids = [row['id'] for row in rows]
+            snippets = dict(conn.execute(f"""
+                SELECT rowid, snippet(search_index, 0, ?, ?, '…', ?)
+                FROM search_index
+                WHERE search_index MATCH ? AND rowid IN ({', '.join('?' for _ in ids)})
+            """, [_HIGHLIGHT_START, _HIGHLIGHT_END, SNIPPET_TOKENS, match] + ids).fetchall())
+
+    results = []
+    for row in rows:
+        snippet, highlights = _split_highlights(snippets.get(row['id']) or '')
+        results.append(SearchHit(
+            book_id=row['book_id'],
+            book_title=row['book_title'],
+            chapter_id=row['chapter_id'],
+            chapter_number=row['number'],
+            chapter_title=row['chapter_title'],
+            kind=row['kind'],
+            message_seq=row['seq'] if row['kind'] == 'message' else None,
+            snippet=snippet,
+            highlights=highlights,
+            score=row['score']
+        ))
+
+    return SearchResponse(query=query, total=total, limit=limit, offset=offset, results=results)
+
+def compress_batch(table: str, after: Optional[tuple] = None, batch_size: int = 500) -> Tuple[Optional[tuple], int]:
+    """
+    Compress up to `batch_size` plain-text rows of `table` whose primary key sorts
+    after `after`, in one short transaction. Returns (last key handled, rows visited);
+    the key is None once the table has no plain-text rows left.
+    """
+    _, key, columns = next(spec for spec in COMPRESSED_COLUMNS if spec[0] == table)
+    key_list = ", ".join(key)
+    where = "(" + " OR ".join(
+        f"(typeof({col}) = 'text' AND length({col}) >= {codec.COMPRESS_MIN_BYTES})" for col in columns
+    ) + ")"
+    params: list = []
+    if after is not None:
+        # Keyset paging, so values that don't shrink (and stay TEXT) aren't revisited
+        where += f" AND ({key_list}) > ({', '.join('?' for _ in key)})"
+        params.extend(after)
+
+    with transaction() as conn:
+        rows = conn.execute(
+            f"SELECT {key_list}, {', '.join(columns)} FROM {table} WHERE {where} ORDER BY {key_list} LIMIT ?",
+            params + [batch_size]
+        ).fetchall()
+
+        for row in rows:
+            conn.execute(
+                f"UPDATE {table} SET {', '.join(f'{col} = ?' for col in columns)} "
+                f"WHERE {' AND '.join(f'{k} = ?' for k in key)}",
+                [codec.encode(row[col]) if isinstance(row[col], str) else row[col] for col in columns]
+                + [row[k] for k in key]
+            )
+
+    if not rows:
+        return None, 0
+    return tuple(rows[-1][k] for k in key), len(rows)
+
+def compress_legacy_rows(batch_size: int = 500) -> int:
+    """
+    Compress every row written before column compression was enabled, one batch per
+    transaction so other writers are never blocked for long. Safe to interrupt and
+    rerun. Returns the number of rows visited.
+    """
+    total = 0
+    for table, _, _ in COMPRESSED_COLUMNS:
+        after, count = compress_batch(table, None, batch_size)
+        while after is not None:
+            total += count
+            after, count = compress_batch(table, after, batch_size)
+    return total
 
-    if not result:
-        conn.close()
-        return False
+# Generation cache (persistent tier of generation_cache.py)
+
+def get_cached_generation(key: str, now: float) -> Optional[str]:
+    """Cached model output for `key`, or None if missing or expired at `now` (epoch seconds)"""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT value FROM generation_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+    return codec.decode(row['value']) if row else None
+
+def put_cached_generation(key: str, agent: str, value: str, now: float, ttl: float) -> None:
+    encoded = codec.encode(value)
+    size = len(encoded) if isinstance(encoded, bytes) else len(encoded.encode('utf-8'))
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO generation_cache (key, agent, value, size, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (key, agent, encoded, size, now, now + ttl)
+        )
 
-    previous_chapter_id, next_chapter_id = result
+def evict_generation_cache(max_bytes: int, now: float) -> int:
+    """
+    Delete expired entries, then the oldest ones until the stored values total at
+    most `max_bytes`. Returns the number of entries deleted.
+    """
+    with transaction() as conn:
+        deleted = conn.execute("DELETE FROM generation_cache WHERE expires_at <= ?", (now,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM generation_cache").fetchone()[0]
+        if total <= max_bytes:
+            return deleted
+
+        excess = total - max_bytes
+        oldest = []
+        for row in conn.execute("SELECT key, size FROM generation_cache ORDER BY created_at"):
+            oldest.append((row['key'],))
+            excess -= row['size']
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM generation_cache WHERE key = ?", oldest)
+    return deleted + len(oldest)
+
+def clear_generation_cache(agent: Optional[str] = None) -> int:
+    """Delete every cached generation, or only those of one agent. Returns the count"""
+    with transaction() as conn:
+        if agent is None:
+            return conn.execute("DELETE FROM generation_cache").rowcount
+        return conn.execute("DELETE FROM generation_cache WHERE agent = ?", (agent,)).rowcount
+
+# Background jobs (see jobs.py)
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        id=row['id'],
+        kind=row['kind'],
+        params=json.loads(row['params']),
+        status=row['status'],
+        progress=row['progress'],
+        progress_message=row['progress_message'],
+        attempts=row['attempts'],
+        max_attempts=row['max_attempts'],
+        error=row['error'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+        finished_at=row['finished_at']
+    )
 
-    # Update the previous chapter's next_chapter_id to skip over the deleted chapter
-    if previous_chapter_id:
-        cursor.execute(
-            "UPDATE chapters SET next_chapter_id = ? WHERE id = ?",
-            (next_chapter_id, previous_chapter_id)
+def create_job(kind: str, params: dict, user_id: str, max_attempts: int, now: float) -> Job:
+    job_id = str(uuid.uuid4())
+    timestamp = datetime.utcnow().isoformat()
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO jobs (id, kind, params, user_id, status, max_attempts, run_after, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+            """,
+            (job_id, kind, json.dumps(params), user_id, max_attempts, now, timestamp, timestamp)
         )
+    return get_job(job_id)
 
-    # Update the next chapter's previous_chapter_id to skip over the deleted chapter
-    if next_chapter_id:
-        cursor.execute(
-            "UPDATE chapters SET previous_chapter_id = ? WHERE id = ?",
-            (previous_chapter_id, next_chapter_id)
+def get_job(job_id: str) -> Optional[Job]:
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def get_job_result(job_id: str) -> Optional[dict]:
+    with connection() as conn:
+        row = conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if not row or row['result'] is None:
+        return None
+    return json.loads(codec.decode(row['result']))
+
+def claim_job(worker: str, now: float, lease: float) -> Optional[Tuple[Job, str]]:
+    """
+    Take the oldest due job - queued, or running on a worker whose lease lapsed - and
+    mark it running on `worker` until now + lease. Returns (job, user_id), or None.
+    A lapsed job that has already used all its attempts is marked failed instead of
+    being run again, so a kind registered with max_attempts=1 never runs twice.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'failed', error = 'Lease expired', lease_until = NULL,
+                updated_at = ?, finished_at = ?
+            WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts
+            """,
+            (timestamp, timestamp, now)
+        )
+        row = conn.execute(
+            """
+            SELECT id FROM jobs
+            WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?)
+            ORDER BY run_after LIMIT 1
+            """,
+            (now, now)
+        ).fetchone()
+        if not row:
+            return None
+        row = conn.execute(
+            """
+            UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1,
+                error = NULL, updated_at = ?
+            WHERE id = ? RETURNING *
+            """,
+            (worker, now + lease, timestamp, row['id'])
+        ).fetchone()
+    return _row_to_job(row), row['user_id']
+
+def renew_job_leases(worker: str, job_ids: List[str], lease_until: float) -> None:
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            [(lease_until, job_id, worker) for job_id in job_ids]
         )
 
-    # Delete the chapter
-    cursor.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
-    deleted_count = cursor.rowcount
+def update_job_progress(job_id: str, progress: float, message: Optional[str]) -> None:
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE jobs SET progress = ?, progress_message = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            (progress, message, datetime.utcnow().isoformat(), job_id)
+        )
 
-    conn.commit()
-    conn.close()
+def finish_job(job_id: str, worker: str, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> bool:
+    """
+    Record a running job's outcome (succeeded, failed or cancelled). Returns False if
+    the job is no longer running on `worker` - cancelled or claimed by another worker.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    with transaction() as conn:
+        return conn.execute(
+            """
+            UPDATE jobs SET status = ?, result = ?, error = ?, progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END,
+                lease_until = NULL, updated_at = ?, finished_at = ?
+            WHERE id = ? AND worker = ? AND status = 'running'
+            """,
+            (status, codec.encode(json.dumps(result)) if result is not None else None, error, status,
+             timestamp, timestamp, job_id, worker)
+        ).rowcount > 0
+
+def requeue_job(
+    job_id: str,
+    worker: str,
+    run_after: float,
+    error: Optional[str] = None,
+    count_attempt: bool = True
+) -> bool:
+    """
+    Put a running job back in the queue, to run again at run_after. With
+    count_attempt=False the interrupted run doesn't count towards max_attempts.
+    """
+    with transaction() as conn:
+        return conn.execute(
+            """
+            UPDATE jobs SET status = 'queued', error = ?, worker = NULL, lease_until = NULL, run_after = ?,
+                attempts = attempts - ?, updated_at = ?
+            WHERE id = ? AND worker = ? AND status = 'running'
+            """,
+            (error, run_after, 0 if count_attempt else 1, datetime.utcnow().isoformat(), job_id, worker)
+        ).rowcount > 0
+
+def cancel_job(job_id: str) -> Optional[Job]:
+    """Cancel a queued or running job; finished jobs are left as they are"""
+    timestamp = datetime.utcnow().isoformat()
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'cancelled', lease_until = NULL, updated_at = ?, finished_at = ?
+            WHERE id = ? AND status IN ('queued', 'running')
+            """,
+            (timestamp, timestamp, job_id)
+        )
+    return get_job(job_id)
 
-    return deleted_count > 0
+def delete_finished_jobs(before: str) -> int:
+    """Delete jobs that finished before the ISO timestamp `before`"""
+    with transaction() as conn:
+        return conn.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?", (before,)
+        ).rowcount
 
-# Initialize database on module import
+# Initialize database on module import. Keep this last, so every function
+# above exists before anything init_database() reaches can call it
 init_database()
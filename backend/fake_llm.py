@@ -0,0 +1,344 @@
+"""
+Offline stand-in for Gemini, for load tests and benchmarks.
+
+Selected with LITREALMS_LLM_BACKEND (llm_gateway applies it to every agent and
+direct call):
+
+- gemini     the real API (default)
+- synthetic  generated responses shaped like each agent's real output: DM turns
+             with [ACTIONS] and CHARACTER_STATE blocks, simulated sessions,
+             validation reports, compiled-story JSON, titles. Deterministic per
+             prompt, so runs are repeatable.
+- record     call the real API and save every response to the fixture store
+- replay     answer from the fixture store; prompts that were never recorded
+             get a synthetic response (or fail, with LITREALMS_LLM_REPLAY_MISS=error)
+
+Fixtures are JSON files in LITREALMS_LLM_FIXTURES, named by a hash of the model,
+system instruction and conversation (prompt_key()). Synthetic and replayed
+responses are paced like a streaming model: FIRST_TOKEN_MS before the first
+token, then TOKENS_PER_SEC.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+FIXTURES_DIR = os.getenv("LITREALMS_LLM_FIXTURES", "llm_fixtures")
+REPLAY_MISS = os.getenv("LITREALMS_LLM_REPLAY_MISS", "synthetic")  # synthetic or error
+FIRST_TOKEN_MS = float(os.getenv("LITREALMS_FAKE_LLM_FIRST_TOKEN_MS", "300"))
+TOKENS_PER_SEC = float(os.getenv("LITREALMS_FAKE_LLM_TOKENS_PER_SEC", "80"))  # 0 = no delay
+DM_WORDS = int(os.getenv("LITREALMS_FAKE_LLM_DM_WORDS", "150"))  # prose length of a synthetic DM turn
+
+CHUNK_TOKENS = 8  # tokens per streamed chunk
+
+
+# Fixture store
+
+def _canonical_part(part: types.Part) -> dict:
+    # Function call ids are random per run; leave them out so replays match
+    if part.function_call:
+        return {'function_call': {'name': part.function_call.name, 'args': part.function_call.args}}
+    if part.function_response:
+        return {'function_response': {'name': part.function_response.name, 'response': part.function_response.response}}
+    return {'text': part.text or ''}
+
+
+def _instruction_text(llm_request: LlmRequest) -> str:
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if instruction is None:
+        return ''
+    if isinstance(instruction, str):
+        return instruction
+    if isinstance(instruction, types.Content):
+        return '\n'.join(part.text or '' for part in instruction.parts or [])
+    return str(instruction)
+
+
+def prompt_key(model: str, instruction: str, contents: list) -> str:
+    """Fixture key for a prompt: sha256 of its model, instructions and conversation"""
+    material = {
+        'model': model,
+        'instruction': instruction,
+        'contents': [
+            {'role': content.role, 'parts': [_canonical_part(part) for part in content.parts or []]}
+            for content in contents
+        ],
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _fixture_path(key: str) -> str:
+    return os.path.join(FIXTURES_DIR, f"{key}.json")
+
+
+def load_fixture(key: str) -> Optional[types.Content]:
+    try:
+        with open(_fixture_path(key), encoding='utf-8') as f:
+            return types.Content.model_validate(json.load(f)['content'])
+    except FileNotFoundError:
+        return None
+
+
+def save_fixture(key: str, content: types.Content, description: str) -> None:
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    record = {
+        'description': description,
+        'content': content.model_dump(mode='json', exclude_none=True),
+    }
+    tmp_path = f"{_fixture_path(key)}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, _fixture_path(key))
+
+
+# Synthetic responses
+
+_PLACES = ["the ruined watchtower", "the Whispering Market", "a moonlit ravine", "the Ashen Gate", "the old mill"]
+_FOES = ["a hollow-eyed ghoul", "two bandit scouts", "a thorn wolf", "a rogue construct", "a sellsword captain"]
+_ITEMS = ["Healing Potion", "Iron Sword", "Rope", "Traveler's Cloak", "Silver Key", "Mana Crystal"]
+_SENTENCES = [
+    "The air smells of rain and old smoke.",
+    "Somewhere ahead, metal scrapes against stone.",
+    "{foe} steps out from the shadows near {place}.",
+    "Your instincts prickle; something here is not what it seems.",
+    "A faint glow pulses beneath the dust, answering your presence.",
+    "The path splits, one way climbing toward {place}, the other sinking into fog.",
+    "You feel the weight of the choice settle on your shoulders.",
+    "A distant bell tolls three times, then falls silent.",
+    "Your last fight has left a dull ache in your shoulder.",
+    "The wind carries voices you almost recognize.",
+]
+
+
+def _prose(rng: random.Random, words: int) -> str:
+    sentences = []
+    count = 0
+    while count < words:
+        sentence = rng.choice(_SENTENCES).format(place=rng.choice(_PLACES), foe=rng.choice(_FOES))
+        sentences.append(sentence)
+        count += len(sentence.split())
+    paragraphs = [' '.join(sentences[i:i + 4]) for i in range(0, len(sentences), 4)]
+    return '\n\n'.join(paragraphs)
+
+
+def _character_state(rng: random.Random) -> str:
+    hp_max = rng.choice([60, 80, 100])
+    mana_max = rng.choice([50, 80, 120])
+    inventory = ', '.join(rng.sample(_ITEMS, 3))
+    stats = ' '.join(f"{stat} {rng.randint(8, 16)}" for stat in ("STR", "INT", "DEX", "CON", "CHA"))
+    return (
+        "---\n**CHARACTER_STATE:**\n"
+        f"Level: {rng.randint(1, 5)} | XP: {rng.randint(0, 99)}/100 | "
+        f"HP: {rng.randint(1, hp_max)}/{hp_max} | Mana: {rng.randint(0, mana_max)}/{mana_max}\n"
+        f"Inventory: {inventory}\n"
+        f"Stats: {stats}\n---"
+    )
+
+
+def _dm_turn(rng: random.Random) -> str:
+    actions = rng.sample([
+        "Draw your weapon", "Search the area", "Call out a greeting", "Cast a light spell",
+        "Retreat quietly", f"Head toward {rng.choice(_PLACES)}", "Check your inventory",
+    ], 3)
+    return (
+        f"{_prose(rng, DM_WORDS)}\n\n{_character_state(rng)}\n\n"
+        "[ACTIONS]\n" + '\n'.join(f"- {action}" for action in actions) + "\n[/ACTIONS]"
+    )
+
+
+def _simulation(rng: random.Random) -> str:
+    turns = []
+    for number in range(1, 26):
+        turns.append(
+            f"Turn {number}:\n**PLAYER:** {rng.choice(['I look around.', 'I attack!', 'I ask about the rumors.', 'I press on.'])}\n"
+            f"**DM:** {_prose(rng, 40)}\n{_character_state(rng)}\n"
+        )
+    return '\n'.join(turns) + "\nSESSION SUMMARY:\n" + _prose(rng, 40)
+
+
+def _category(name: str, rng: random.Random, issues: bool) -> str:
+    block = (
+        f"{name}:\n- Score: {rng.randint(80, 98)}\n- Status: PASS\n"
+        f"- Feedback: {rng.choice(_SENTENCES).format(place=rng.choice(_PLACES), foe=rng.choice(_FOES))}"
+    )
+    return block + ("\n- Issues Found: None" if issues else "")
+
+
+def _content_validation(rng: random.Random) -> str:
+    categories = ["WORLD_CONSISTENCY", "CHARACTER_CONSISTENCY", "NARRATOR_TONE",
+                  "QUEST_ALIGNMENT", "STORY_MODE", "LITRPG_FIDELITY"]
+    return (
+        f"OVERALL_SCORE: {rng.randint(85, 97)}\nOVERALL_STATUS: PASS\n\n"
+        + '\n\n'.join(_category(name, rng, issues=False) for name in categories)
+        + "\n\nQUALITY_NOTES: Consistent with the configured world and character.\n"
+        + "SUGGESTED_IMPROVEMENTS: None\n"
+    )
+
+
+def _book_validation(rng: random.Random) -> str:
+    categories = ["CHARACTER_CONTINUITY", "WORLD_CONTINUITY", "PLOT_CONTINUITY", "TIMELINE_CONSISTENCY",
+                  "ITEM_TRACKING", "STAT_PROGRESSION", "TONE_CONSISTENCY", "NARRATIVE_ARC"]
+    return (
+        f"BOOK_VALIDATION_RESULT:\n\nOVERALL_SCORE: {rng.randint(85, 97)}\nOVERALL_STATUS: PASS\n\n"
+        + '\n\n'.join(_category(name, rng, issues=True) for name in categories)
+        + "\n\nCROSS_CHAPTER_ISSUES: None\n\nSUGGESTED_FIXES: None\n"
+    )
+
+
+def _compiled_story(rng: random.Random) -> str:
+    narrative = _prose(rng, 600)
+    return json.dumps({
+        'title': f"The Road to {rng.choice(_PLACES).title()}",
+        'subtitle': "A LitRealms Adventure",
+        'metadata': {
+            'character_name': "Aldric", 'character_class': "arcblade", 'world': "Eldoria",
+            'genre': "LitRPG", 'tone': "heroic", 'session_date': "2025-01-01",
+            'total_scenes': 5, 'final_level': rng.randint(1, 5),
+        },
+        'narrative': narrative,
+        'chapters': [{'number': 1, 'title': "Beginnings", 'summary': _prose(rng, 30), 'word_count': len(narrative.split())}],
+        'character_arc': _prose(rng, 30),
+        'key_moments': [_prose(rng, 10) for _ in range(3)],
+    })
+
+
+# Agent name (from ADK's identity instruction) -> generator
+_AGENT_GENERATORS = {
+    'gameplay_simulator': _simulation,
+    'content_validator': _content_validation,
+    'book_validator': _book_validation,
+    'story_compiler': _compiled_story,
+    'prologue_generator': lambda rng: _prose(rng, 250),
+}
+
+
+def synthetic_response(key: str, instruction: str, prompt: str) -> str:
+    """A made-up response in the shape the caller expects, seeded by the prompt key"""
+    rng = random.Random(key)
+    agent = re.search(r'Your internal name is "([^"]+)"', instruction)
+    if agent and agent.group(1) in _AGENT_GENERATORS:
+        return _AGENT_GENERATORS[agent.group(1)](rng)
+    if agent:
+        return _dm_turn(rng)  # orchestrator, onboarding, story_writer
+    if "ONLY the title" in prompt:
+        return f"The {rng.choice(['Ashen', 'Silent', 'Broken', 'Hidden'])} {rng.choice(['Gate', 'Oath', 'Crown', 'Path'])}"
+    return _prose(rng, 200)
+
+
+# Pacing and responses
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _usage(prompt_text: str, output_text: str) -> types.GenerateContentResponseUsageMetadata:
+    prompt_tokens, output_tokens = _estimate_tokens(prompt_text), _estimate_tokens(output_text)
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens,
+    )
+
+
+async def _paced_chunks(text: str) -> AsyncGenerator[str, None]:
+    """Yield `text` in chunks at the configured first-token latency and token rate"""
+    await asyncio.sleep(FIRST_TOKEN_MS / 1000)
+    words = re.findall(r'\S+\s*', text) or ['']
+    step = max(1, CHUNK_TOKENS * 3 // 4)  # words per chunk, at ~0.75 words per token
+    for i in range(0, len(words), step):
+        chunk = ''.join(words[i:i + step])
+        yield chunk
+        if TOKENS_PER_SEC > 0:
+            await asyncio.sleep(_estimate_tokens(chunk) / TOKENS_PER_SEC)
+
+
+def _contents_text(contents: list) -> str:
+    return '\n'.join(part.text or '' for content in contents for part in content.parts or [])
+
+
+class FakeLlm(BaseLlm):
+    """ADK model for the synthetic, record and replay backends"""
+
+    mode: str = 'synthetic'
+    real: Optional[BaseLlm] = None  # the model to record from
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self._maybe_append_user_content(llm_request)
+        instruction = _instruction_text(llm_request)
+        key = prompt_key(self.model, instruction, llm_request.contents)
+
+        if self.mode == 'record':
+            final = None
+            async for response in self.real.generate_content_async(llm_request, stream=stream):
+                if not response.partial and response.content:
+                    final = response
+                yield response
+            if final is not None:
+                save_fixture(key, final.content, f"{self.model}: {_contents_text(llm_request.contents[-1:])[:200]}")
+            return
+
+        content = load_fixture(key) if self.mode == 'replay' else None
+        if content is None:
+            if self.mode == 'replay' and REPLAY_MISS == 'error':
+                raise RuntimeError(f"No recorded response for prompt {key} in {FIXTURES_DIR}")
+            text = synthetic_response(key, instruction, _contents_text(llm_request.contents[-1:]))
+            content = types.Content(role='model', parts=[types.Part(text=text)])
+
+        text = ''.join(part.text or '' for part in content.parts or [])
+        if stream and text and not any(part.function_call for part in content.parts or []):
+            async for chunk in _paced_chunks(text):
+                yield LlmResponse(content=types.Content(role='model', parts=[types.Part(text=chunk)]), partial=True)
+        else:
+            async for _ in _paced_chunks(text):
+                pass
+
+        yield LlmResponse(
+            content=content,
+            usage_metadata=_usage(instruction + _contents_text(llm_request.contents), text),
+        )
+
+
+async def generate_content(
+    mode: str,
+    model: str,
+    prompt: str,
+    real: Callable[[], Awaitable[types.GenerateContentResponse]]
+) -> types.GenerateContentResponse:
+    """Direct-call counterpart of FakeLlm; `real` makes the actual API call (record mode)"""
+    contents = [types.Content(role='user', parts=[types.Part(text=prompt)])]
+    key = prompt_key(model, '', contents)
+
+    if mode == 'record':
+        response = await real()
+        if response.candidates and response.candidates[0].content:
+            save_fixture(key, response.candidates[0].content, f"{model}: {prompt[:200]}")
+        return response
+
+    content = load_fixture(key) if mode == 'replay' else None
+    if content is None:
+        if mode == 'replay' and REPLAY_MISS == 'error':
+            raise RuntimeError(f"No recorded response for prompt {key} in {FIXTURES_DIR}")
+        content = types.Content(role='model', parts=[types.Part(text=synthetic_response(key, '', prompt))])
+
+    text = ''.join(part.text or '' for part in content.parts or [])
+    async for _ in _paced_chunks(text):
+        pass
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=content)],
+        usage_metadata=_usage(prompt, text),
+    )
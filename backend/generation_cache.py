@@ -0,0 +1,138 @@
+"""
+Memoization of idempotent model generations.
+
+Titles for unchanged chapters, validations of the same text, prologues for the
+same onboarding choices and recompiles of an unchanged transcript are exact
+repeats of earlier model calls. cached() answers them from:
+- an in-process LRU of MEMORY_ENTRIES results, then
+- the generation_cache table in the books database, shared by all workers,
+and only calls the model on a miss. Entries live for TTL seconds; the table is
+trimmed to MAX_BYTES of stored output, oldest first.
+
+Keys are a hash of the agent, its prompt template version and its inputs with
+whitespace normalized. Bump the version passed by a call site whenever its prompt
+or agent instructions change, so stale outputs are never served. Pass bypass=True
+for an explicit "regenerate": the model is called and its result replaces the
+cached one.
+
+Hit rate per agent is reported as generation_cache.{agent}.hit in metrics (mean =
+hit rate). LITREALMS_GENERATION_CACHE=0 turns caching off.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import async_db as adb
+import metrics
+import single_flight
+
+ENABLED = os.getenv("LITREALMS_GENERATION_CACHE", "1") != "0"
+TTL = float(os.getenv("LITREALMS_GENERATION_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+MEMORY_ENTRIES = int(os.getenv("LITREALMS_GENERATION_CACHE_MEMORY_ENTRIES", "256"))
+MAX_BYTES = int(os.getenv("LITREALMS_GENERATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EVICT_EVERY = 100  # writes between trims of the table
+
+_memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (value, expires_at)
+_writes = 0
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(agent: str, version: str, inputs: Any) -> str:
+    """sha256 of the agent, prompt template version and normalized inputs"""
+    material = json.dumps([agent, version, _normalize(inputs)], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _remember(key: str, value: str, expires_at: float) -> None:
+    _memory[key] = (value, expires_at)
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+async def get(key: str) -> Optional[str]:
+    now = time.time()
+    entry = _memory.get(key)
+    if entry is not None:
+        if entry[1] > now:
+            _memory.move_to_end(key)
+            return entry[0]
+        del _memory[key]
+
+    value = await adb.get_cached_generation(key, now)
+    if value is not None:
+        # The row's exact expiry isn't read back; TTL from now is close enough for memory
+        _remember(key, value, now + TTL)
+    return value
+
+
+async def put(key: str, agent: str, value: str) -> None:
+    global _writes
+    now = time.time()
+    _remember(key, value, now + TTL)
+    await adb.put_cached_generation(key, agent, value, now, TTL)
+
+    _writes += 1
+    if _writes % EVICT_EVERY == 0:
+        evicted = await adb.evict_generation_cache(MAX_BYTES, now)
+        if evicted:
+            print(f"Evicted {evicted} generation cache entries")
+
+
+async def cached(
+    agent: str,
+    version: str,
+    inputs: Any,
+    generate: Callable[[], Awaitable[str]],
+    bypass: bool = False
+) -> str:
+    """
+    Return the cached output for these inputs, or await generate() and cache its
+    result. Empty outputs and errors are never cached. Concurrent misses for the
+    same key share one generate() call (see single_flight), even with caching off.
+    """
+    key = cache_key(agent, version, inputs)
+    if not ENABLED:
+        return await single_flight.run(agent, key, version, generate)
+
+    if not bypass:
+        try:
+            value = await get(key)
+        except Exception as e:
+            # The cache is an optimization; a broken table must not fail the request
+            print(f"Error reading generation cache: {str(e)}")
+            value = None
+        metrics.observe(f"generation_cache.{agent}.hit", 1 if value is not None else 0)
+        if value is not None:
+            return value
+
+    async def generate_and_store() -> str:
+        value = await generate()
+        if value:
+            try:
+                await put(key, agent, value)
+            except Exception as e:
+                print(f"Error writing generation cache: {str(e)}")
+        return value
+
+    # Identical requests that miss together share one model call
+    return await single_flight.run(agent, key, version, generate_and_store)
+
+
+async def clear(agent: Optional[str] = None) -> int:
+    """Drop cached generations (all, or one agent's) from both tiers"""
+    _memory.clear()  # memory entries don't record their agent; dropping them all is cheap
+    return await adb.clear_generation_cache(agent)
@@ -0,0 +1,249 @@
+"""
+Background jobs for long model-backed operations.
+
+Compiling a chapter, simulating gameplay or validating a whole book can take
+minutes; run synchronously, they depend on one HTTP connection (and every proxy
+in front of it) surviving that long. Their POST endpoints take ?async=true
+instead (other kinds are submitted with POST /jobs), which queues a job and
+returns it at once with 202; clients poll
+GET /jobs/{id} for status and progress and fetch GET /jobs/{id}/result.
+
+Jobs are rows in the books database's jobs table, so they survive restarts. A
+pool of WORKERS tasks per process claims due jobs, oldest first, and runs each
+under the admission scheduler's background class as the user who submitted it.
+A claimed job holds a lease that its worker renews every LEASE / 3 seconds, from
+the moment it is claimed (including while it waits for an admission slot); if the
+process dies, the lease lapses and any worker picks the job up again, unless it
+has used up its attempts, in which case it fails. On a clean shutdown, running
+jobs are put back in the queue straight away.
+
+A handler is an async function of the job's params returning a JSON-able dict,
+registered with @register(kind). Failures are retried with exponential backoff
+and jitter up to the kind's max_attempts; HTTPExceptions with a 4xx status and
+JobError are permanent. Handlers report progress with report_progress().
+Finished jobs are deleted after RETENTION_DAYS.
+"""
+
+import asyncio
+import contextvars
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+import admission
+import async_db as adb
+import metrics
+from models import Job
+
+WORKERS = int(os.getenv("LITREALMS_JOB_WORKERS", "4"))  # 0 disables the workers (submit-only process)
+POLL_INTERVAL = float(os.getenv("LITREALMS_JOB_POLL_INTERVAL", "1.0"))  # seconds
+LEASE = float(os.getenv("LITREALMS_JOB_LEASE", "60"))  # seconds a claimed job survives without a renewal
+MAX_ATTEMPTS = int(os.getenv("LITREALMS_JOB_MAX_ATTEMPTS", "3"))
+RETRY_DELAY = float(os.getenv("LITREALMS_JOB_RETRY_DELAY", "5"))  # seconds before the first retry
+RETRY_MAX_DELAY = float(os.getenv("LITREALMS_JOB_RETRY_MAX_DELAY", "300"))
+RETENTION_DAYS = float(os.getenv("LITREALMS_JOB_RETENTION_DAYS", "7"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+Handler = Callable[[dict], Awaitable[dict]]
+
+HANDLERS: Dict[str, Tuple[Handler, int]] = {}  # kind -> (handler, max_attempts)
+
+
+class JobError(Exception):
+    """A failure retrying won't fix"""
+
+
+def register(kind: str, max_attempts: int = MAX_ATTEMPTS) -> Callable[[Handler], Handler]:
+    def decorator(handler: Handler) -> Handler:
+        HANDLERS[kind] = (handler, max_attempts)
+        return handler
+    return decorator
+
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+_running: Dict[str, asyncio.Task] = {}  # job id -> handler task, on this process
+_claimed: Set[str] = set()  # ids of jobs claimed on this process, running or waiting for admission
+_workers: List[asyncio.Task] = []
+_maintenance: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+_stopping = False
+
+
+async def submit(kind: str, params: dict, user_id: str) -> Job:
+    """Queue a job; raises KeyError for an unknown kind"""
+    if kind not in HANDLERS:
+        raise KeyError(f"Unknown job kind: {kind}")
+    job = await adb.create_job(kind, params, user_id, HANDLERS[kind][1], time.time())
+    if _wakeup is not None:
+        _wakeup.set()
+    return job
+
+
+async def cancel(job_id: str) -> Optional[Job]:
+    """Cancel a queued or running job. Returns the job, or None if there is no such job"""
+    job = await adb.cancel_job(job_id)
+    task = _running.get(job_id)
+    if task is not None:
+        task.cancel()
+    # Running on another process: its maintenance loop sees the status and stops it
+    return job
+
+
+async def report_progress(progress: float, message: Optional[str] = None) -> None:
+    """Record the current job's progress (0..1); does nothing outside a job"""
+    job_id = _current_job.get()
+    if job_id is None:
+        return
+    try:
+        await adb.update_job_progress(job_id, max(0.0, min(1.0, progress)), message)
+    except Exception as e:
+        print(f"Error recording progress for job {job_id}: {str(e)}")
+
+
+def _error_message(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        detail = e.detail
+        return str(detail.get('error', detail)) if isinstance(detail, dict) else str(detail)
+    return str(e) or type(e).__name__
+
+
+def _is_permanent(e: Exception) -> bool:
+    return isinstance(e, JobError) or (isinstance(e, HTTPException) and e.status_code < 500)
+
+
+def _retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0.5, 1.0) * min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (attempt - 1))
+
+
+async def _run(job: Job, user_id: str) -> None:
+    entry = HANDLERS.get(job.kind)
+    if entry is None:
+        await adb.finish_job(job.id, WORKER_ID, 'failed', error=f"Unknown job kind: {job.kind}")
+        return
+    handler = entry[0]
+
+    try:
+        admitted = await admission.scheduler.acquire(admission.BACKGROUND, user_id)
+    except admission.Rejected as e:
+        # Not the job's fault: try again later without using up an attempt
+        await adb.requeue_job(job.id, WORKER_ID, time.time() + e.retry_after, count_attempt=False)
+        return
+
+    token = _current_job.set(job.id)
+    task = asyncio.create_task(handler(job.params))  # copies the context, so report_progress sees the job
+    _current_job.reset(token)
+    _running[job.id] = task
+    start = time.perf_counter()
+    try:
+        result = await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.done():
+            task.cancel()
+        if _stopping:
+            # Shutting down: someone else (or our next start) picks it up again
+            await adb.requeue_job(job.id, WORKER_ID, time.time(), count_attempt=False)
+            raise
+        if task.cancelled():
+            # cancel() has already marked it cancelled
+            print(f"Job {job.id} ({job.kind}) cancelled")
+            return
+        raise
+    except Exception as e:
+        error = _error_message(e)
+        if _is_permanent(e) or job.attempts >= job.max_attempts:
+            print(f"Job {job.id} ({job.kind}) failed after {job.attempts} attempt(s): {error}")
+            await adb.finish_job(job.id, WORKER_ID, 'failed', error=error)
+        else:
+            delay = _retry_delay(job.attempts)
+            print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+            await adb.requeue_job(job.id, WORKER_ID, time.time() + delay, error=error)
+        return
+    finally:
+        _running.pop(job.id, None)
+        admission.scheduler.release(admission.BACKGROUND, time.perf_counter() - admitted)
+        metrics.record(f"jobs.{job.kind}", time.perf_counter() - start)
+
+    await adb.finish_job(job.id, WORKER_ID, 'succeeded', result=result)
+
+
+async def _worker() -> None:
+    while True:
+        try:
+            claimed = await adb.claim_job(WORKER_ID, time.time(), LEASE)
+        except Exception as e:
+            print(f"Error claiming a job: {str(e)}")
+            claimed = None
+
+        if claimed is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        job, user_id = claimed
+        _claimed.add(job.id)  # renew the lease from now on, not just once the handler starts
+        try:
+            await _run(job, user_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Bookkeeping failed; the lease lapses and the job is retried
+            print(f"Error running job {job.id}: {str(e)}")
+        finally:
+            _claimed.discard(job.id)
+
+
+async def _maintain() -> None:
+    """Renew leases of this process's claimed jobs, stop ones cancelled elsewhere, prune old jobs"""
+    last_prune = 0.0
+    while True:
+        await asyncio.sleep(LEASE / 3)
+        try:
+            job_ids = list(_claimed)
+            if job_ids:
+                await adb.renew_job_leases(WORKER_ID, job_ids, time.time() + LEASE)
+                for job_id in list(_running):
+                    job = await adb.get_job(job_id)
+                    if job is not None and job.status == 'cancelled' and job_id in _running:
+                        _running[job_id].cancel()
+
+            if time.time() - last_prune > 3600:
+                last_prune = time.time()
+                before = (datetime.utcnow() - timedelta(days=RETENTION_DAYS)).isoformat()
+                deleted = await adb.delete_finished_jobs(before)
+                if deleted:
+                    print(f"Deleted {deleted} finished jobs")
+        except Exception as e:
+            print(f"Error maintaining jobs: {str(e)}")
+
+
+def start() -> None:
+    """Start the worker pool (call from the app's startup hook)"""
+    global _maintenance, _wakeup, _stopping
+    _stopping = False
+    _wakeup = asyncio.Event()
+    if WORKERS > 0:
+        _workers.extend(asyncio.create_task(_worker()) for _ in range(WORKERS))
+        _maintenance = asyncio.create_task(_maintain())
+
+
+async def stop() -> None:
+    """Stop the workers, putting the jobs they were running back in the queue"""
+    global _maintenance, _stopping
+    _stopping = True
+    tasks = _workers + ([_maintenance] if _maintenance else [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers.clear()
+    _maintenance = None
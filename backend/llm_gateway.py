@@ -0,0 +1,193 @@
+"""
+Gateway for model calls outside the chat loop.
+
+Direct Gemini calls (titles, narrative enhancement, history summaries) go through
+generate(). One-shot ADK generations (chapter compilation, simulation, prologues,
+validation) go through run_agent(). Both:
+- share one async genai client, and its connection pool, per process;
+- wait for a slot under a global limit and a per-endpoint limit, so a burst of
+  slow generations can't starve chat of model capacity;
+- time out after TIMEOUT seconds;
+- record latency, queueing time and token usage per endpoint in metrics.
+
+Transient API errors (429, 5xx) are retried with exponential backoff and jitter
+by the genai client itself, using RETRY_OPTIONS. Agents get the same retries by
+using model() for their model, which retries a single model request rather than
+re-running the agent (a second run would add the user message to the session
+again).
+
+LITREALMS_LLM_BACKEND swaps the API for fake_llm's offline synthetic, record or
+replay backends, for load tests and benchmarks.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Union
+
+from google import genai
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.google_llm import Gemini
+from google.adk.runners import Runner
+from google.genai import types
+
+import fake_llm
+import metrics
+
+BACKEND = os.getenv("LITREALMS_LLM_BACKEND", "gemini")  # gemini, synthetic, record or replay
+DEFAULT_MODEL = os.getenv("LITREALMS_LLM_MODEL", "gemini-2.0-flash")
+TIMEOUT = float(os.getenv("LITREALMS_LLM_TIMEOUT", "180"))  # seconds per call, including retries
+GLOBAL_CONCURRENCY = int(os.getenv("LITREALMS_LLM_CONCURRENCY", "32"))
+DEFAULT_ENDPOINT_CONCURRENCY = 8
+
+# Concurrent calls allowed per endpoint; override with e.g.
+# LITREALMS_LLM_ENDPOINT_CONCURRENCY="simulate=1,title=8"
+ENDPOINT_CONCURRENCY: Dict[str, int] = {
+    'title': 4,
+    'enhance': 2,
+    'summarize': 4,
+    'simulate': 2,
+    'compile_chapter': 4,
+    'compile_dm_narrative': 4,
+    'compile_story': 4,
+    'prologue': 4,
+    'validate_content': 4,
+    'validate_book': 2,
+}
+for _entry in filter(None, os.getenv("LITREALMS_LLM_ENDPOINT_CONCURRENCY", "").split(",")):
+    _endpoint, _limit = _entry.split("=", 1)
+    ENDPOINT_CONCURRENCY[_endpoint.strip()] = int(_limit)
+
+RETRY_OPTIONS = types.HttpRetryOptions(
+    attempts=int(os.getenv("LITREALMS_LLM_ATTEMPTS", "4")),  # including the first
+    initial_delay=float(os.getenv("LITREALMS_LLM_RETRY_DELAY", "1.0")),
+    max_delay=float(os.getenv("LITREALMS_LLM_RETRY_MAX_DELAY", "16")),
+    exp_base=2,
+    jitter=1,
+    http_status_codes=[408, 429, 500, 502, 503, 504],
+)
+
+
+class LLMTimeoutError(TimeoutError):
+    """A model call took longer than TIMEOUT"""
+
+
+_client: Optional[genai.Client] = None
+_global_slots: Optional[asyncio.Semaphore] = None
+_endpoint_slots: Dict[str, asyncio.Semaphore] = {}
+
+
+def client() -> genai.Client:
+    """The process-wide genai client"""
+    global _client
+    if _client is None:
+        _client = genai.Client(http_options=types.HttpOptions(retry_options=RETRY_OPTIONS))
+    return _client
+
+
+def model(name: str = DEFAULT_MODEL) -> BaseLlm:
+    """Model for an ADK agent definition, with the gateway's retry policy"""
+    gemini = Gemini(model=name, retry_options=RETRY_OPTIONS)
+    if BACKEND == 'gemini':
+        return gemini
+    return fake_llm.FakeLlm(model=name, mode=BACKEND, real=gemini)
+
+
+class _Slot:
+    """Hold an endpoint slot and then a global slot, recording the time spent waiting"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    async def __aenter__(self):
+        global _global_slots
+        if _global_slots is None:
+            _global_slots = asyncio.Semaphore(GLOBAL_CONCURRENCY)
+        if self.endpoint not in _endpoint_slots:
+            _endpoint_slots[self.endpoint] = asyncio.Semaphore(
+                ENDPOINT_CONCURRENCY.get(self.endpoint, DEFAULT_ENDPOINT_CONCURRENCY)
+            )
+
+        start = time.perf_counter()
+        # Endpoint first, so calls queued behind their own endpoint's limit don't hold global slots
+        await _endpoint_slots[self.endpoint].acquire()
+        try:
+            await _global_slots.acquire()
+        except BaseException:
+            _endpoint_slots[self.endpoint].release()
+            raise
+        metrics.record(f"llm.{self.endpoint}.wait", time.perf_counter() - start)
+
+    async def __aexit__(self, *exc):
+        _global_slots.release()
+        _endpoint_slots[self.endpoint].release()
+
+
+def _record_usage(endpoint: str, usage) -> None:
+    if usage is None:
+        return
+    if usage.prompt_token_count:
+        metrics.observe(f"llm.{endpoint}.prompt_tokens", usage.prompt_token_count)
+    if usage.candidates_token_count:
+        metrics.observe(f"llm.{endpoint}.output_tokens", usage.candidates_token_count)
+
+
+async def _generate_content(model: str, prompt: str) -> types.GenerateContentResponse:
+    def real():
+        return client().aio.models.generate_content(model=model, contents=prompt)
+
+    if BACKEND == 'gemini':
+        return await real()
+    return await fake_llm.generate_content(BACKEND, model, prompt, real)
+
+
+async def generate(endpoint: str, prompt: str, model: str = DEFAULT_MODEL) -> str:
+    """Send one prompt to the model and return the response text"""
+    async with _Slot(endpoint):
+        try:
+            with metrics.timer(f"llm.{endpoint}"):
+                response = await asyncio.wait_for(_generate_content(model, prompt), TIMEOUT)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"Model call for {endpoint} timed out after {TIMEOUT:g}s")
+
+    _record_usage(endpoint, response.usage_metadata)
+    return response.text or ''
+
+
+async def run_agent(
+    endpoint: str,
+    runner: Runner,
+    user_id: str,
+    session_id: str,
+    message: Union[str, types.Content]
+) -> str:
+    """Run an agent to completion on an existing session and return all of its text output"""
+    if isinstance(message, str):
+        message = types.Content(role='user', parts=[types.Part(text=message)])
+
+    response_parts = []
+    prompt_tokens = output_tokens = 0
+
+    async def run():
+        nonlocal prompt_tokens, output_tokens
+        async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=message):
+            if event.usage_metadata:
+                prompt_tokens += event.usage_metadata.prompt_token_count or 0
+                output_tokens += event.usage_metadata.candidates_token_count or 0
+            if event.content and event.content.parts:
+                for part in event.content.parts:
+                    if hasattr(part, 'text') and part.text:
+                        response_parts.append(part.text)
+
+    async with _Slot(endpoint):
+        try:
+            with metrics.timer(f"llm.{endpoint}"):
+                await asyncio.wait_for(run(), TIMEOUT)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"Agent run for {endpoint} timed out after {TIMEOUT:g}s")
+
+    if prompt_tokens:
+        metrics.observe(f"llm.{endpoint}.prompt_tokens", prompt_tokens)
+    if output_tokens:
+        metrics.observe(f"llm.{endpoint}.output_tokens", output_tokens)
+    return ''.join(response_parts)
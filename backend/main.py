@@ -1,18 +1,25 @@
 import os
 import asyncio
+import base64
+import copy
 import uuid
 import re
 import json
+import time
 from datetime import datetime
-from typing import List
+from typing import Annotated, List, Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from google.adk.sessions import DatabaseSessionService
 from google.adk.runners import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types
 from assistant.agent import root_agent, chat_agent
+from assistant import router
+from assistant.context_compaction import strip_compaction_state
 from assistant.story_compiler_agent import story_compiler_agent
 from assistant.prologue_generator_agent import prologue_generator_agent
 from assistant.content_validation_agent import content_validation_agent
@@ -22,12 +29,26 @@ from models import (
     GameConfig, CompiledStoryResponse, CompiledStory, StoryMetadata, StoryChapter,
     PrologueGenerationRequest, PrologueGenerationResponse,
     ContentValidationRequest, ContentValidationResponse, ValidationCategory,
-    Book, Chapter, GameMessage, CreateBookRequest, CreateChapterRequest,
+    Book, BookSummary, Chapter, ChapterStateAtTurn, GameMessage, CreateBookRequest, CreateChapterRequest,
     UpdateChapterRequest, CompleteChapterRequest, ChapterCompilationResponse,
     BookValidationResponse, BookValidationCategory,
-    ContinuityTracker, ContinuityTrackerCharacter, ContinuityTrackerItem, ContinuityTrackerEvent
+    ContinuityTracker, ContinuityTrackerCharacter, ContinuityTrackerItem, ContinuityTrackerEvent,
+    SessionGCReport, SearchResponse, Job, SubmitJobRequest
 )
+import async_db as adb
 import database as db
+import write_behind
+import session_gc
+import session_locks
+import session_router
+import streaming
+import metrics
+import llm_gateway
+import generation_cache
+import single_flight
+import prompt_builder
+import admission
+import jobs
 
 load_dotenv()
 
@@ -80,14 +101,45 @@ def normalize_inventory(inventory):
 
     return inventory if isinstance(inventory, list) else []
 
-session_service = DatabaseSessionService(db_url="sqlite:///adk_sessions.db")
+# Gameplay sessions are durable; one-shot generation apps' sessions stay in memory (see session_router.py)
+session_service = session_router.SessionRouter(
+    durable=DatabaseSessionService(db_url=f"sqlite:///{session_gc.SESSIONS_DB_PATH}"),
+    ephemeral=session_router.EphemeralSessionService(),
+    ephemeral_apps=session_router.EPHEMERAL_APPS,
+)
 runner = Runner(
     app_name='litrealms',
     agent=root_agent,
     session_service=session_service
 )
 
+# One runner per chat route (see assistant/router.py); they share the 'litrealms'
+# sessions, so a session can move between routes from turn to turn
+chat_runners = {
+    route: runner if agent is root_agent else Runner(
+        app_name='litrealms',
+        agent=agent,
+        session_service=session_service
+    )
+    for route, agent in router.ROUTES.items()
+}
+
+compiler_runner = Runner(
+    app_name='litrealms_compiler',
+    agent=story_compiler_agent,
+    session_service=session_service
+)
+
+# Prompt template versions for generation_cache keys: bump one whenever that prompt
+# (or its agent's instructions) changes, so cached outputs of the old prompt are ignored
+COMPILE_PROMPT_VERSION = "2"
+TITLE_PROMPT_VERSION = "1"
+PROLOGUE_PROMPT_VERSION = "1"
+VALIDATION_PROMPT_VERSION = "1"
+
 app = FastAPI(title="LitRealms Chat API")
+# Added before CORS so CORS wraps it and 429/503 rejections still carry CORS headers
+app.add_middleware(admission.AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -98,6 +150,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 class ChatRequest(BaseModel):
@@ -114,6 +167,17 @@ class ChatResponse(BaseModel):
     quick_actions: list[QuickAction] = []
     state: dict | None = None
 
+class TranscriptMessage(BaseModel):
+    role: str
+    content: str  # [ACTIONS] block removed for assistant messages
+    timestamp: str
+    seq: int
+    quick_actions: list[QuickAction] | None = None
+
+class TranscriptPage(BaseModel):
+    messages: list[TranscriptMessage]  # Oldest first
+    has_more: bool  # More messages beyond this page in the direction requested
+
 def parse_actions(text: str) -> tuple[str, list[QuickAction]]:
     """Extract [ACTIONS] block"""
     pattern = r'\[ACTIONS\](.*?)\[/ACTIONS\]'
@@ -132,6 +196,23 @@ def parse_actions(text: str) -> tuple[str, list[QuickAction]]:
     
     return clean_text, [QuickAction(label=a, message=a) for a in action_lines]
 
+def enrich_transcript(messages) -> list[dict]:
+    """
+    Split the [ACTIONS] block out of each assistant message into quick_actions,
+    for transcript pages sent to the frontend.
+    """
+    enriched = []
+    for msg in messages:
+        msg_dict = msg.model_dump() if hasattr(msg, 'model_dump') else dict(msg)
+
+        if msg_dict['role'] == 'assistant':
+            clean_content, actions = parse_actions(msg_dict['content'])
+            msg_dict['content'] = clean_content
+            msg_dict['quick_actions'] = [action.dict() for action in actions] if actions else []
+
+        enriched.append(msg_dict)
+    return enriched
+
 def parse_character_state(text: str) -> tuple[str, dict]:
     """Parse CHARACTER_STATE block and return state updates"""
     pattern = r'---\s*\*\*CHARACTER_STATE:\*\*\s*\n(.+?)\n---'
@@ -185,6 +266,44 @@ def parse_character_state(text: str) -> tuple[str, dict]:
     
     return text, state_updates
 
+_compression_task = None
+
+@app.on_event("startup")
+async def startup():
+    """
+    Start the chat turn write-behind queue, the ADK session sweeper and the background
+    job workers, and convert rows stored before column compression existed in the background
+    """
+    global _compression_task
+
+    write_behind.start()
+    session_gc.start()
+    jobs.start()
+
+    async def compress():
+        try:
+            count = await adb.compress_legacy_rows()
+            if count:
+                print(f"Compressed {count} legacy database rows")
+        except Exception as e:
+            print(f"Error compressing legacy database rows: {str(e)}")
+
+    _compression_task = asyncio.create_task(compress())
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Put running jobs back in the queue, write out queued chat turns and database writes,
+    then release pooled connections
+    """
+    if _compression_task and not _compression_task.done():
+        # The batch already on the writer thread finishes; the rest resumes on next startup
+        _compression_task.cancel()
+    session_gc.stop()
+    await jobs.stop()
+    await write_behind.stop()
+    adb.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "LitRealms API", "agent": root_agent.name}
@@ -193,6 +312,42 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.post("/admin/sessions/gc", response_model=SessionGCReport)
+async def collect_sessions(vacuum: bool = False):
+    """
+    Delete ADK sessions past their app's retention period and report the space reclaimed.
+    Pass vacuum=true to also shrink adk_sessions.db (blocks session writes while it runs).
+    """
+    try:
+        return await session_gc.run_sweep(vacuum=vacuum)
+    except Exception as e:
+        print(f"Error collecting sessions: {str(e)}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+
+@app.get("/admin/sessions")
+async def get_sessions():
+    """Which apps' sessions are kept in memory, and how many are held (this process only)"""
+    return session_service.status()
+
+@app.get("/admin/metrics")
+async def get_metrics():
+    """Latency and prompt size of recent requests by route (this process only)"""
+    return metrics.snapshot()
+
+@app.get("/admin/admission")
+async def get_admission():
+    """Running and queued model-backed requests per priority class (this process only)"""
+    return admission.scheduler.status()
+
+@app.delete("/admin/generation-cache")
+async def clear_generation_cache(agent: Optional[str] = None):
+    """Drop cached model outputs, or only one agent's (e.g. agent=title)"""
+    try:
+        return {"deleted": await generation_cache.clear(agent)}
+    except Exception as e:
+        print(f"Error clearing generation cache: {str(e)}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+
 @app.post("/submit-onboarding")
 async def submit_onboarding(config: GameConfig):
     """
@@ -209,7 +364,7 @@ async def submit_onboarding(config: GameConfig):
         else:
             book_title = f"{config.character.name}'s Adventure"
 
-        book = db.create_book(
+        book = await adb.create_book(
             user_id=user_id,
             title=book_title,
             game_config=config
@@ -286,16 +441,18 @@ async def submit_onboarding(config: GameConfig):
             parts=[types.Part(text="I'm ready to begin my adventure!")]
         )
 
+        route = router.route(session_state, initial_message.parts[0].text)
         opening_response_parts = []
-        async for event in runner.run_async(
-            user_id=user_id,
-            session_id=chapter_session_id,
-            new_message=initial_message
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        opening_response_parts.append(part.text)
+        with metrics.timer(f"opening.{route}"):
+            async for event in chat_runners[route].run_async(
+                user_id=user_id,
+                session_id=chapter_session_id,
+                new_message=initial_message
+            ):
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if hasattr(part, 'text') and part.text:
+                            opening_response_parts.append(part.text)
 
         opening_response = ''.join(opening_response_parts)
 
@@ -304,7 +461,7 @@ async def submit_onboarding(config: GameConfig):
         clean_opening_response, _ = parse_actions(opening_response)
 
         # Create Chapter 1 with the opening exchange in the transcript
-        chapter_1 = db.create_chapter(
+        chapter_1 = await adb.create_chapter(
             book_id=book.id,
             title="Chapter 1: The Journey Begins",
             session_id=chapter_session_id,
@@ -325,11 +482,8 @@ async def submit_onboarding(config: GameConfig):
                 'timestamp': datetime.utcnow().isoformat()
             }
         ]
-        db.update_chapter(
-            chapter_id=chapter_1.id,
-            game_transcript=json.dumps(initial_transcript),
-            status='in_progress'
-        )
+        await adb.append_chapter_messages(chapter_1.id, initial_transcript)
+        await adb.update_chapter(chapter_id=chapter_1.id, status='in_progress')
 
         return {
             "book_id": book.id,
@@ -343,29 +497,91 @@ async def submit_onboarding(config: GameConfig):
         print(f"Error in submit_onboarding: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
-@app.get("/books", response_model=List[Book])
-async def list_books_endpoint():
+def encode_book_cursor(book: BookSummary) -> str:
+    return base64.urlsafe_b64encode(f"{book.created_at}|{book.id}".encode()).decode()
+
+def decode_book_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        created_at, book_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, book_id
+
+@app.get("/books", response_model=List[BookSummary])
+async def list_books_endpoint(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None
+):
     """
-    List all books for the default user.
+    List books for the default user, newest first.
+    Returns book metadata and chapter headers only - fetch /books/{book_id} for transcripts.
+    Without `limit` every book is returned. With it, the X-Next-Cursor response header
+    carries the cursor for the next page (absent on the last page).
     In a production system, this would use authentication to get the user_id.
     """
     try:
         # For now, using a default user_id since there's no auth system
         user_id = "user"
-        books = db.list_books_by_user(user_id)
+        before = decode_book_cursor(cursor) if cursor else None
+
+        if limit is None:
+            return await adb.list_book_summaries(user_id, before=before)
+
+        # One extra row tells us whether there is a next page
+        books = await adb.list_book_summaries(user_id, limit=limit + 1, before=before)
+        if len(books) > limit:
+            books = books[:limit]
+            response.headers["X-Next-Cursor"] = encode_book_cursor(books[-1])
         return books
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error listing books: {str(e)}")
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
+@app.get("/search", response_model=SearchResponse)
+async def search_library(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Full-text search across all of the user's books: transcripts, authored chapters
+    and chapter summaries. Results are ranked best match first, with a snippet and
+    the character offsets of the matched terms in it.
+    """
+    try:
+        user_id = "user"
+        return await adb.search(q, user_id=user_id, limit=limit, offset=offset)
+    except Exception as e:
+        print(f"Error searching library: {str(e)}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+
+@app.get("/books/{book_id}/search", response_model=SearchResponse)
+async def search_book(
+    book_id: str,
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """Full-text search within one book (same matching and ranking as /search)"""
+    try:
+        return await adb.search(q, book_id=book_id, limit=limit, offset=offset)
+    except Exception as e:
+        print(f"Error searching book {book_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+
 @app.get("/books/{book_id}", response_model=Book)
-async def get_book_endpoint(book_id: str):
+async def get_book_endpoint(book_id: str, include_transcripts: bool = True):
     """
     Get a book by ID with all its chapters.
     Returns book metadata, game config, and list of all chapters.
+    Pass include_transcripts=false to leave every chapter's game_transcript empty.
     """
     try:
-        book = db.get_book(book_id)
+        await write_behind.flush()  # include chat turns still being written
+        book = await adb.get_book(book_id, include_transcripts=include_transcripts)
 
         if not book:
             raise HTTPException(status_code=404, detail=f"Book {book_id} not found")
@@ -385,16 +601,19 @@ async def delete_book_endpoint(book_id: str):
     """
     try:
         # First check if book exists
-        book = db.get_book(book_id)
+        book = await adb.get_book(book_id, include_transcripts=False)
         if not book:
             raise HTTPException(status_code=404, detail=f"Book {book_id} not found")
 
         # Delete the book and all its chapters
-        success = db.delete_book(book_id)
+        success = await adb.delete_book(book_id)
 
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete book")
 
+        # Their ADK sessions go too
+        await session_gc.delete_sessions_for_chapters([(c.id, c.session_id) for c in book.chapters])
+
         return {"message": f"Book {book_id} and all its chapters deleted successfully"}
     except HTTPException:
         raise
@@ -410,7 +629,7 @@ async def update_book_endpoint(book_id: str, request: Request):
     """
     try:
         # First check if book exists
-        book = db.get_book(book_id)
+        book = await adb.get_book(book_id, include_transcripts=False)
         if not book:
             raise HTTPException(status_code=404, detail=f"Book {book_id} not found")
 
@@ -428,7 +647,7 @@ async def update_book_endpoint(book_id: str, request: Request):
             game_config.character.name = character_name
 
         # Update the book
-        updated_book = db.update_book(
+        updated_book = await adb.update_book(
             book_id=book_id,
             title=title,
             subtitle=subtitle,
@@ -446,38 +665,34 @@ async def update_book_endpoint(book_id: str, request: Request):
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
 @app.get("/chapters/{chapter_id}")
-async def get_chapter_endpoint(chapter_id: str):
+async def get_chapter_endpoint(chapter_id: str, transcript_limit: Optional[int] = Query(None, ge=1)):
     """
     Get a single chapter by ID.
     Returns chapter data including game transcript, state, and authored content.
     Parses [ACTIONS] blocks from assistant messages and includes them in response.
+    With transcript_limit only the latest messages are included, and
+    transcript_has_more says whether older ones can be paged in from
+    /chapters/{chapter_id}/messages?before=<seq of the first message>.
     """
     try:
-        chapter = db.get_chapter(chapter_id)
+        await write_behind.flush()
+        chapter = await adb.get_chapter(
+            chapter_id,
+            transcript_limit=transcript_limit + 1 if transcript_limit else None
+        )
 
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
-        # Parse [ACTIONS] blocks from game transcript messages
-        # and create enriched transcript with clean content and extracted actions
-        enriched_transcript = []
-        for msg in chapter.game_transcript:
-            msg_dict = msg if isinstance(msg, dict) else {'role': msg.role, 'content': msg.content}
-
-            if msg_dict['role'] == 'assistant':
-                # Parse actions from assistant messages
-                clean_content, actions = parse_actions(msg_dict['content'])
-                enriched_transcript.append({
-                    **msg_dict,
-                    'content': clean_content,
-                    'quick_actions': [action.dict() for action in actions] if actions else []
-                })
-            else:
-                enriched_transcript.append(msg_dict)
+        transcript = chapter.game_transcript
+        has_more = bool(transcript_limit) and len(transcript) > transcript_limit
+        if has_more:
+            transcript = transcript[1:]
 
-        # Return chapter with enriched transcript
+        # Return chapter with enriched transcript (clean content and extracted actions)
         chapter_dict = chapter.model_dump() if hasattr(chapter, 'model_dump') else chapter
-        chapter_dict['game_transcript'] = enriched_transcript
+        chapter_dict['game_transcript'] = enrich_transcript(transcript)
+        chapter_dict['transcript_has_more'] = has_more
 
         return chapter_dict
     except HTTPException:
@@ -486,43 +701,142 @@ async def get_chapter_endpoint(chapter_id: str):
         print(f"Error retrieving chapter {chapter_id}: {str(e)}")
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
+@app.get("/chapters/{chapter_id}/messages", response_model=TranscriptPage)
+async def get_chapter_messages_endpoint(
+    chapter_id: str,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    """
+    Page through a chapter's transcript by message seq.
+    `before` returns the `limit` messages just before that seq (scrolling back),
+    `after` the ones just after it (catching up); with neither, the latest messages.
+    """
+    try:
+        await write_behind.flush()
+        if not await adb.get_chapter(chapter_id, include_transcript=False):
+            raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
+
+        # One extra message tells us whether there is more in that direction
+        messages = await adb.get_chapter_messages(chapter_id, after_seq=after, before_seq=before, limit=limit + 1)
+        has_more = len(messages) > limit
+        if has_more:
+            messages = messages[:limit] if after is not None else messages[1:]
+
+        return TranscriptPage(messages=enrich_transcript(messages), has_more=has_more)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error retrieving messages for chapter {chapter_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+
+@app.get("/chapters/{chapter_id}/state", response_model=ChapterStateAtTurn)
+async def get_chapter_state_endpoint(chapter_id: str, turn: Optional[int] = None):
+    """
+    Get a chapter's game state as of a state turn (latest if omitted).
+    Turn 0 is the state the chapter started with; each recorded turn after that
+    carries the seq of the transcript message that produced it.
+    """
+    try:
+        await write_behind.flush()
+        state = await adb.get_chapter_state(chapter_id, turn)
+
+        if not state:
+            raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
+
+        return state
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error retrieving state for chapter {chapter_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+
+async def run_compiler(endpoint: str, prompt: str) -> str:
+    """
+    Run the Story Compiler Agent on `prompt` in a fresh session, deleted afterwards.
+    Compiles never share a session: the agent would be sent every earlier compile's
+    transcript and draft along with this one. Prompts over the compile token budget
+    are refused with 413.
+    """
+    tokens = prompt_builder.estimate_tokens(prompt)
+    if tokens > prompt_builder.COMPILE_TOKEN_BUDGET:
+        raise HTTPException(status_code=413, detail={
+            "error": f"Too much gameplay to compile at once (about {tokens} tokens, limit {prompt_builder.COMPILE_TOKEN_BUDGET})"
+        })
+
+    user_id = "user"
+    compile_session = await session_service.create_session(app_name='litrealms_compiler', user_id=user_id, state={})
+    metrics.observe(f"compile.{endpoint}.prompt_chars", len(prompt))
+    try:
+        return await llm_gateway.run_agent(endpoint, compiler_runner, user_id, compile_session.id, prompt)
+    finally:
+        await session_service.delete_session(app_name='litrealms_compiler', user_id=user_id, session_id=compile_session.id)
+
+def with_previous_draft(prompt: str, previous_draft: Optional[str]) -> str:
+    """Ask the compiler to revise the last draft (and only that one) rather than start over"""
+    if not previous_draft or not previous_draft.strip():
+        return prompt
+    return f"""{prompt}
+
+PREVIOUS DRAFT:
+{previous_draft}
+
+Revise the previous draft rather than writing a new one: keep what works, fix anything that contradicts the gameplay data, and cover events it missed."""
+
 @app.post("/chapters/{chapter_id}/compile", response_model=ChapterCompilationResponse)
-async def compile_chapter(chapter_id: str):
+async def compile_chapter(
+    chapter_id: str,
+    regenerate: bool = False,
+    revise_previous: bool = False,
+    run_async: Annotated[bool, Query(alias="async")] = False,
+    user: Annotated[str, Depends(admission.request_user)] = "jobs"
+):
     """
     Compile a chapter's gameplay transcript into polished authored content.
     Uses the Story Compiler Agent with creative enrichments (reflections, doubts, dialogue).
     Returns the compiled narrative text ready to be saved as authored_content.
+    Recompiling an unchanged chapter returns the cached result unless regenerate=true.
+    Each compile starts from the transcript alone; revise_previous=true instead has
+    the agent revise the chapter's current authored content.
+    With async=true, queues a compile_chapter job and returns it (202) instead.
     """
+    if run_async:
+        return await submit_job(
+            'compile_chapter', {'chapter_id': chapter_id, 'regenerate': regenerate, 'revise_previous': revise_previous}, user
+        )
+
     try:
         # Get chapter with game transcript
-        chapter = db.get_chapter(chapter_id)
+        await write_behind.flush()
+        chapter = await adb.get_chapter(chapter_id)
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
         # Get book to access game_config (for tone, mode, etc.)
-        book = db.get_book(chapter.book_id)
+        book = await adb.get_book(chapter.book_id, include_transcripts=False)
         if not book:
             raise HTTPException(status_code=404, detail=f"Book {chapter.book_id} not found")
 
-        # Format chapter data for the Story Compiler Agent
-        chapter_data = {
-            "session_history": [
+        # Format chapter data for the Story Compiler Agent (compacted, see prompt_builder.py)
+        chapter_data = prompt_builder.chapter_payload(
+            [
                 {
                     "role": msg.role if hasattr(msg, 'role') else msg['role'],
                     "content": msg.content if hasattr(msg, 'content') else msg['content']
                 }
                 for msg in chapter.game_transcript
             ],
-            "initial_state": chapter.initial_state,
-            "final_state": chapter.final_state,
-            "story_mode": book.game_config.mode,
-            "narrator_tone": book.game_config.tone,
-            "world_name": book.game_config.world.name,
-            "character_name": book.game_config.character.name,
-            "character_class": book.game_config.character.character_class,
-            "chapter_number": chapter.number,
-            "chapter_title": chapter.title
-        }
+            chapter.initial_state,
+            chapter.final_state,
+            story_mode=book.game_config.mode,
+            narrator_tone=book.game_config.tone,
+            world_name=book.game_config.world.name,
+            character_name=book.game_config.character.name,
+            character_class=book.game_config.character.character_class,
+            chapter_number=chapter.number,
+            chapter_title=chapter.title
+        )
 
         # Create prompt for Story Compiler Agent
         compilation_prompt = f"""Compile this chapter's gameplay into polished LitRPG prose.
@@ -536,7 +850,7 @@ CHAPTER INFO:
 - Character: {book.game_config.character.name} (Class: {book.game_config.character.character_class})
 
 GAMEPLAY DATA:
-{json.dumps(chapter_data, indent=2)}
+{prompt_builder.dumps(chapter_data)}
 
 INSTRUCTIONS:
 Transform the raw gameplay into a beautiful, publishable narrative following your instructions.
@@ -546,51 +860,17 @@ Transform the raw gameplay into a beautiful, publishable narrative following you
 - Return ONLY the narrative text (not JSON) - the compiled prose ready for the authored_content field.
 - Do NOT include chapter headers or formatting - just the story prose."""
 
-        # Create temporary session for compilation
-        compile_session_id = f"compile_chapter_{chapter_id}"
-        user_id = "user"
+        async def compile_narrative() -> str:
+            return (await run_compiler('compile_chapter', compilation_prompt)).strip()
 
-        # Check if compile session already exists
-        existing_compile_session = await session_service.get_session(
-            app_name='litrealms_compiler',
-            user_id=user_id,
-            session_id=compile_session_id
-        )
-
-        # Only create the compile session if it doesn't exist
-        if not existing_compile_session:
-            await session_service.create_session(
-                app_name='litrealms_compiler',
-                user_id=user_id,
-                session_id=compile_session_id,
-                state={}
-            )
-
-        # Run Story Compiler Agent
-        compiler_runner = Runner(
-            app_name='litrealms_compiler',
-            agent=story_compiler_agent,
-            session_service=session_service
-        )
+        if revise_previous:
+            compilation_prompt = with_previous_draft(compilation_prompt, chapter.authored_content)
 
-        message = types.Content(
-            role='user',
-            parts=[types.Part(text=compilation_prompt)]
+        await jobs.report_progress(0.1, "Compiling chapter")
+        raw_response = await generation_cache.cached(
+            'compile_chapter', COMPILE_PROMPT_VERSION, compilation_prompt, compile_narrative, bypass=regenerate
         )
 
-        response_parts = []
-        async for event in compiler_runner.run_async(
-            user_id=user_id,
-            session_id=compile_session_id,
-            new_message=message
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_parts.append(part.text)
-
-        raw_response = ''.join(response_parts).strip()
-
         # Try to parse as JSON and extract narrative field
         # The story compiler agent returns JSON despite instructions to return plain text
         try:
@@ -670,22 +950,36 @@ def generate_chapter_summary(chapter_transcript: list) -> str:
         return "The adventure continues..."
 
 @app.post("/chapters/{chapter_id}/compile-dm-narrative", response_model=ChapterCompilationResponse)
-async def compile_chapter_dm_narrative(chapter_id: str):
+async def compile_chapter_dm_narrative(
+    chapter_id: str,
+    regenerate: bool = False,
+    revise_previous: bool = False,
+    run_async: Annotated[bool, Query(alias="async")] = False,
+    user: Annotated[str, Depends(admission.request_user)] = "jobs"
+):
     """
     Compile a chapter using ONLY DM (assistant) messages from the gameplay transcript.
     Only includes stat progression when there are ACTUAL changes (level-ups, new skills, stat increases).
 
     This creates a cleaner narrative focused on the DM's story without player actions,
-    and filters out redundant stat blocks.
+    and filters out redundant stat blocks. Cached like /compile (regenerate=true bypasses),
+    and like /compile, revise_previous=true revises the current authored content.
+    With async=true, queues a compile_dm_narrative job and returns it (202) instead.
     """
+    if run_async:
+        return await submit_job(
+            'compile_dm_narrative', {'chapter_id': chapter_id, 'regenerate': regenerate, 'revise_previous': revise_previous}, user
+        )
+
     try:
         # Get chapter with game transcript
-        chapter = db.get_chapter(chapter_id)
+        await write_behind.flush()
+        chapter = await adb.get_chapter(chapter_id)
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
         # Get book to access game_config
-        book = db.get_book(chapter.book_id)
+        book = await adb.get_book(chapter.book_id, include_transcripts=False)
         if not book:
             raise HTTPException(status_code=404, detail=f"Book {chapter.book_id} not found")
 
@@ -782,20 +1076,20 @@ async def compile_chapter_dm_narrative(chapter_id: str):
 
                 previous_stats = current_stats
 
-        # Format chapter data with DM messages only
-        chapter_data = {
-            "session_history": dm_messages,
-            "initial_state": chapter.initial_state,
-            "final_state": chapter.final_state,
-            "story_mode": book.game_config.mode,
-            "narrator_tone": book.game_config.tone,
-            "world_name": book.game_config.world.name,
-            "character_name": book.game_config.character.name,
-            "character_class": book.game_config.character.character_class,
-            "chapter_number": chapter.number,
-            "chapter_title": chapter.title,
-            "stat_changes": stat_changes  # Only include actual changes
-        }
+        # Format chapter data with DM messages only (compacted, see prompt_builder.py)
+        chapter_data = prompt_builder.chapter_payload(
+            dm_messages,
+            chapter.initial_state,
+            chapter.final_state,
+            story_mode=book.game_config.mode,
+            narrator_tone=book.game_config.tone,
+            world_name=book.game_config.world.name,
+            character_name=book.game_config.character.name,
+            character_class=book.game_config.character.character_class,
+            chapter_number=chapter.number,
+            chapter_title=chapter.title,
+            stat_changes=stat_changes  # Only include actual changes
+        )
 
         # Create prompt for Story Compiler Agent
         compilation_prompt = f"""Compile this chapter's gameplay into polished LitRPG prose using ONLY DM narration.
@@ -809,7 +1103,7 @@ CHAPTER INFO:
 - Character: {book.game_config.character.name} (Class: {book.game_config.character.character_class})
 
 GAMEPLAY DATA:
-{json.dumps(chapter_data, indent=2)}
+{prompt_builder.dumps(chapter_data)}
 
 SPECIAL INSTRUCTIONS FOR THIS COMPILATION:
 1. **Use ONLY the DM (assistant) messages** - Player actions have been removed
@@ -843,51 +1137,17 @@ SPECIAL INSTRUCTIONS FOR THIS COMPILATION:
 
 Transform this DM-only transcript into beautiful, flowing LitRPG narrative that preserves all game mechanics (dice rolls, XP, items, damage) while showing stat blocks ONLY when they meaningfully change."""
 
-        # Create temporary session for compilation
-        compile_session_id = f"compile_dm_{chapter_id}"
-        user_id = "user"
-
-        # Check if compile session already exists
-        existing_compile_session = await session_service.get_session(
-            app_name='litrealms_compiler',
-            user_id=user_id,
-            session_id=compile_session_id
-        )
-
-        # Only create the compile session if it doesn't exist
-        if not existing_compile_session:
-            await session_service.create_session(
-                app_name='litrealms_compiler',
-                user_id=user_id,
-                session_id=compile_session_id,
-                state={}
-            )
+        async def compile_narrative() -> str:
+            return (await run_compiler('compile_dm_narrative', compilation_prompt)).strip()
 
-        # Run Story Compiler Agent
-        compiler_runner = Runner(
-            app_name='litrealms_compiler',
-            agent=story_compiler_agent,
-            session_service=session_service
-        )
+        if revise_previous:
+            compilation_prompt = with_previous_draft(compilation_prompt, chapter.authored_content)
 
-        message = types.Content(
-            role='user',
-            parts=[types.Part(text=compilation_prompt)]
+        await jobs.report_progress(0.1, "Compiling chapter")
+        raw_response = await generation_cache.cached(
+            'compile_dm_narrative', COMPILE_PROMPT_VERSION, compilation_prompt, compile_narrative, bypass=regenerate
         )
 
-        response_parts = []
-        async for event in compiler_runner.run_async(
-            user_id=user_id,
-            session_id=compile_session_id,
-            new_message=message
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_parts.append(part.text)
-
-        raw_response = ''.join(response_parts).strip()
-
         # Try to parse as JSON and extract narrative field
         try:
             compiled_data = json.loads(raw_response)
@@ -914,18 +1174,27 @@ Transform this DM-only transcript into beautiful, flowing LitRPG narrative that
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
 @app.post("/chapters/{chapter_id}/simulate-gameplay")
-async def simulate_gameplay(chapter_id: str):
+async def simulate_gameplay(
+    chapter_id: str,
+    run_async: Annotated[bool, Query(alias="async")] = False,
+    user: Annotated[str, Depends(admission.request_user)] = "jobs"
+):
     """
     Generate a simulated gameplay session (25-30 turns) with realistic player/DM interactions.
     The simulation continues from the current chapter state and adds messages to the game transcript.
+    With async=true, queues a simulate_gameplay job and returns it (202) instead.
     """
+    if run_async:
+        return await submit_job('simulate_gameplay', {'chapter_id': chapter_id}, user)
+
     try:
         # Get chapter and book
-        chapter = db.get_chapter(chapter_id)
+        await write_behind.flush()
+        chapter = await adb.get_chapter(chapter_id, include_transcript=False)
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
-        book = db.get_book(chapter.book_id)
+        book = await adb.get_book(chapter.book_id, include_transcripts=False)
         if not book:
             raise HTTPException(status_code=404, detail=f"Book {chapter.book_id} not found")
 
@@ -996,14 +1265,9 @@ Generate a complete, engaging gameplay session with 25-30 player/DM exchange tur
             parts=[types.Part(text=simulation_prompt)]
         )
 
-        response_parts = []
-        async for event in simulator_runner.run_async(user_id=user_id, session_id=sim_session_id, new_message=message):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_parts.append(part.text)
-
-        simulation_text = ''.join(response_parts)
+        await jobs.report_progress(0.1, "Simulating gameplay")
+        simulation_text = await llm_gateway.run_agent('simulate', simulator_runner, user_id, sim_session_id, message)
+        await jobs.report_progress(0.9, "Saving simulated turns")
 
         # Post-process to replace any placeholder text the model might have outputted
         character_name = game_state.get('character_name', 'Hero')
@@ -1070,25 +1334,17 @@ Generate a complete, engaging gameplay session with 25-30 player/DM exchange tur
 
         # Add all simulated turns to the chapter's game transcript
         # Track cumulative state changes
-        accumulated_state = session.state.copy()
-
-        # Convert existing transcript to dicts if they're GameMessage objects
-        transcript_as_dicts = []
-        for msg in chapter.game_transcript:
-            if hasattr(msg, 'model_dump'):
-                transcript_as_dicts.append(msg.model_dump())
-            elif hasattr(msg, 'dict'):
-                transcript_as_dicts.append(msg.dict())
-            else:
-                transcript_as_dicts.append(msg)
+        accumulated_state = copy.deepcopy(session.state)
 
+        recorded_turns = []  # (messages, state after the turn) for each player/DM exchange
+        pending_messages = []
         for turn in turns:
             message_dict = {
                 'role': turn['role'],
                 'content': turn['content'],
                 'timestamp': datetime.utcnow().isoformat()
             }
-            transcript_as_dicts.append(message_dict)
+            pending_messages.append(message_dict)
 
             # Accumulate game state changes
             if 'state' in turn and turn['state']:
@@ -1102,16 +1358,21 @@ Generate a complete, engaging gameplay session with 25-30 player/DM exchange tur
                     del state_updates['character_stats']  # Don't overwrite with partial dict
                 accumulated_state.update(state_updates)
 
-        # Normalize inventory one more time before saving to ensure clean state
-        if 'inventory' in accumulated_state:
-            accumulated_state['inventory'] = normalize_inventory(accumulated_state['inventory'])
+            if turn['role'] == 'assistant':
+                # Normalize inventory before saving to ensure clean state
+                if 'inventory' in accumulated_state:
+                    accumulated_state['inventory'] = normalize_inventory(accumulated_state['inventory'])
+                recorded_turns.append((pending_messages, copy.deepcopy(accumulated_state)))
+                pending_messages = []
+
+        if pending_messages:
+            recorded_turns.append((pending_messages, copy.deepcopy(accumulated_state)))
 
         # Update chapter's final_state with all accumulated changes
         chapter.final_state = accumulated_state
 
-        # Save updated chapter with new transcript and final state
-        db.update_chapter_transcript(chapter_id, transcript_as_dicts)
-        db.update_chapter_state(chapter_id, chapter.final_state)
+        # Append the new turns with a state delta per exchange, in one transaction
+        await adb.record_chapter_turns(chapter_id, recorded_turns)
 
         return {
             "success": True,
@@ -1142,12 +1403,13 @@ async def complete_chapter(chapter_id: str, request: CompleteChapterRequest):
     """
     try:
         # Get the current chapter
-        chapter = db.get_chapter(chapter_id)
+        await write_behind.flush()
+        chapter = await adb.get_chapter(chapter_id)
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
         # Get the book
-        book = db.get_book(chapter.book_id)
+        book = await adb.get_book(chapter.book_id, include_transcripts=False)
         if not book:
             raise HTTPException(status_code=404, detail=f"Book {chapter.book_id} not found")
 
@@ -1156,7 +1418,7 @@ async def complete_chapter(chapter_id: str, request: CompleteChapterRequest):
         print(f"Generated chapter summary: {chapter_summary}")
 
         # Update the chapter with the summary and mark as complete
-        updated_chapter = db.update_chapter(
+        updated_chapter = await adb.update_chapter(
             chapter_id,
             status='complete',
             narrative_summary=chapter_summary
@@ -1184,7 +1446,8 @@ async def complete_chapter(chapter_id: str, request: CompleteChapterRequest):
             # Create a new ADK session for the next chapter
             # First, clean up initial_state to remove chapter-1-specific fields
             # that would confuse the story_writer_agent
-            cleaned_state = initial_state.copy()
+            # (and any context summary, which covers this chapter's session only)
+            cleaned_state = strip_compaction_state(initial_state)
             # Remove prologue/opening scene - these are for chapter 1 only
             # The agent should use previous_chapter_summary for continuations
             fields_to_remove = ['opening_scene', 'prologue', 'story_started']
@@ -1232,7 +1495,7 @@ async def complete_chapter(chapter_id: str, request: CompleteChapterRequest):
             print(f"DEBUG: Session state after creation: {new_session.state}")
 
             # Create new chapter
-            next_chapter = db.create_chapter(
+            next_chapter = await adb.create_chapter(
                 book_id=chapter.book_id,
                 title=next_chapter_title,
                 session_id=new_session.id,
@@ -1255,13 +1518,15 @@ async def complete_chapter(chapter_id: str, request: CompleteChapterRequest):
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
 @app.post("/chapters/{chapter_id}/generate-title")
-async def generate_chapter_title(chapter_id: str):
+async def generate_chapter_title(chapter_id: str, regenerate: bool = False):
     """
     Generate an AI-suggested title for a chapter based on its content.
     Uses the game transcript and/or authored content to create a fitting title.
+    Unchanged content gets the cached title unless regenerate=true.
     """
     try:
-        chapter = db.get_chapter(chapter_id)
+        await write_behind.flush()
+        chapter = await adb.get_chapter(chapter_id)
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
@@ -1304,16 +1569,12 @@ Content:
 Respond with ONLY the title, nothing else."""
 
         # Use Gemini directly for simple title generation
-        from google import genai
-        import os
-
-        client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
-        response = client.models.generate_content(
-            model='gemini-2.0-flash',
-            contents=title_prompt
+        response_text = await generation_cache.cached(
+            'title', TITLE_PROMPT_VERSION, title_prompt,
+            lambda: llm_gateway.generate('title', title_prompt), bypass=regenerate
         )
 
-        generated_title = response.text.strip().strip('"').strip("'")
+        generated_title = response_text.strip().strip('"').strip("'")
 
         # Limit title length
         if len(generated_title) > 100:
@@ -1341,7 +1602,7 @@ async def update_chapter_content(
     Used when saving edited chapter content from the Authoring tab.
     """
     try:
-        chapter = db.get_chapter(chapter_id)
+        chapter = await adb.get_chapter(chapter_id, include_transcript=False)
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
@@ -1360,15 +1621,21 @@ async def update_chapter_content(
         if request.status is not None:
             updates['status'] = request.status
 
-        # Update chapter in database
-        updated_chapter = db.update_chapter(chapter_id, **updates)
+        # Update chapter in database; with a version, only if nobody saved in between
+        try:
+            updated_chapter = await adb.update_chapter(chapter_id, expected_version=request.version, **updates)
+        except db.ConcurrentModificationError as e:
+            raise HTTPException(
+                status_code=409,
+                detail={"error": str(e), "current_version": e.current_version}
+            )
 
         if not updated_chapter:
             raise HTTPException(status_code=500, detail="Failed to update chapter")
 
         # Update book's total word count if chapter word count changed
         if 'word_count' in updates:
-            db.update_book_total_word_count(chapter.book_id)
+            await adb.update_book_total_word_count(chapter.book_id)
 
         return updated_chapter
 
@@ -1387,7 +1654,7 @@ async def delete_chapter_endpoint(chapter_id: str):
     """
     try:
         # Check if chapter exists
-        chapter = db.get_chapter(chapter_id)
+        chapter = await adb.get_chapter(chapter_id, include_transcript=False)
         if not chapter:
             raise HTTPException(status_code=404, detail=f"Chapter {chapter_id} not found")
 
@@ -1395,13 +1662,15 @@ async def delete_chapter_endpoint(chapter_id: str):
         book_id = chapter.book_id
 
         # Delete the chapter
-        success = db.delete_chapter(chapter_id)
+        success = await adb.delete_chapter(chapter_id)
 
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete chapter")
 
+        await session_gc.delete_sessions_for_chapters([(chapter.id, chapter.session_id)])
+
         # Update book's total word count after chapter deletion
-        db.update_book_total_word_count(book_id)
+        await adb.update_book_total_word_count(book_id)
 
         return {"message": f"Chapter {chapter_id} deleted successfully"}
 
@@ -1414,113 +1683,194 @@ async def delete_chapter_endpoint(chapter_id: str):
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
-    try:
-        user_id = "user"
-        message = types.Content(role='user', parts=[types.Part(text=request.message)])
-        session_id = request.session_id or str(uuid.uuid4())
-        
-        # Get or create session with initialized state
-        session = await session_service.get_session(app_name='litrealms', user_id=user_id, session_id=session_id)
+    session_id = request.session_id or str(uuid.uuid4())
 
-        if not session:
-            session = await session_service.create_session(
-                app_name='litrealms',
-                user_id=user_id,
-                session_id=session_id,
-                state={
-                    'current_step': 1,
-                    'onboarding_complete': False,
-                    'world_template': '',
-                    'story_mode': '',
-                    'character_class': '',
-                    'tone': '',
-                    'level': 1,
-                    'xp': 0,
-                    'xp_to_next_level': 100,
-                    'character_stats': {},
-                    'inventory': [],
-                }
-            )
+    # Overlapping turns for one session run one after another, in arrival order
+    async with session_locks.session_lock(session_id):
+        return await run_chat_turn(request, session_id)
 
-        # DEBUG: Log session state before running agent
-        print(f"\nDEBUG CHAT ENDPOINT - Session {session_id}:")
-        print(f"  - chapter_number: {session.state.get('chapter_number')}")
-        print(f"  - previous_chapter_summary: {session.state.get('previous_chapter_summary', 'NOT SET')[:100] if session.state.get('previous_chapter_summary') else 'NOT SET'}")
-        print(f"  - character_name: {session.state.get('character_name')}")
-        print(f"  - onboarding_complete: {session.state.get('onboarding_complete')}")
-        print(f"  - story_started: {session.state.get('story_started')}")
+async def get_or_create_chat_session(user_id: str, session_id: str):
+    """Load the player's ADK session, creating it with initial state on first contact"""
+    session = await session_service.get_session(app_name='litrealms', user_id=user_id, session_id=session_id)
+
+    if not session:
+        session = await session_service.create_session(
+            app_name='litrealms',
+            user_id=user_id,
+            session_id=session_id,
+            state={
+                'current_step': 1,
+                'onboarding_complete': False,
+                'world_template': '',
+                'story_mode': '',
+                'character_class': '',
+                'tone': '',
+                'level': 1,
+                'xp': 0,
+                'xp_to_next_level': 100,
+                'character_stats': {},
+                'inventory': [],
+            }
+        )
+
+    return session
+
+async def finish_chat_turn(request: ChatRequest, user_id: str, session_id: str, response_text: str) -> ChatResponse:
+    """Parse the DM's complete reply and queue the turn for recording"""
+    # Parse CHARACTER_STATE for display purposes only
+    clean_text, character_state = parse_character_state(response_text)
+
+    # Parse actions
+    clean_text, quick_actions = parse_actions(clean_text)
+
+    # Get final state (ADK has already persisted everything)
+    final_session = await session_service.get_session(app_name='litrealms', user_id=user_id, session_id=session_id)
+
+    # Merge character state into the session state for frontend display,
+    # leaving out the context compactor's per-session bookkeeping
+    session_state = strip_compaction_state(final_session.state) if final_session else {}
+    display_state = {**session_state, **character_state} if character_state else session_state
+
+    # Record the turn against the session's chapter (if any) in the background;
+    # the write-behind queue batches it with other users' turns
+    new_messages = [
+        {
+            'role': 'user',
+            'content': request.message,
+            'timestamp': datetime.utcnow().isoformat()
+        },
+        {
+            'role': 'assistant',
+            'content': response_text,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    ]
+    await write_behind.submit(session_id, new_messages, display_state)
+
+    return ChatResponse(
+        response=clean_text,
+        session_id=session_id,
+        quick_actions=quick_actions,
+        state=display_state
+    )
+
+async def run_chat_turn(request: ChatRequest, session_id: str) -> ChatResponse:
+    """Run one player turn through the DM agent; callers hold the session's lock"""
+    try:
+        user_id = "user"
+        session = await get_or_create_chat_session(user_id, session_id)
+        route = router.route(session.state, request.message, session.events)
 
         message = types.Content(role='user', parts=[types.Part(text=request.message)])
 
         # Run agent - ADK handles all state persistence automatically!
         # The agent will use get_prologue tool to fetch prologue on first message
         response_parts = []
-        async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=message):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_parts.append(part.text)
+        with metrics.timer(f"chat.{route}"):
+            async for event in chat_runners[route].run_async(user_id=user_id, session_id=session_id, new_message=message):
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if hasattr(part, 'text') and part.text:
+                            response_parts.append(part.text)
 
-        response_text = ''.join(response_parts)
-        
-        # Parse CHARACTER_STATE for display purposes only
-        clean_text, character_state = parse_character_state(response_text)
-        
-        # Parse actions
-        clean_text, quick_actions = parse_actions(clean_text)
-        
-        # Get final state (ADK has already persisted everything)
-        final_session = await session_service.get_session(app_name='litrealms', user_id=user_id, session_id=session_id)
-
-        # Merge character state into the session state for frontend display
-        if final_session and character_state:
-            display_state = {**final_session.state, **character_state}
-        else:
-            display_state = final_session.state if final_session else {}
-
-        # Update chapter's final_state in database if this is a chapter session
-        chapter = db.get_chapter_by_session_id(session_id)
-        if chapter:
-            # Append new messages to game transcript
-            new_messages = [
-                {
-                    'role': 'user',
-                    'content': request.message,
-                    'timestamp': datetime.utcnow().isoformat()
-                },
-                {
-                    'role': 'assistant',
-                    'content': response_text,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-            ]
+        return await finish_chat_turn(request, user_id, session_id, ''.join(response_parts))
 
-            # Convert existing GameMessage objects to dicts
-            existing_transcript = [
-                msg.model_dump() if hasattr(msg, 'model_dump') else msg
-                for msg in chapter.game_transcript
-            ]
-            updated_transcript = existing_transcript + new_messages
-
-            # Update chapter with new state and transcript
-            db.update_chapter(
-                chapter.id,
-                final_state=json.dumps(display_state),
-                game_transcript=json.dumps(updated_transcript)
-            )
-
-        return ChatResponse(
-            response=clean_text,
-            session_id=session_id,
-            quick_actions=quick_actions,
-            state=display_state
-        )
-        
     except Exception as e:
         import traceback
         print(f"Error: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
+# Streaming turns outlive their response if the client goes away; keep a reference
+# so they aren't garbage-collected mid-turn
+_chat_stream_tasks: set = set()
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming variant of /chat: the DM's reply is sent as Server-Sent Events while
+    the model writes it (see streaming.py for the event types). The turn runs in
+    its own task, so it still completes and is recorded if the client disconnects.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_turn():
+        user_id = "user"
+        try:
+            async with session_locks.session_lock(session_id):
+                session = await get_or_create_chat_session(user_id, session_id)
+                route = router.route(session.state, request.message, session.events)
+                message = types.Content(role='user', parts=[types.Part(text=request.message)])
+
+                text_filter = streaming.TextStreamFilter()
+                response_parts = []
+                streamed_partials = False
+                started = time.perf_counter()
+                first_text_at = None
+                with metrics.timer(f"chat_stream.{route}"):
+                    async for event in chat_runners[route].run_async(
+                        user_id=user_id,
+                        session_id=session_id,
+                        new_message=message,
+                        run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+                    ):
+                        if not (event.content and event.content.parts):
+                            continue
+                        text = ''.join(part.text for part in event.content.parts if getattr(part, 'text', None))
+                        if not text:
+                            continue
+
+                        # Partial events carry deltas; the final event of each model response
+                        # repeats the whole text, and is only forwarded if no deltas were
+                        if event.partial:
+                            streamed_partials = True
+                        else:
+                            response_parts.append(text)
+                            if streamed_partials:
+                                streamed_partials = False
+                                continue
+
+                        visible = text_filter.feed(text)
+                        if visible:
+                            if first_text_at is None:
+                                first_text_at = time.perf_counter()
+                                metrics.record(f"chat_stream.{route}.first_text", first_text_at - started)
+                            events.put_nowait(streaming.sse_event('text', {'text': visible}))
+
+                visible = text_filter.flush()
+                if visible:
+                    events.put_nowait(streaming.sse_event('text', {'text': visible}))
+
+                result = await finish_chat_turn(request, user_id, session_id, ''.join(response_parts))
+
+            payload = result.model_dump(mode='json')
+            events.put_nowait(streaming.sse_event('actions', {'quick_actions': payload['quick_actions']}))
+            events.put_nowait(streaming.sse_event('state', {'state': payload['state']}))
+            events.put_nowait(streaming.sse_event('done', payload))
+        except Exception as e:
+            import traceback
+            print(f"Error streaming chat: {str(e)}\n{traceback.format_exc()}")
+            events.put_nowait(streaming.sse_event('error', {'error': str(e)}))
+        finally:
+            events.put_nowait(None)
+
+    task = asyncio.create_task(run_turn())
+    _chat_stream_tasks.add(task)
+    task.add_done_callback(_chat_stream_tasks.discard)
+
+    async def event_stream():
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            yield event
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/session/{session_id}/save-story-draft")
 async def save_story_draft(session_id: str, request: dict):
     """
@@ -1581,7 +1931,7 @@ async def get_session_history(session_id: str):
 
         # Get conversation history from events table
         import sqlite3
-        conn = sqlite3.connect('adk_sessions.db')
+        conn = sqlite3.connect(session_gc.SESSIONS_DB_PATH)
         cursor = conn.cursor()
         cursor.execute("""
             SELECT content, author, timestamp FROM events
@@ -1706,39 +2056,34 @@ QUEST TEMPLATE: {context_data['quest_template']}
         if request.custom_prompt:
             generation_prompt += f"\n\nUSER REQUEST: {request.custom_prompt}"
 
-        # Create temporary session for prologue generation (unique per request)
+        # Temporary session for prologue generation (unique per request; only created on a cache miss)
         prologue_session_id = f"prologue_{str(uuid.uuid4())}"
-        await session_service.create_session(
-            app_name='litrealms_prologue',
-            user_id=user_id,
-            session_id=prologue_session_id,
-            state={}
-        )
 
-        # Run Prologue Generator Agent
-        prologue_runner = Runner(
-            app_name='litrealms_prologue',
-            agent=prologue_generator_agent,
-            session_service=session_service
-        )
+        async def generate() -> str:
+            await session_service.create_session(
+                app_name='litrealms_prologue',
+                user_id=user_id,
+                session_id=prologue_session_id,
+                state={}
+            )
 
-        message = types.Content(
-            role='user',
-            parts=[types.Part(text=generation_prompt)]
-        )
+            # Run Prologue Generator Agent
+            prologue_runner = Runner(
+                app_name='litrealms_prologue',
+                agent=prologue_generator_agent,
+                session_service=session_service
+            )
 
-        response_parts = []
-        async for event in prologue_runner.run_async(
-            user_id=user_id,
-            session_id=prologue_session_id,
-            new_message=message
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_parts.append(part.text)
+            message = types.Content(
+                role='user',
+                parts=[types.Part(text=generation_prompt)]
+            )
 
-        prologue_text = ''.join(response_parts).strip()
+            return (await llm_gateway.run_agent('prologue', prologue_runner, user_id, prologue_session_id, message)).strip()
+
+        prologue_text = await generation_cache.cached(
+            'prologue', PROLOGUE_PROMPT_VERSION, generation_prompt, generate, bypass=request.regenerate
+        )
 
         # Automatically validate the generated prologue
         validation_result = None
@@ -1811,14 +2156,7 @@ Original Narrative:
 Return ONLY the enhanced narrative text, with no preamble or explanation."""
 
         # Use Gemini directly for enhancement
-        import google.generativeai as genai
-        import os
-
-        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-
-        response = model.generate_content(enhancement_prompt)
-        enhanced_text = response.text.strip()
+        enhanced_text = (await llm_gateway.generate('enhance', enhancement_prompt, model='gemini-2.0-flash-exp')).strip()
 
         return {
             "enhanced_narrative": enhanced_text
@@ -1835,6 +2173,8 @@ async def compile_story(session_id: str):
     Compile a gameplay session into a polished, publishable story.
     The Story Compiler Agent transforms raw chat history into readable narrative.
     If a saved draft exists, return that instead of re-compiling.
+    To run it in the background, POST /jobs with kind compile_story - a GET
+    doesn't queue jobs, so retries and prefetches can't start one.
     """
     try:
         user_id = "user"
@@ -1861,7 +2201,7 @@ async def compile_story(session_id: str):
 
         # Get conversation history from events table
         import sqlite3
-        conn = sqlite3.connect('adk_sessions.db')
+        conn = sqlite3.connect(session_gc.SESSIONS_DB_PATH)
         cursor = conn.cursor()
         cursor.execute("""
             SELECT content, author FROM events
@@ -1889,53 +2229,12 @@ async def compile_story(session_id: str):
         compilation_prompt = f"""Compile this gameplay session into a polished story.
 
 SESSION DATA:
-{json.dumps(session_data, indent=2)}
+{prompt_builder.dumps(session_data)}
 
 Transform the raw gameplay into a beautiful narrative following your instructions. Return valid JSON with the compiled story structure."""
 
-        # Create temporary session for compilation
-        compile_session_id = f"compile_{session_id}"
-
-        # Check if compile session already exists
-        existing_compile_session = await session_service.get_session(
-            app_name='litrealms_compiler',
-            user_id=user_id,
-            session_id=compile_session_id
-        )
-
-        # Only create the compile session if it doesn't exist
-        if not existing_compile_session:
-            await session_service.create_session(
-                app_name='litrealms_compiler',
-                user_id=user_id,
-                session_id=compile_session_id,
-                state={}
-            )
-
-        # Run Story Compiler Agent
-        compiler_runner = Runner(
-            app_name='litrealms_compiler',
-            agent=story_compiler_agent,
-            session_service=session_service
-        )
-
-        message = types.Content(
-            role='user',
-            parts=[types.Part(text=compilation_prompt)]
-        )
-
-        response_parts = []
-        async for event in compiler_runner.run_async(
-            user_id=user_id,
-            session_id=compile_session_id,
-            new_message=message
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_parts.append(part.text)
-
-        response_text = ''.join(response_parts)
+        await jobs.report_progress(0.1, "Compiling story")
+        response_text = await run_compiler('compile_story', compilation_prompt)
 
         # Parse JSON response from agent
         # Robust JSON extraction - handle text before/after JSON and markdown fences
@@ -1989,6 +2288,8 @@ Transform the raw gameplay into a beautiful narrative following your instruction
             "details": str(e)
         }
         raise HTTPException(status_code=500, detail=error_detail)
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"Error compiling story: {str(e)}\n{traceback.format_exc()}")
@@ -1999,6 +2300,7 @@ async def validate_content(request: ContentValidationRequest):
     """
     Validate narrative content (prologue or chapter) for consistency with story configuration.
     Uses the Content Validation Agent to check world, character, tone, quest, and mode alignment.
+    Repeat validations of the same content are served from the generation cache.
     """
     try:
         user_id = "validator"
@@ -2024,37 +2326,33 @@ STORY_CONFIGURATION:
 
 Please validate this {request.content_type} and provide your assessment."""
 
-        # Run validation using standalone runner
-        validation_runner = Runner(
-            app_name='litrealms_validation',
-            agent=content_validation_agent,
-            session_service=session_service
-        )
+        async def validate() -> str:
+            # Run validation using standalone runner
+            validation_runner = Runner(
+                app_name='litrealms_validation',
+                agent=content_validation_agent,
+                session_service=session_service
+            )
 
-        # Create session for validation
-        await session_service.create_session(
-            app_name='litrealms_validation',
-            user_id=user_id,
-            session_id=validation_session_id,
-            state={}
-        )
+            # Create session for validation
+            await session_service.create_session(
+                app_name='litrealms_validation',
+                user_id=user_id,
+                session_id=validation_session_id,
+                state={}
+            )
 
-        # Use Content for the message
-        message = types.Content(
-            role='user',
-            parts=[types.Part(text=validation_prompt)]
-        )
+            # Use Content for the message
+            message = types.Content(
+                role='user',
+                parts=[types.Part(text=validation_prompt)]
+            )
 
-        response_text = ""
-        async for event in validation_runner.run_async(
-            user_id=user_id,
-            session_id=validation_session_id,
-            new_message=message
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_text += part.text
+            return await llm_gateway.run_agent('validate_content', validation_runner, user_id, validation_session_id, message)
+
+        response_text = await generation_cache.cached(
+            'validate_content', VALIDATION_PROMPT_VERSION, validation_prompt, validate, bypass=request.regenerate
+        )
 
         # Parse validation response
         validation_result = parse_validation_response(response_text)
@@ -2134,14 +2432,24 @@ def parse_validation_response(response_text: str) -> ContentValidationResponse:
         )
 
 @app.post("/books/{book_id}/validate", response_model=BookValidationResponse)
-async def validate_book(book_id: str):
+async def validate_book(
+    book_id: str,
+    run_async: Annotated[bool, Query(alias="async")] = False,
+    user: Annotated[str, Depends(admission.request_user)] = "jobs"
+):
     """
     Validate an entire book for cross-chapter consistency, continuity, and narrative coherence.
     Uses the Book Validation Agent to check character, world, plot, timeline, item, stat, tone, and arc consistency.
+    Concurrent requests for the same book content share one validation.
+    With async=true, queues a validate_book job and returns it (202) instead.
     """
+    if run_async:
+        return await submit_job('validate_book', {'book_id': book_id}, user)
+
     try:
         # Get the book with all chapters
-        book = db.get_book(book_id)
+        await write_behind.flush()
+        book = await adb.get_book(book_id, include_transcripts=False)
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
 
@@ -2179,37 +2487,35 @@ STORY CONFIGURATION:
 
 Please validate this complete book for cross-chapter consistency and provide your assessment."""
 
-        # Run validation using standalone runner
-        validation_runner = Runner(
-            app_name='litrealms_book_validation',
-            agent=book_validation_agent,
-            session_service=session_service
-        )
+        async def validate() -> str:
+            # Run validation using standalone runner
+            validation_runner = Runner(
+                app_name='litrealms_book_validation',
+                agent=book_validation_agent,
+                session_service=session_service
+            )
 
-        # Create session for validation
-        await session_service.create_session(
-            app_name='litrealms_book_validation',
-            user_id=user_id,
-            session_id=validation_session_id,
-            state={}
-        )
+            # Create session for validation
+            await session_service.create_session(
+                app_name='litrealms_book_validation',
+                user_id=user_id,
+                session_id=validation_session_id,
+                state={}
+            )
 
-        # Use Content for the message
-        message = types.Content(
-            role='user',
-            parts=[types.Part(text=validation_prompt)]
-        )
+            # Use Content for the message
+            message = types.Content(
+                role='user',
+                parts=[types.Part(text=validation_prompt)]
+            )
 
-        response_text = ""
-        async for event in validation_runner.run_async(
-            user_id=user_id,
-            session_id=validation_session_id,
-            new_message=message
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        response_text += part.text
+            return await llm_gateway.run_agent('validate_book', validation_runner, user_id, validation_session_id, message)
+
+        # Two tabs validating the same, unchanged book share one validator run
+        await jobs.report_progress(0.1, "Validating book")
+        response_text = await single_flight.run(
+            'validate_book', book_id, single_flight.content_version(validation_prompt), validate
+        )
 
         # Parse validation response
         validation_result = parse_book_validation_response(response_text)
@@ -2372,6 +2678,90 @@ def parse_book_validation_response(response_text: str) -> BookValidationResponse
         )
 
 
+# Background jobs (jobs.py): the long operations above, run by the worker pool
+
+async def submit_job(kind: str, params: dict, user_id: str) -> JSONResponse:
+    job = await jobs.submit(kind, params, user_id)
+    return JSONResponse(status_code=202, content=job.model_dump())
+
+@jobs.register('compile_chapter')
+async def compile_chapter_job(params: dict) -> dict:
+    return (await compile_chapter(
+        params['chapter_id'], params.get('regenerate', False), params.get('revise_previous', False)
+    )).model_dump()
+
+@jobs.register('compile_dm_narrative')
+async def compile_dm_narrative_job(params: dict) -> dict:
+    return (await compile_chapter_dm_narrative(
+        params['chapter_id'], params.get('regenerate', False), params.get('revise_previous', False)
+    )).model_dump()
+
+# Simulation appends to the transcript, so a retry after a partial failure could duplicate turns
+@jobs.register('simulate_gameplay', max_attempts=1)
+async def simulate_gameplay_job(params: dict) -> dict:
+    return await simulate_gameplay(params['chapter_id'])
+
+@jobs.register('compile_story')
+async def compile_story_job(params: dict) -> dict:
+    return (await compile_story(params['session_id'])).model_dump()
+
+@jobs.register('validate_book')
+async def validate_book_job(params: dict) -> dict:
+    return (await validate_book(params['book_id'])).model_dump()
+
+@app.post("/jobs", response_model=Job, status_code=202)
+async def submit_job_endpoint(
+    request: SubmitJobRequest,
+    user: Annotated[str, Depends(admission.request_user)]
+):
+    """Queue a background job, e.g. {"kind": "compile_chapter", "params": {"chapter_id": "..."}}"""
+    try:
+        return await jobs.submit(request.kind, request.params, user)
+    except KeyError:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": f"Unknown job kind: {request.kind}", "kinds": sorted(jobs.HANDLERS)}
+        )
+    except Exception as e:
+        print(f"Error submitting job: {str(e)}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+
+@app.get("/jobs/{job_id}", response_model=Job)
+async def get_job_endpoint(job_id: str):
+    """Status and progress of a job"""
+    job = await adb.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result_endpoint(job_id: str):
+    """
+    The job's result once it has succeeded - the same body the synchronous endpoint
+    returns. While it is queued or running this returns 202 with the job; if it
+    failed or was cancelled, 409 with its error.
+    """
+    job = await adb.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status in ('queued', 'running'):
+        return JSONResponse(status_code=202, content=job.model_dump())
+    if job.status != 'succeeded':
+        raise HTTPException(
+            status_code=409,
+            detail={"error": job.error or f"Job {job.status}", "status": job.status}
+        )
+    return await adb.get_job_result(job_id)
+
+@app.post("/jobs/{job_id}/cancel", response_model=Job)
+async def cancel_job_endpoint(job_id: str):
+    """Cancel a queued or running job (finished jobs are returned unchanged)"""
+    job = await jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,85 @@
+"""
+In-process request metrics: latencies (record/timer) and sizes such as prompt
+tokens (observe).
+
+Each metric keeps its most recent WINDOW samples and reports count, mean and
+percentiles over them (GET /admin/metrics). Per process: with several workers,
+each reports its own traffic.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator
+
+WINDOW = int(os.getenv("LITREALMS_METRICS_WINDOW", "1000"))  # samples kept per metric
+
+_lock = threading.Lock()
+_samples: Dict[str, Deque[float]] = {}
+_counts: Dict[str, int] = {}
+_units: Dict[str, str] = {}  # suffix for the metric's summary fields, e.g. 'ms'
+
+
+def _add(name: str, value: float, unit: str) -> None:
+    with _lock:
+        _samples.setdefault(name, deque(maxlen=WINDOW)).append(value)
+        _counts[name] = _counts.get(name, 0) + 1
+        _units[name] = unit
+
+
+def record(name: str, seconds: float) -> None:
+    """Add one latency sample to `name`"""
+    _add(name, 1000 * seconds, 'ms')
+
+
+def observe(name: str, value: float) -> None:
+    """Add one sample of a unitless quantity (a size or count) to `name`"""
+    _add(name, value, '')
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Record how long the block takes (including awaits inside it) under `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _summary(ordered: list, count: int, unit: str) -> dict:
+    suffix = f"_{unit}" if unit else ""
+    return {
+        'count': count,
+        'window': len(ordered),
+        f'mean{suffix}': round(sum(ordered) / len(ordered), 1),
+        f'p50{suffix}': round(_percentile(ordered, 0.50), 1),
+        f'p95{suffix}': round(_percentile(ordered, 0.95), 1),
+        f'max{suffix}': round(ordered[-1], 1),
+    }
+
+
+def snapshot() -> Dict[str, dict]:
+    """Summary of every metric over its current window (latencies in milliseconds)"""
+    with _lock:
+        samples = {name: sorted(values) for name, values in _samples.items()}
+        counts = dict(_counts)
+        units = dict(_units)
+
+    return {
+        name: _summary(ordered, counts[name], units[name])
+        for name, ordered in sorted(samples.items())
+    }
+
+
+def reset() -> None:
+    with _lock:
+        _samples.clear()
+        _counts.clear()
+        _units.clear()
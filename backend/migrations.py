@@ -0,0 +1,432 @@
+"""
+Versioned schema migrations for the books database.
+
+Each migration is a function that receives a connection and runs inside its own
+transaction. Applied versions are recorded in the schema_migrations table, so
+init_database() only runs the ones a database hasn't seen yet. To change the
+schema, append a new function to MIGRATIONS - never edit one that has shipped.
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+
+def _001_initial_schema(conn: sqlite3.Connection) -> None:
+    """Books and chapters tables (matches databases created before migrations existed)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS books (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            subtitle TEXT,
+            game_config TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            total_word_count INTEGER DEFAULT 0
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chapters (
+            id TEXT PRIMARY KEY,
+            book_id TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            game_transcript TEXT NOT NULL,
+            initial_state TEXT NOT NULL,
+            final_state TEXT NOT NULL,
+            authored_content TEXT NOT NULL,
+            last_edited TEXT NOT NULL,
+            word_count INTEGER DEFAULT 0,
+            previous_chapter_id TEXT,
+            next_chapter_id TEXT,
+            narrative_summary TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (book_id) REFERENCES books(id),
+            UNIQUE(book_id, number)
+        )
+    """)
+
+
+def _002_chapter_messages(conn: sqlite3.Connection) -> None:
+    """One row per transcript message; explode legacy chapters.game_transcript blobs"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chapter_messages (
+            chapter_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            PRIMARY KEY (chapter_id, seq),
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id)
+        ) WITHOUT ROWID
+    """)
+
+    conn.execute("""
+        DELETE FROM chapter_messages
+        WHERE chapter_id IN (SELECT id FROM chapters WHERE game_transcript != '[]')
+    """)
+    conn.execute("""
+        INSERT INTO chapter_messages (chapter_id, seq, role, content, timestamp)
+        SELECT c.id,
+               msg.key + 1,
+               json_extract(msg.value, '$.role'),
+               json_extract(msg.value, '$.content'),
+               COALESCE(json_extract(msg.value, '$.timestamp'), c.updated_at)
+        FROM chapters c, json_each(c.game_transcript) msg
+        WHERE c.game_transcript != '[]'
+    """)
+    conn.execute("UPDATE chapters SET game_transcript = '[]' WHERE game_transcript != '[]'")
+
+
+def _003_indexes_and_cascades(conn: sqlite3.Connection) -> None:
+    """Index session/user lookups and add ON DELETE CASCADE foreign keys
+
+    SQLite can't add a cascade to an existing table, so chapters and chapter_messages
+    are rebuilt. chapters.book_id lookups are already served by the UNIQUE(book_id, number) index.
+    """
+    # Drop orphans so the rebuilt foreign keys hold
+    conn.execute("DELETE FROM chapters WHERE book_id NOT IN (SELECT id FROM books)")
+    conn.execute("DELETE FROM chapter_messages WHERE chapter_id NOT IN (SELECT id FROM chapters)")
+
+    conn.execute("""
+        CREATE TABLE chapters_new (
+            id TEXT PRIMARY KEY,
+            book_id TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            game_transcript TEXT NOT NULL,
+            initial_state TEXT NOT NULL,
+            final_state TEXT NOT NULL,
+            authored_content TEXT NOT NULL,
+            last_edited TEXT NOT NULL,
+            word_count INTEGER DEFAULT 0,
+            previous_chapter_id TEXT,
+            next_chapter_id TEXT,
+            narrative_summary TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE,
+            UNIQUE(book_id, number)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO chapters_new (
+            id, book_id, number, title, status, session_id, game_transcript,
+            initial_state, final_state, authored_content, last_edited, word_count,
+            previous_chapter_id, next_chapter_id, narrative_summary, created_at, updated_at
+        )
+        SELECT
+            id, book_id, number, title, status, session_id, game_transcript,
+            initial_state, final_state, authored_content, last_edited, word_count,
+            previous_chapter_id, next_chapter_id, narrative_summary, created_at, updated_at
+        FROM chapters
+    """)
+    conn.execute("DROP TABLE chapters")
+    conn.execute("ALTER TABLE chapters_new RENAME TO chapters")
+
+    conn.execute("""
+        CREATE TABLE chapter_messages_new (
+            chapter_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            PRIMARY KEY (chapter_id, seq),
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO chapter_messages_new (chapter_id, seq, role, content, timestamp)
+        SELECT chapter_id, seq, role, content, timestamp FROM chapter_messages
+    """)
+    conn.execute("DROP TABLE chapter_messages")
+    conn.execute("ALTER TABLE chapter_messages_new RENAME TO chapter_messages")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chapters_session_id ON chapters(session_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_user_created ON books(user_id, created_at)")
+
+
+def _004_state_snapshots_and_deltas(conn: sqlite3.Connection) -> None:
+    """Per-turn chapter state deltas with periodic full snapshots
+
+    chapters.final_state becomes the snapshot at chapters.state_turn; deltas after
+    that turn are applied on read. Existing chapters get a turn 0 snapshot of their
+    initial state and, if it moved, a turn 1 snapshot of their final state.
+    """
+    conn.execute("""
+        CREATE TABLE chapter_state_snapshots (
+            chapter_id TEXT NOT NULL,
+            turn INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (chapter_id, turn),
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE chapter_state_deltas (
+            chapter_id TEXT NOT NULL,
+            turn INTEGER NOT NULL,
+            delta TEXT NOT NULL,
+            message_seq INTEGER,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (chapter_id, turn),
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    conn.execute("ALTER TABLE chapters ADD COLUMN state_turn INTEGER NOT NULL DEFAULT 0")
+
+    conn.execute("""
+        INSERT INTO chapter_state_snapshots (chapter_id, turn, state, created_at)
+        SELECT id, 0, initial_state, created_at FROM chapters
+    """)
+    conn.execute("""
+        INSERT INTO chapter_state_snapshots (chapter_id, turn, state, created_at)
+        SELECT id, 1, final_state, updated_at FROM chapters WHERE final_state != initial_state
+    """)
+    conn.execute("UPDATE chapters SET state_turn = 1 WHERE final_state != initial_state")
+
+
+def _005_full_text_search(conn: sqlite3.Connection) -> None:
+    """FTS5 index over transcript messages, authored content and chapter summaries
+
+    search_docs gives every indexed text an integer id (chapter_messages has no rowid).
+    search_index is an external-content FTS5 table over the search_source view, so text
+    is stored once (compressed, in its own table) and only decoded for snippets.
+    Triggers keep it in sync; they call litrealms_decode(), which database.py registers
+    on every connection, so writes to these tables need a connection from its pool.
+    """
+    conn.execute("""
+        CREATE TABLE search_docs (
+            id INTEGER PRIMARY KEY,
+            chapter_id TEXT NOT NULL,
+            kind TEXT NOT NULL,  -- 'message', 'authored' or 'summary'
+            seq INTEGER NOT NULL DEFAULT 0,  -- message seq; 0 for chapter-level text
+            UNIQUE(chapter_id, kind, seq)
+        )
+    """)
+    conn.execute("""
+        CREATE VIEW search_source AS
+        SELECT d.id AS doc_id,
+               CASE d.kind
+                   WHEN 'message' THEN litrealms_decode(m.content)
+                   WHEN 'authored' THEN litrealms_decode(c.authored_content)
+                   ELSE c.narrative_summary
+               END AS body
+        FROM search_docs d
+        LEFT JOIN chapter_messages m ON d.kind = 'message' AND m.chapter_id = d.chapter_id AND m.seq = d.seq
+        LEFT JOIN chapters c ON d.kind != 'message' AND c.id = d.chapter_id
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            body, content='search_source', content_rowid='doc_id', tokenize='porter unicode61'
+        )
+    """)
+
+    # Transcript messages
+    conn.execute("""
+        CREATE TRIGGER chapter_messages_search_insert AFTER INSERT ON chapter_messages BEGIN
+            INSERT INTO search_docs (chapter_id, kind, seq) VALUES (new.chapter_id, 'message', new.seq);
+            INSERT INTO search_index (rowid, body) VALUES (last_insert_rowid(), litrealms_decode(new.content));
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER chapter_messages_search_delete AFTER DELETE ON chapter_messages BEGIN
+            INSERT INTO search_index (search_index, rowid, body)
+                SELECT 'delete', id, litrealms_decode(old.content) FROM search_docs
+                WHERE chapter_id = old.chapter_id AND kind = 'message' AND seq = old.seq;
+            DELETE FROM search_docs WHERE chapter_id = old.chapter_id AND kind = 'message' AND seq = old.seq;
+        END
+    """)
+    # Recompressing a message changes its bytes but not its text
+    conn.execute("""
+        CREATE TRIGGER chapter_messages_search_update AFTER UPDATE OF content ON chapter_messages
+        WHEN litrealms_decode(old.content) IS NOT litrealms_decode(new.content) BEGIN
+            INSERT INTO search_index (search_index, rowid, body)
+                SELECT 'delete', id, litrealms_decode(old.content) FROM search_docs
+                WHERE chapter_id = old.chapter_id AND kind = 'message' AND seq = old.seq;
+            INSERT INTO search_index (rowid, body)
+                SELECT id, litrealms_decode(new.content) FROM search_docs
+                WHERE chapter_id = new.chapter_id AND kind = 'message' AND seq = new.seq;
+        END
+    """)
+
+    # Authored content and narrative summary
+    conn.execute("""
+        CREATE TRIGGER chapters_search_insert AFTER INSERT ON chapters BEGIN
+            INSERT INTO search_docs (chapter_id, kind) VALUES (new.id, 'authored');
+            INSERT INTO search_index (rowid, body) VALUES (last_insert_rowid(), litrealms_decode(new.authored_content));
+            INSERT INTO search_docs (chapter_id, kind) VALUES (new.id, 'summary');
+            INSERT INTO search_index (rowid, body) VALUES (last_insert_rowid(), new.narrative_summary);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER chapters_search_update_authored AFTER UPDATE OF authored_content ON chapters
+        WHEN litrealms_decode(old.authored_content) IS NOT litrealms_decode(new.authored_content) BEGIN
+            INSERT INTO search_index (search_index, rowid, body)
+                SELECT 'delete', id, litrealms_decode(old.authored_content) FROM search_docs
+                WHERE chapter_id = old.id AND kind = 'authored';
+            INSERT INTO search_index (rowid, body)
+                SELECT id, litrealms_decode(new.authored_content) FROM search_docs
+                WHERE chapter_id = new.id AND kind = 'authored';
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER chapters_search_update_summary AFTER UPDATE OF narrative_summary ON chapters
+        WHEN old.narrative_summary IS NOT new.narrative_summary BEGIN
+            INSERT INTO search_index (search_index, rowid, body)
+                SELECT 'delete', id, old.narrative_summary FROM search_docs
+                WHERE chapter_id = old.id AND kind = 'summary';
+            INSERT INTO search_index (rowid, body)
+                SELECT id, new.narrative_summary FROM search_docs
+                WHERE chapter_id = new.id AND kind = 'summary';
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER chapters_search_delete AFTER DELETE ON chapters BEGIN
+            INSERT INTO search_index (search_index, rowid, body)
+                SELECT 'delete', id, CASE kind
+                    WHEN 'authored' THEN litrealms_decode(old.authored_content)
+                    ELSE old.narrative_summary
+                END
+                FROM search_docs WHERE chapter_id = old.id AND kind IN ('authored', 'summary');
+            DELETE FROM search_docs WHERE chapter_id = old.id AND kind IN ('authored', 'summary');
+        END
+    """)
+
+    # Index what's already there
+    conn.execute("""
+        INSERT INTO search_docs (chapter_id, kind, seq)
+        SELECT id, 'authored', 0 FROM chapters
+        UNION ALL SELECT id, 'summary', 0 FROM chapters
+        UNION ALL SELECT chapter_id, 'message', seq FROM chapter_messages
+    """)
+    conn.execute("INSERT INTO search_index (search_index) VALUES ('rebuild')")
+
+
+def _006_chapter_versions(conn: sqlite3.Connection) -> None:
+    """Chapter row version for compare-and-swap updates"""
+    conn.execute("ALTER TABLE chapters ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _007_generation_cache(conn: sqlite3.Connection) -> None:
+    """Persistent tier of generation_cache: model outputs keyed by a hash of their inputs"""
+    conn.execute("""
+        CREATE TABLE generation_cache (
+            key TEXT PRIMARY KEY,
+            agent TEXT NOT NULL,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX idx_generation_cache_created ON generation_cache(created_at)")
+
+
+def _008_jobs(conn: sqlite3.Connection) -> None:
+    """Background job queue (jobs.py)
+
+    run_after and lease_until are epoch seconds: a queued job is due once run_after
+    has passed, and a running job whose lease has lapsed (its worker died) is claimed
+    again like a queued one.
+    """
+    conn.execute("""
+        CREATE TABLE jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            progress_message TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            result BLOB,
+            error TEXT,
+            worker TEXT,
+            run_after REAL NOT NULL,
+            lease_until REAL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            finished_at TEXT
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX idx_jobs_status_run_after ON jobs(status, run_after)")
+
+
+# Ordered list of (version, migration). Append only.
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _001_initial_schema),
+    (2, _002_chapter_messages),
+    (3, _003_indexes_and_cascades),
+    (4, _004_state_snapshots_and_deltas),
+    (5, _005_full_text_search),
+    (6, _006_chapter_versions),
+    (7, _007_generation_cache),
+    (8, _008_jobs),
+]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Highest migration version applied to this database (0 if none)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """
+    Apply every pending migration in order, each in its own transaction.
+    `conn` must be in autocommit mode (isolation_level=None) with no open transaction.
+    Returns the versions that were applied.
+    """
+    applied = []
+
+    # Table rebuilds need foreign key enforcement off, and the pragma is a no-op inside a transaction
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        version = current_version(conn)
+        for target, migration in MIGRATIONS:
+            if target <= version:
+                continue
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker process may have applied it while we waited for the lock
+                if conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (target,)).fetchone():
+                    conn.commit()
+                    continue
+
+                migration(conn)
+                violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(
+                        f"Migration {target} left {len(violations)} foreign key violations"
+                    )
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                    (target, (migration.__doc__ or migration.__name__).strip().splitlines()[0],
+                     datetime.utcnow().isoformat())
+                )
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            applied.append(target)
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+
+    return applied
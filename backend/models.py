@@ -4,7 +4,7 @@ Mirrors the TypeScript types from frontend/src/lib/types/game.ts
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 # Enums
 StoryMode = Literal['progression', 'dungeon_crawl', 'survival_quest', 'campaign', 'solo', 'legacy']
@@ -200,6 +200,7 @@ class PrologueGenerationRequest(BaseModel):
     background: Optional[Background] = None
     alignment: Optional[Alignment] = None
     character_role: Optional[CharacterRole] = None
+    regenerate: bool = False  # skip the generation cache and replace its entry
 
 class PrologueGenerationResponse(BaseModel):
     prologue: str
@@ -229,6 +230,7 @@ class ContentValidationRequest(BaseModel):
     alignment: str  # Alignment
     character_role: str  # CharacterRole
     quest_template: str  # QuestType
+    regenerate: bool = False  # skip the generation cache and replace its entry
 
 class ContentValidationResponse(BaseModel):
     overall_score: int  # 0-100
@@ -247,6 +249,7 @@ class GameMessage(BaseModel):
     role: Literal['user', 'assistant']
     content: str
     timestamp: str
+    seq: Optional[int] = None  # Position in the chapter transcript (chapter_messages.seq)
 
 class ChapterStatus(BaseModel):
     status: Literal['draft', 'in_progress', 'complete', 'published']
@@ -277,6 +280,7 @@ class Chapter(BaseModel):
     # Metadata
     created_at: str
     updated_at: str
+    version: int = 1  # Bumped by every update_chapter; pass back for compare-and-swap edits
 
 class Book(BaseModel):
     id: str
@@ -289,6 +293,37 @@ class Book(BaseModel):
     updated_at: str
     total_word_count: int = 0
 
+class ChapterSummary(BaseModel):
+    """Chapter listing entry without transcript or state payloads"""
+    id: str
+    number: int
+    title: str
+    status: Literal['draft', 'in_progress', 'complete', 'published']
+    word_count: int
+    last_edited: str
+    created_at: str
+    updated_at: str
+
+class BookSummary(BaseModel):
+    """Lightweight book projection for the library listing"""
+    id: str
+    user_id: str
+    title: str
+    subtitle: Optional[str] = None
+    game_config: GameConfig
+    chapters: List[ChapterSummary]
+    created_at: str
+    updated_at: str
+    total_word_count: int = 0
+
+class ChapterStateAtTurn(BaseModel):
+    """Chapter state reconstructed as of a given state turn"""
+    chapter_id: str
+    turn: int  # 0 is the chapter's initial state
+    latest_turn: int
+    message_seq: Optional[int] = None  # Transcript message that produced this turn's state
+    state: dict
+
 class CreateBookRequest(BaseModel):
     title: str
     subtitle: Optional[str] = None
@@ -303,6 +338,7 @@ class UpdateChapterRequest(BaseModel):
     title: Optional[str] = None
     status: Optional[Literal['draft', 'in_progress', 'complete', 'published']] = None
     authored_content: Optional[str] = None
+    version: Optional[int] = None  # Chapter version the edit was based on; rejected if it has changed
 
 class CompleteChapterRequest(BaseModel):
     create_next: bool = False  # Whether to auto-create next chapter
@@ -356,3 +392,53 @@ class BookValidationResponse(BaseModel):
     cross_chapter_issues: List[str]
     continuity_tracker: ContinuityTracker
     suggested_fixes: List[str]
+
+class SessionGCReport(BaseModel):
+    """Result of an ADK session garbage collection sweep"""
+    sessions_deleted: Dict[str, int]  # By app_name
+    events_deleted: int
+    file_bytes_before: int
+    file_bytes_after: int
+    reclaimed_bytes: int
+    vacuumed: bool
+
+class SearchHit(BaseModel):
+    """A full-text search match within a chapter"""
+    book_id: str
+    book_title: str
+    chapter_id: str
+    chapter_number: int
+    chapter_title: str
+    kind: Literal['message', 'authored', 'summary']
+    message_seq: Optional[int] = None  # Transcript position, for kind == 'message'
+    snippet: str
+    highlights: List[List[int]]  # [start, end) character offsets of matched terms in snippet
+    score: float  # bm25, lower is a better match
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    limit: int
+    offset: int
+    results: List[SearchHit]
+
+JobStatus = Literal['queued', 'running', 'succeeded', 'failed', 'cancelled']
+
+class Job(BaseModel):
+    """A background job (see jobs.py); the result is fetched separately"""
+    id: str
+    kind: str
+    params: Dict
+    status: JobStatus
+    progress: float = 0.0  # 0..1
+    progress_message: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+    finished_at: Optional[str] = None
+
+class SubmitJobRequest(BaseModel):
+    kind: str  # e.g. compile_chapter (jobs.HANDLERS)
+    params: Dict = Field(default_factory=dict)
@@ -0,0 +1,97 @@
+"""
+Compact GAMEPLAY DATA payloads for the story compiler prompts.
+
+Chapter compiles used to embed json.dumps(indent=2) of the whole transcript and
+both state dicts. Much of that is tokens the agent has no use for:
+- every DM message ends in an [ACTIONS] menu and a CHARACTER_STATE block, and
+  most blocks repeat the previous one line for line;
+- initial_state and final_state each carry the onboarding config (factions,
+  decision points, quest paths, world template, ...), which the prompt's CHAPTER
+  INFO and the agent's instructions already cover;
+- two-space indentation.
+
+chapter_payload() keeps the fields the agent's instructions describe, but:
+- [ACTIONS] blocks are dropped;
+- a CHARACTER_STATE block keeps only the lines that differ from the previous
+  block, and is dropped when none do, so the agent still sees every change;
+- initial_state and final_state are cut down to the PROGRESSION_KEYS that change
+  during play.
+dumps() then serializes without whitespace. estimate_tokens() gives endpoints a
+cheap size check; compile prompts over COMPILE_TOKEN_BUDGET are refused.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from transcript_utils import ACTIONS_BLOCK
+
+CHARS_PER_TOKEN = 4  # rough average for English prose, as in context_compaction
+COMPILE_TOKEN_BUDGET = int(os.getenv("LITREALMS_COMPILE_TOKEN_BUDGET", "200000"))  # estimated tokens per compile prompt
+
+# State that changes during play; everything else is static onboarding config
+PROGRESSION_KEYS = (
+    'level', 'xp', 'xp_to_next_level', 'character_stats', 'inventory',
+    'current_location', 'current_quest', 'companions', 'npcs_present',
+)
+
+_STATE_BLOCK = re.compile(r'---\s*\*\*CHARACTER_STATE:\*\*\s*\n(.*?)\n---', re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of `text`; no API call"""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def progression_state(state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The PROGRESSION_KEYS of a chapter state, without unset values"""
+    return {key: state[key] for key in PROGRESSION_KEYS if state and state.get(key) not in (None, [], {})}
+
+
+def compact_messages(messages: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Transcript messages with [ACTIONS] blocks removed and each CHARACTER_STATE
+    block reduced to the lines that changed since the previous block
+    """
+    compacted = []
+    previous_lines: List[str] = []
+
+    def reduce_block(match: re.Match) -> str:
+        nonlocal previous_lines
+        lines = [line.strip() for line in match.group(1).strip().splitlines() if line.strip()]
+        changed = [line for line in lines if line not in previous_lines]
+        previous_lines = lines
+        if not changed:
+            return ''
+        return '---\n**CHARACTER_STATE:**\n' + '\n'.join(changed) + '\n---'
+
+    for message in messages:
+        content = message['content']
+        if message['role'] == 'assistant':
+            content = _STATE_BLOCK.sub(reduce_block, ACTIONS_BLOCK.sub('', content))
+            content = re.sub(r'\n{3,}', '\n\n', content)
+        content = content.strip()
+        if content:
+            compacted.append({'role': message['role'], 'content': content})
+    return compacted
+
+
+def chapter_payload(
+    messages: Iterable[Dict[str, str]],
+    initial_state: Optional[Dict[str, Any]],
+    final_state: Optional[Dict[str, Any]],
+    **fields: Any
+) -> Dict[str, Any]:
+    """GAMEPLAY DATA for a chapter compile: compacted history and states, plus `fields` as given"""
+    return {
+        'session_history': compact_messages(messages),
+        'initial_state': progression_state(initial_state),
+        'final_state': progression_state(final_state),
+        **fields,
+    }
+
+
+def dumps(payload: Any) -> str:
+    """JSON without indentation or padding; non-ASCII text kept as is (fewer tokens than \\u escapes)"""
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=str)
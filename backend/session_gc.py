@@ -0,0 +1,218 @@
+"""
+Garbage collection for ADK sessions in adk_sessions.db.
+
+Prologue generation, validation, gameplay simulation and compiles each create a
+throwaway session per request (compile sessions used to be kept, one per chapter).
+Nothing else ever deletes them. (Those apps now keep their sessions in memory, see
+session_router.py; their retention below still clears rows written before that,
+or by apps moved back to durable storage.) This module removes:
+- sessions idle longer than their app's retention period (RETENTION below),
+- a chapter's sessions when the chapter or its book is deleted.
+
+For the main 'litrealms' app the retention only applies to sessions that no chapter
+refers to (abandoned onboarding, sessions of chapters deleted before this existed);
+a chapter's play session lives as long as the chapter.
+
+Deletes go straight to SQLite in small batches rather than through
+DatabaseSessionService, which deletes one session per call.
+"""
+
+import asyncio
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import database as db
+
+SESSIONS_DB_PATH = os.getenv("LITREALMS_SESSIONS_DB", "adk_sessions.db")
+
+SWEEP_INTERVAL = float(os.getenv("LITREALMS_SESSION_GC_INTERVAL", "3600"))  # seconds, 0 disables the sweeper
+BATCH_SIZE = int(os.getenv("LITREALMS_SESSION_GC_BATCH_SIZE", "500"))  # sessions deleted per transaction
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Seconds since a session's last update before it is deleted, per app_name.
+# Apps not listed are never swept.
+RETENTION: Dict[str, int] = {
+    'litrealms_prologue': HOUR,
+    'litrealms_validation': HOUR,
+    'litrealms_book_validation': HOUR,
+    'litrealms_simulator': HOUR,
+    'litrealms_compiler': 7 * DAY,
+    'litrealms': 30 * DAY,  # only sessions not attached to a chapter
+}
+
+# Override or extend with e.g. LITREALMS_SESSION_RETENTION="litrealms_compiler=86400,litrealms=none"
+for _entry in filter(None, os.getenv("LITREALMS_SESSION_RETENTION", "").split(",")):
+    _app, _seconds = _entry.split("=", 1)
+    if _seconds.strip().lower() == "none":
+        RETENTION.pop(_app.strip(), None)
+    else:
+        RETENTION[_app.strip()] = int(_seconds)
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(SESSIONS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # events has no index on its session columns; without one every delete scans the table
+    # (ADK's own get_session lookups benefit too)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_session ON events(app_name, user_id, session_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_app_updated ON sessions(app_name, update_time)")
+    return conn
+
+
+def _space(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """(file size, bytes in free pages) of the sessions database"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_count * page_size, freelist * page_size
+
+
+def _delete_where(conn: sqlite3.Connection, where: str, params: tuple) -> Tuple[int, int]:
+    """
+    Delete sessions matching `where` (over sessions `s`) and their events, a batch
+    per transaction so ADK writers are never locked out for long.
+    Returns (sessions deleted, events deleted).
+    """
+    sessions = events = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            keys = conn.execute(
+                f"SELECT s.app_name, s.user_id, s.id FROM sessions s WHERE {where} LIMIT ?",
+                params + (BATCH_SIZE,)
+            ).fetchall()
+            for key in keys:
+                events += conn.execute(
+                    "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", tuple(key)
+                ).rowcount
+                conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", tuple(key))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+        sessions += len(keys)
+        if len(keys) < BATCH_SIZE:
+            return sessions, events
+
+
+def sweep(vacuum: bool = False) -> dict:
+    """
+    Delete sessions past their app's retention period. With `vacuum`, also rebuild
+    the file so freed pages are returned to the filesystem (locks the database while
+    it runs). Returns a report of what was deleted and the space reclaimed.
+    """
+    conn = _connect()
+    try:
+        size_before, free_before = _space(conn)
+        sessions_deleted: Dict[str, int] = {}
+        events_deleted = 0
+
+        for app_name, seconds in RETENTION.items():
+            where = "s.app_name = ? AND s.update_time < datetime('now', ?)"
+            params: tuple = (app_name, f"-{seconds} seconds")
+            if app_name == 'litrealms':
+                conn.execute("ATTACH DATABASE ? AS books", (db.DATABASE_PATH,))
+                where += " AND s.id NOT IN (SELECT session_id FROM books.chapters)"
+            try:
+                sessions, events = _delete_where(conn, where, params)
+            finally:
+                if app_name == 'litrealms':
+                    conn.execute("DETACH DATABASE books")
+            if sessions:
+                sessions_deleted[app_name] = sessions
+            events_deleted += events
+
+        size_after, free_after = _space(conn)
+        if vacuum:
+            conn.execute("VACUUM")
+            size_after, free_after = _space(conn)
+    finally:
+        conn.close()
+
+    return {
+        'sessions_deleted': sessions_deleted,
+        'events_deleted': events_deleted,
+        'file_bytes_before': size_before,
+        'file_bytes_after': size_after,
+        # Bytes no longer holding data. Without VACUUM they become free pages that new
+        # sessions reuse; the file itself only shrinks on VACUUM.
+        'reclaimed_bytes': (size_before - free_before) - (size_after - free_after),
+        'vacuumed': vacuum,
+    }
+
+
+def delete_chapter_sessions(chapters: List[Tuple[str, str]]) -> int:
+    """
+    Delete the play, compile and simulation sessions of deleted chapters, given as
+    (chapter_id, session_id) pairs. Returns the number of sessions deleted.
+    """
+    if not chapters:
+        return 0
+
+    conn = _connect()
+    try:
+        total = 0
+        for chapter_id, session_id in chapters:
+            sessions, _ = _delete_where(
+                conn,
+                "(s.app_name = 'litrealms' AND s.id = ?)"
+                " OR (s.app_name = 'litrealms_compiler' AND s.id = ?)"
+                " OR (s.app_name = 'litrealms_simulator' AND s.id LIKE ? ESCAPE '\\')",
+                (session_id, f"compile_chapter_{chapter_id}", _like_prefix(f"sim_{chapter_id}_"))
+            )
+            total += sessions
+    finally:
+        conn.close()
+
+    return total
+
+
+def _like_prefix(prefix: str) -> str:
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+# Async entry points (the work above is blocking SQLite I/O)
+
+async def run_sweep(vacuum: bool = False) -> dict:
+    return await asyncio.to_thread(sweep, vacuum)
+
+
+async def delete_sessions_for_chapters(chapters: List[Tuple[str, str]]) -> int:
+    """Best-effort cascade: a failure here must not fail the delete that triggered it"""
+    try:
+        return await asyncio.to_thread(delete_chapter_sessions, chapters)
+    except Exception as e:
+        print(f"Error deleting ADK sessions for {len(chapters)} chapters: {str(e)}")
+        return 0
+
+
+_task: Optional[asyncio.Task] = None
+
+
+async def _sweeper() -> None:
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        try:
+            report = await run_sweep()
+            if report['sessions_deleted']:
+                print(f"Session GC: deleted {report['sessions_deleted']}, reclaimed {report['reclaimed_bytes']} bytes")
+        except Exception as e:
+            print(f"Error sweeping ADK sessions: {str(e)}")
+
+
+def start() -> None:
+    """Start the periodic sweeper (call from the app's startup hook)"""
+    global _task
+    if SWEEP_INTERVAL > 0:
+        _task = asyncio.create_task(_sweeper())
+
+
+def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
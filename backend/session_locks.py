@@ -0,0 +1,37 @@
+"""
+Per-session serialization for requests that drive an ADK session.
+
+Two overlapping /chat requests for one session (a double-click, a frontend retry)
+would otherwise run the agent concurrently on the same session: both read the same
+history, and ADK rejects or interleaves the second writer's events. Holding
+session_lock() for the whole turn makes them run one after another, in arrival
+order (asyncio.Lock wakes waiters first-come, first-served), instead of failing.
+
+The locks are per process. With several workers, route a session to one worker
+(sticky sessions) or keep one worker per chapter; chapter row edits are separately
+protected by the compare-and-swap version in database.update_chapter.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+_locks: Dict[str, asyncio.Lock] = {}
+_holders: Dict[str, int] = {}  # requests holding or waiting on each lock
+
+
+@asynccontextmanager
+async def session_lock(session_id: str) -> AsyncIterator[None]:
+    """Hold the session's lock for the duration of the block"""
+    lock = _locks.setdefault(session_id, asyncio.Lock())
+    _holders[session_id] = _holders.get(session_id, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        # Drop the lock once nobody needs it, so idle sessions don't accumulate
+        _holders[session_id] -= 1
+        if not _holders[session_id]:
+            del _holders[session_id]
+            del _locks[session_id]
+
@@ -0,0 +1,171 @@
+"""
+Routing of ADK sessions between durable and in-memory storage.
+
+Prologue generation, content and book validation, chapter compiles and gameplay
+simulation run one request and response through a session nobody reads again,
+yet on DatabaseSessionService each costs a session row, an event row per model
+turn and a SQLite commit for each in adk_sessions.db. SessionRouter sends the
+apps in EPHEMERAL_APPS to an EphemeralSessionService instead and everything
+else, including the 'litrealms' gameplay sessions, to the durable service.
+
+EphemeralSessionService keeps at most MAX_SESSIONS sessions, dropping the least
+recently used first, and forgets sessions idle for TTL seconds. Like the
+generation cache's memory tier it is per process; a compile that lands on
+another worker just starts a fresh compile session.
+
+LITREALMS_EPHEMERAL_SESSION_APPS replaces the app list (e.g.
+"litrealms_prologue,litrealms_validation"; "none" keeps everything durable).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+EPHEMERAL_APPS: Set[str] = {
+    'litrealms_prologue',
+    'litrealms_validation',
+    'litrealms_book_validation',
+    'litrealms_compiler',
+    'litrealms_simulator',
+}
+_apps = os.getenv("LITREALMS_EPHEMERAL_SESSION_APPS")
+if _apps is not None:
+    EPHEMERAL_APPS = set() if _apps.strip().lower() == "none" else {a.strip() for a in _apps.split(",") if a.strip()}
+
+TTL = float(os.getenv("LITREALMS_EPHEMERAL_SESSION_TTL", "3600"))  # seconds since last use
+MAX_SESSIONS = int(os.getenv("LITREALMS_EPHEMERAL_SESSION_MAX", "1000"))
+
+Key = Tuple[str, str, str]  # (app_name, user_id, session_id)
+
+
+class EphemeralSessionService(InMemorySessionService):
+    """InMemorySessionService bounded to max_sessions sessions, each living ttl seconds past its last use"""
+
+    def __init__(self, ttl: float = TTL, max_sessions: int = MAX_SESSIONS):
+        super().__init__()
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._last_used: "OrderedDict[Key, float]" = OrderedDict()  # least recently used first
+
+    def __len__(self) -> int:
+        return len(self._last_used)
+
+    def _touch(self, key: Key) -> None:
+        self._last_used[key] = time.monotonic()
+        self._last_used.move_to_end(key)
+
+    def _forget(self, key: Key) -> None:
+        self._last_used.pop(key, None)
+        app_name, user_id, session_id = key
+        users = self.sessions.get(app_name, {})
+        sessions = users.get(user_id, {})
+        sessions.pop(session_id, None)
+        # InMemorySessionService never removes emptied maps; without this they'd grow per user
+        if not sessions:
+            users.pop(user_id, None)
+            self.user_state.get(app_name, {}).pop(user_id, None)
+
+    def _evict(self, room: int = 0) -> None:
+        """Drop expired sessions, then the least recently used until `room` more fit"""
+        deadline = time.monotonic() - self.ttl
+        while self._last_used:
+            key, last_used = next(iter(self._last_used.items()))
+            if last_used > deadline and len(self._last_used) + room <= self.max_sessions:
+                break
+            self._forget(key)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        self._evict(room=1)
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._touch((app_name, user_id, session.id))
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        self._evict()
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None:
+            self._touch((app_name, user_id, session_id))
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._forget((app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        key = (session.app_name, session.user_id, session.id)
+        if key in self._last_used:
+            self._touch(key)
+        return await super().append_event(session=session, event=event)
+
+
+class SessionRouter(BaseSessionService):
+    """Sends each call to the ephemeral or the durable service by its app name"""
+
+    def __init__(self, durable: BaseSessionService, ephemeral: EphemeralSessionService, ephemeral_apps: Set[str]):
+        self.durable = durable
+        self.ephemeral = ephemeral
+        self.ephemeral_apps = ephemeral_apps
+
+    def service_for(self, app_name: str) -> BaseSessionService:
+        return self.ephemeral if app_name in self.ephemeral_apps else self.durable
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        return await self.service_for(app_name).create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        return await self.service_for(app_name).get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await self.service_for(app_name).list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.service_for(app_name).delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        return await self.service_for(session.app_name).append_event(session, event)
+
+    def status(self) -> dict:
+        return {
+            'ephemeral_apps': sorted(self.ephemeral_apps),
+            'ephemeral_sessions': len(self.ephemeral),
+        }
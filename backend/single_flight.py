@@ -0,0 +1,71 @@
+"""
+Single-flight coalescing of identical in-flight jobs.
+
+An impatient double-click on "compile", or two tabs validating the same book,
+would otherwise start the same agent run twice. run() keys each job by
+(operation, resource, content version): the first caller starts the job in its
+own task, and identical calls that arrive while it is running await the same
+result (or exception) instead of starting another.
+
+Cancellation is reference-counted: a caller that disconnects stops waiting, but
+the job keeps running for the others, and is cancelled only when its last waiter
+is gone. Coalescing is per process. Each operation's share rate is reported as
+single_flight.{operation}.shared in metrics (mean = fraction of calls that
+joined a running job).
+"""
+
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+import metrics
+
+T = TypeVar('T')
+
+Key = Tuple[str, str, str]
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+_flights: Dict[Key, _Flight] = {}
+
+
+def content_version(text: str) -> str:
+    """A version for content without one of its own: its sha256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _finished(key: Key, flight: _Flight) -> None:
+    if _flights.get(key) is flight:
+        del _flights[key]
+    if not flight.task.cancelled():
+        flight.task.exception()  # retrieved, even if every waiter had gone
+
+
+async def run(operation: str, resource: str, version: str, job: Callable[[], Awaitable[T]]) -> T:
+    """Run job(), or join the identical (operation, resource, version) job already running"""
+    key = (operation, resource, version)
+    flight = _flights.get(key)
+    metrics.observe(f"single_flight.{operation}.shared", 0 if flight is None else 1)
+    if flight is None:
+        flight = _Flight(asyncio.create_task(job()))
+        _flights[key] = flight
+        flight.task.add_done_callback(lambda _: _finished(key, flight))
+
+    flight.waiters += 1
+    try:
+        # shield: one waiter being cancelled must not cancel the job for the rest
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # Forget it now, not when the done callback runs a loop iteration
+            # later, so an identical call in between starts a fresh job instead
+            # of joining one that is being cancelled
+            if _flights.get(key) is flight:
+                del _flights[key]
+            flight.task.cancel()
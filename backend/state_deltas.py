@@ -0,0 +1,58 @@
+"""
+Compact per-turn chapter state changes.
+
+A delta is a JSON merge patch (RFC 7386): keys map to their new value, nested dicts
+(e.g. character_stats) are patched recursively, and None removes a key. A turn that
+only changes HP and XP stores {"xp": 40, "character_stats": {"hp": 55}} instead of
+the whole session state with factions, decision points and quest paths.
+
+Since None means "remove", a key whose value really is None is written as NULL
+({"$null": true}), so replaying the deltas gives back exactly the recorded state.
+"""
+
+import copy
+from typing import Any, Dict
+
+NULL = {'$null': True}  # a value that is None, as opposed to a removed key
+
+
+def diff_state(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the merge patch that turns `old` into `new` (empty if nothing changed)"""
+    delta: Dict[str, Any] = {}
+
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        if value is None:
+            delta[key] = dict(NULL)
+        elif key in old and isinstance(old[key], dict) and isinstance(value, dict):
+            nested = diff_state(old[key], value)
+            if nested:
+                delta[key] = nested
+        else:
+            delta[key] = copy.deepcopy(value)
+
+    for key in old:
+        if key not in new:
+            delta[key] = None
+
+    return delta
+
+
+def apply_delta(state: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a new state with the merge patch applied; `state` is not modified"""
+    result = copy.deepcopy(state)
+    _patch(result, delta)
+    return result
+
+
+def _patch(target: Dict[str, Any], delta: Dict[str, Any]) -> None:
+    for key, value in delta.items():
+        if value is None:
+            target.pop(key, None)
+        elif value == NULL:
+            target[key] = None
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _patch(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
@@ -0,0 +1,91 @@
+"""
+Server-Sent Events support for /chat/stream.
+
+The DM's reply ends with machine-readable blocks - [ACTIONS]...[/ACTIONS] and a
+---**CHARACTER_STATE:**...--- block - that the frontend renders as buttons and
+stat panels, not prose. TextStreamFilter forwards prose as the model produces it
+and holds back from the first block marker on; the endpoint parses the complete
+reply once the model is done and sends the blocks as typed events:
+
+    event: text     data: {"text": "..."}              (repeated)
+    event: actions  data: {"quick_actions": [...]}
+    event: state    data: {"state": {...}}
+    event: done     data: <ChatResponse>              (response is the clean, final text)
+    event: error    data: {"error": "..."}
+
+`done` carries the authoritative reply; clients should replace the streamed text
+with it (it differs only if the model wrote prose after a block).
+"""
+
+import json
+from typing import Optional
+
+_ACTIONS_MARKER = "[ACTIONS]"
+_STATE_RULE = "---"
+_STATE_HEADER = "**CHARACTER_STATE:**"
+
+_BLOCK = "block"
+_PARTIAL = "partial"
+
+
+def _classify(tail: str) -> Optional[str]:
+    """
+    Whether `tail` starts with a block marker (_BLOCK), could still turn out to once
+    more text arrives (_PARTIAL), or doesn't (None). Mirrors the patterns in
+    parse_actions and parse_character_state.
+    """
+    if tail.startswith("["):
+        if tail.startswith(_ACTIONS_MARKER):
+            return _BLOCK
+        return _PARTIAL if _ACTIONS_MARKER.startswith(tail) else None
+
+    if not tail.startswith(_STATE_RULE):
+        return _PARTIAL if _STATE_RULE.startswith(tail) else None
+
+    rest = tail[len(_STATE_RULE):].lstrip()
+    if rest.startswith(_STATE_HEADER):
+        return _BLOCK
+    if _STATE_HEADER.startswith(rest):
+        # Only whitespace or part of the header so far
+        return _PARTIAL
+    return None
+
+
+class TextStreamFilter:
+    """Incrementally pass through prose, holding back [ACTIONS] and CHARACTER_STATE blocks"""
+
+    def __init__(self):
+        self._pending = ""  # text not yet forwarded
+        self._blocked = False  # a block has started; forward nothing more
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of model output; returns the text that is safe to show now"""
+        if self._blocked:
+            return ""
+
+        self._pending += chunk
+        text = self._pending
+        for i, ch in enumerate(text):
+            if ch not in "[-":
+                continue
+            kind = _classify(text[i:])
+            if kind is None:
+                continue
+            self._blocked = kind == _BLOCK
+            self._pending = text[i:]
+            return text[:i]
+
+        self._pending = ""
+        return text
+
+    def flush(self) -> str:
+        """Release text held back only because it might have started a block"""
+        if self._blocked:
+            return ""
+        text, self._pending = self._pending, ""
+        return text
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
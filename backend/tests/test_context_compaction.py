@@ -0,0 +1,71 @@
+"""Context compaction must not carry one chapter's summary into the next chapter's session"""
+
+import asyncio
+from types import SimpleNamespace
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from assistant import context_compaction as cc
+
+
+class FakeCallbackContext:
+    def __init__(self, session_id: str, state: dict):
+        self.agent_name = 'story_writer'
+        self.state = state
+        self._invocation_context = SimpleNamespace(session=SimpleNamespace(id=session_id))
+
+
+def _history(turns: int) -> list:
+    contents = []
+    for i in range(turns):
+        contents.append(types.Content(role='user', parts=[types.Part(text=f"player turn {i}")]))
+        contents.append(types.Content(role='model', parts=[types.Part(text=f"dm turn {i}")]))
+    # The turn being answered
+    contents.append(types.Content(role='user', parts=[types.Part(text="current turn")]))
+    return contents
+
+
+def _compact(session_id: str, state: dict, turns: int) -> LlmRequest:
+    request = LlmRequest(contents=_history(turns))
+    asyncio.run(cc.compact_context(FakeCallbackContext(session_id, state), request))
+    return request
+
+
+def test_summary_does_not_leak_across_chapter_boundary(monkeypatch):
+    async def fake_generate(endpoint, prompt, model=None):
+        return "The hero crossed the river."
+    monkeypatch.setattr(cc.llm_gateway, 'generate', fake_generate)
+
+    # Chapter 1: enough turns to fold the oldest ones into a summary
+    chapter_one_state = {'level': 3}
+    request = _compact('chapter-1', chapter_one_state, cc.KEEP_TURNS + cc.SUMMARIZE_EVERY)
+    assert chapter_one_state[cc.SUMMARY_SESSION_KEY] == 'chapter-1'
+    assert chapter_one_state[cc.SUMMARY_TURNS_KEY] == cc.SUMMARIZE_EVERY + 1
+    assert "The hero crossed the river." in request.config.system_instruction
+
+    # complete_chapter seeds the next session from the stripped final state
+    carried = cc.strip_compaction_state(chapter_one_state)
+    assert carried == {'level': 3}
+
+    # Even if a stale summary reaches the next session's state, it is ignored
+    chapter_two_state = dict(chapter_one_state)
+    request = _compact('chapter-2', chapter_two_state, 3)
+    assert len(request.contents) == 7
+    assert request.contents[0].parts[0].text == "player turn 0"
+    assert not request.config.system_instruction
+
+
+def test_summary_is_reused_within_its_session(monkeypatch):
+    calls = []
+
+    async def fake_generate(endpoint, prompt, model=None):
+        calls.append(prompt)
+        return "Summary."
+    monkeypatch.setattr(cc.llm_gateway, 'generate', fake_generate)
+
+    state = {}
+    _compact('chapter-1', state, cc.KEEP_TURNS + cc.SUMMARIZE_EVERY)
+    request = _compact('chapter-1', state, cc.KEEP_TURNS + cc.SUMMARIZE_EVERY + 1)
+    assert len(calls) == 1
+    assert request.contents[0].parts[0].text == f"player turn {cc.SUMMARIZE_EVERY + 1}"
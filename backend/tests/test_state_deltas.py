@@ -0,0 +1,35 @@
+"""Chapter state deltas must replay to exactly the recorded state"""
+
+from state_deltas import NULL, apply_delta, diff_state
+
+
+def _round_trip(old: dict, new: dict) -> dict:
+    return apply_delta(old, diff_state(old, new))
+
+
+def test_only_changed_keys_are_stored():
+    old = {'xp': 10, 'character_stats': {'hp': 60, 'mp': 20}, 'factions': ['guild']}
+    new = {'xp': 40, 'character_stats': {'hp': 55, 'mp': 20}, 'factions': ['guild']}
+    assert diff_state(old, new) == {'xp': 40, 'character_stats': {'hp': 55}}
+    assert _round_trip(old, new) == new
+
+
+def test_removed_keys_are_removed():
+    old = {'xp': 10, 'quest': 'find the key', 'character_stats': {'hp': 60, 'poisoned': True}}
+    new = {'xp': 10, 'character_stats': {'hp': 60}}
+    assert _round_trip(old, new) == new
+
+
+def test_none_values_are_kept():
+    old = {'xp': 10, 'companion': 'Mira', 'character_stats': {'hp': 60}}
+    new = {'xp': 10, 'companion': None, 'active_quest': None, 'character_stats': {'hp': 60, 'status': None}}
+    delta = diff_state(old, new)
+    assert delta['companion'] == NULL
+    assert _round_trip(old, new) == new
+    # and a None that stays None isn't stored again
+    assert diff_state(new, new) == {}
+
+
+def test_legacy_null_still_removes():
+    # Deltas recorded before NULL existed use null for a removed key
+    assert apply_delta({'xp': 10, 'quest': 'x'}, {'quest': None}) == {'xp': 10}
@@ -0,0 +1,19 @@
+"""
+Helpers for the machine-readable blocks the DM appends to its replies.
+
+[ACTIONS]...[/ACTIONS] and ---**CHARACTER_STATE:**...--- are parsed by the
+backend (see parse_actions and parse_character_state in main.py) and are
+noise anywhere else - in prompt history, summaries or search.
+"""
+
+import re
+
+ACTIONS_BLOCK = re.compile(r'\[ACTIONS\](.*?)\[/ACTIONS\]', re.DOTALL)
+CHARACTER_STATE_BLOCK = re.compile(r'---\s*\*\*CHARACTER_STATE:\*\*.*?---', re.DOTALL)
+
+
+def strip_blocks(text: str) -> str:
+    """Remove [ACTIONS] and CHARACTER_STATE blocks from a DM message"""
+    text = CHARACTER_STATE_BLOCK.sub('', text)
+    text = ACTIONS_BLOCK.sub('', text)
+    return text.strip()
@@ -0,0 +1,129 @@
+"""
+Write-behind persistence for chat turns.
+
+/chat used to look up the chapter and write the turn before responding. Now it
+hands the turn (messages plus parsed state) to submit() and returns; a background
+task drains the queue and writes whatever has accumulated as one transaction on
+the async_db writer thread, so a burst of turns from many users costs one commit
+instead of one each.
+
+Ordering: there is one consumer and one writer thread, so turns are written in
+submission order, which keeps every chapter's turns in order.
+
+Visibility: a turn may not be in the database for a few milliseconds after /chat
+returns. Endpoints that read transcripts or chapter state call flush() first,
+which waits for everything submitted so far to be written.
+
+Durability: stop() (called from the shutdown hook) drains the queue before the
+writer thread is shut down. A hard crash can lose turns that were still queued;
+the ADK session keeps its own copy of the conversation.
+"""
+
+import asyncio
+import os
+from typing import List, Optional, Tuple
+
+import async_db as adb
+import database as db
+
+MAX_BATCH = int(os.getenv("LITREALMS_WRITE_BEHIND_MAX_BATCH", "200"))  # turns per transaction
+MAX_DELAY = float(os.getenv("LITREALMS_WRITE_BEHIND_MAX_DELAY_MS", "20")) / 1000  # wait for more turns
+MAX_PENDING = int(os.getenv("LITREALMS_WRITE_BEHIND_MAX_PENDING", "5000"))  # submit() blocks beyond this
+
+# (session_id, messages, state after the turn)
+TurnRecord = Tuple[str, list, dict]
+
+_queue: Optional[asyncio.Queue] = None
+_task: Optional[asyncio.Task] = None
+_written: Optional[asyncio.Condition] = None
+_submitted = 0  # turns accepted by submit()
+_flushed = 0  # turns written (or dropped after an error), always a prefix of the submissions
+
+
+def _persist(batch: List[TurnRecord]) -> None:
+    """Write a batch of turns; runs inside one transaction on the writer thread"""
+    turns_by_chapter = {}
+    for session_id, messages, state in batch:
+        chapter_id = db.get_chapter_id_by_session_id(session_id)
+        if chapter_id:  # Onboarding sessions have no chapter to record into
+            turns_by_chapter.setdefault(chapter_id, []).append((messages, state))
+
+    for chapter_id, turns in turns_by_chapter.items():
+        db.record_chapter_turns(chapter_id, turns)
+
+
+async def _write_batch(batch: List[TurnRecord]) -> None:
+    global _flushed
+    try:
+        await adb.run_in_transaction(_persist, batch)
+    except Exception as e:
+        # One bad turn (e.g. its chapter was deleted mid-write) shouldn't take the batch with it
+        print(f"Error writing batch of {len(batch)} chat turns, retrying individually: {str(e)}")
+        for record in batch:
+            try:
+                await adb.run_in_transaction(_persist, [record])
+            except Exception as e:
+                print(f"Dropping chat turn for session {record[0]}: {str(e)}")
+
+    async with _written:
+        _flushed += len(batch)
+        _written.notify_all()
+
+
+async def _run() -> None:
+    while True:
+        batch = [await _queue.get()]
+        if MAX_DELAY > 0 and _queue.qsize() < MAX_BATCH:
+            # Give concurrent turns a moment to join this transaction
+            await asyncio.sleep(MAX_DELAY)
+        while len(batch) < MAX_BATCH and not _queue.empty():
+            batch.append(_queue.get_nowait())
+        await _write_batch(batch)
+
+
+def start() -> None:
+    """Start the background writer (call from the app's startup hook)"""
+    global _queue, _task, _written
+    _queue = asyncio.Queue(maxsize=MAX_PENDING)
+    _written = asyncio.Condition()
+    _task = asyncio.create_task(_run())
+
+
+async def submit(session_id: str, messages: list, state: dict) -> None:
+    """
+    Queue a chat turn for the chapter recorded against `session_id`.
+    Returns once the turn is queued, not written. Without a running writer
+    (scripts, benchmarks) the turn is written immediately.
+    """
+    global _submitted
+    if _task is None or _task.done():
+        await adb.run_in_transaction(_persist, [(session_id, messages, state)])
+        return
+
+    _submitted += 1
+    await _queue.put((session_id, messages, state))
+
+
+async def flush() -> None:
+    """Wait until every turn submitted before this call has been written"""
+    if _task is None or _task.done():
+        return
+
+    target = _submitted
+    async with _written:
+        await _written.wait_for(lambda: _flushed >= target)
+
+
+async def stop() -> None:
+    """Write out everything still queued and stop the background writer"""
+    global _task
+    if _task is None:
+        return
+
+    await flush()
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -4,9 +4,12 @@ import { use, useState, useEffect, useRef, useCallback } from 'react';
 import { useRouter } from 'next/navigation';
 import Header from '@/components/shared/Header';
 import BottomSheet from '@/components/shared/BottomSheet';
-import { sendChatMessage, ChatResponse, QuickAction, getChapter, compileChapter, compileChapterDmNarrative, updateChapter, completeChapter, deleteChapter, validateContent, ContentValidationResponse, getBook, simulateGameplay, generateChapterTitle } from '@/lib/api';
+import { sendChatMessage, sendChatMessageStream, ChatResponse, QuickAction, getChapter, getChapterMessages, compileChapter, compileChapterDmNarrative, updateChapter, completeChapter, deleteChapter, validateContent, ContentValidationResponse, getBook, simulateGameplay, generateChapterTitle } from '@/lib/api';
 import { Chapter } from '@/lib/types/game';
 
+// Transcript messages loaded when the chapter opens, and per scroll-back page
+const TRANSCRIPT_PAGE_SIZE = 50;
+
 interface PageProps {
   params: Promise<{ bookId: string; chapterId: string }>;
 }
@@ -45,6 +48,11 @@ export default function ChapterPage({ params }: PageProps) {
   const [editedTitle, setEditedTitle] = useState('');
   const [isGeneratingTitle, setIsGeneratingTitle] = useState(false);
   const titleInputRef = useRef<HTMLInputElement>(null);
+  const chatScrollRef = useRef<HTMLDivElement>(null);
+  const oldestSeqRef = useRef<number | null>(null);
+  const isPrependingRef = useRef(false);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
 
   // Load chapter data
   useEffect(() => {
@@ -54,7 +62,8 @@ export default function ChapterPage({ params }: PageProps) {
       hasInitialized.current = true;
 
       try {
-        const chapterData = await getChapter(chapterId);
+        // Open with the latest turns; older ones are paged in on scroll
+        const chapterData = await getChapter(chapterId, { transcriptLimit: TRANSCRIPT_PAGE_SIZE });
         setChapter(chapterData);
 
         // Load transcript as messages
@@ -62,6 +71,8 @@ export default function ChapterPage({ params }: PageProps) {
           role: msg.role,
           content: msg.content
         })));
+        oldestSeqRef.current = chapterData.game_transcript[0]?.seq ?? null;
+        setHasOlderMessages(chapterData.transcript_has_more);
 
         // Extract quick_actions from the last assistant message (if available)
         const lastAssistantMessage = [...chapterData.game_transcript]
@@ -194,8 +205,51 @@ export default function ChapterPage({ params }: PageProps) {
     };
   }, [hasUnsavedChanges, activeTab, chapter, isSaving, authoredContent, router]);
 
+  // Page in older transcript messages, keeping the visible ones in place
+  const loadOlderMessages = useCallback(async () => {
+    if (isLoadingOlder || !hasOlderMessages || oldestSeqRef.current === null) return;
+
+    setIsLoadingOlder(true);
+    try {
+      const page = await getChapterMessages(chapterId, {
+        before: oldestSeqRef.current,
+        limit: TRANSCRIPT_PAGE_SIZE
+      });
+      if (page.messages.length > 0) {
+        oldestSeqRef.current = page.messages[0].seq;
+        const container = chatScrollRef.current;
+        const previousHeight = container?.scrollHeight ?? 0;
+
+        isPrependingRef.current = true;
+        setMessages(prev => [
+          ...page.messages.map(msg => ({ role: msg.role, content: msg.content })),
+          ...prev
+        ]);
+        requestAnimationFrame(() => {
+          if (container) container.scrollTop += container.scrollHeight - previousHeight;
+        });
+      }
+      setHasOlderMessages(page.has_more);
+    } catch (error) {
+      console.error('Error loading earlier messages:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  }, [chapterId, hasOlderMessages, isLoadingOlder]);
+
+  const handleChatScroll = useCallback((e: React.UIEvent<HTMLDivElement>) => {
+    if (e.currentTarget.scrollTop < 200) {
+      loadOlderMessages();
+    }
+  }, [loadOlderMessages]);
+
   // Auto-scroll user message to top when new messages arrive
   useEffect(() => {
+    if (isPrependingRef.current) {
+      // Older history was added above; leave the scroll position alone
+      isPrependingRef.current = false;
+      return;
+    }
     if (messages.length > 0 && messages[messages.length - 1].role === 'assistant') {
       userMessageRef.current?.scrollIntoView({ behavior: 'smooth', block: 'start' });
     }
@@ -213,11 +267,20 @@ export default function ChapterPage({ params }: PageProps) {
     setUserInput('');
 
     try {
-      // Use the chapter's session_id
-      const response = await sendChatMessage(userMessage, chapter.session_id);
+      // Use the chapter's session_id, showing the DM's reply as it is written
+      let streamed = '';
+      const response = await sendChatMessageStream(userMessage, chapter.session_id, (text) => {
+        const started = streamed === '';
+        streamed += text;
+        setMessages(prev => started
+          ? [...prev, { role: 'assistant', content: streamed }]
+          : [...prev.slice(0, -1), { role: 'assistant', content: streamed }]);
+      });
 
-      // Add assistant response to chat
-      setMessages(prev => [...prev, { role: 'assistant', content: response.response }]);
+      // Replace the streamed text with the final response
+      setMessages(prev => streamed
+        ? [...prev.slice(0, -1), { role: 'assistant', content: response.response }]
+        : [...prev, { role: 'assistant', content: response.response }]);
 
       // Update quick actions and game state
       setQuickActions(response.quick_actions || []);
@@ -284,17 +347,19 @@ export default function ChapterPage({ params }: PageProps) {
 
     setIsSaving(true);
     try {
-      await updateChapter(chapter.id, {
-        authored_content: authoredContent
+      const updated = await updateChapter(chapter.id, {
+        authored_content: authoredContent,
+        version: chapter.version
       });
 
+      setChapter({ ...chapter, version: updated.version });
       setOriginalContent(authoredContent);
       setHasUnsavedChanges(false);
       setSaveMessage('💾 Draft saved successfully!');
       setTimeout(() => setSaveMessage(''), 3000);
     } catch (error) {
       console.error('Error saving chapter:', error);
-      setSaveMessage('❌ Failed to save. Please try again.');
+      setSaveMessage(`❌ ${error instanceof Error ? error.message : 'Failed to save. Please try again.'}`);
       setTimeout(() => setSaveMessage(''), 3000);
     } finally {
       setIsSaving(false);
@@ -315,9 +380,11 @@ export default function ChapterPage({ params }: PageProps) {
       const result = await simulateGameplay(chapter.id);
 
       // Reload the chapter to show new messages
-      const updatedChapter = await getChapter(chapterId);
+      const updatedChapter = await getChapter(chapterId, { transcriptLimit: TRANSCRIPT_PAGE_SIZE });
       setChapter(updatedChapter);
       setMessages(updatedChapter.game_transcript);
+      oldestSeqRef.current = updatedChapter.game_transcript[0]?.seq ?? null;
+      setHasOlderMessages(updatedChapter.transcript_has_more);
       setGameState(result.final_state);
 
       setSaveMessage(`🎮 Generated ${result.turns_added} simulated gameplay turns!`);
@@ -348,8 +415,8 @@ export default function ChapterPage({ params }: PageProps) {
     if (!chapter || !editedTitle.trim()) return;
 
     try {
-      await updateChapter(chapter.id, { title: editedTitle.trim() });
-      setChapter({ ...chapter, title: editedTitle.trim() });
+      const updated = await updateChapter(chapter.id, { title: editedTitle.trim() });
+      setChapter({ ...chapter, title: editedTitle.trim(), version: updated.version });
       setIsEditingTitle(false);
       setSaveMessage('✓ Title updated');
       setTimeout(() => setSaveMessage(''), 2000);
@@ -401,7 +468,7 @@ export default function ChapterPage({ params }: PageProps) {
 
     try {
       // Fetch book to get game configuration
-      const book = await getBook(bookId);
+      const book = await getBook(bookId, { includeTranscripts: false });
 
       // Build validation request
       const validationRequest = {
@@ -815,7 +882,7 @@ export default function ChapterPage({ params }: PageProps) {
 
             {/* Game Tab Content */}
             {activeTab === 'game' && (
-            <div className="flex-1 overflow-y-auto px-4 pb-48">
+            <div ref={chatScrollRef} onScroll={handleChatScroll} className="flex-1 overflow-y-auto px-4 pb-48">
           {/* Chapter Title */}
           <div className="py-6 border-b" style={{ borderColor: 'var(--tw-mist-gray)' }}>
             <div className="flex items-start justify-between gap-4">
@@ -907,6 +974,18 @@ export default function ChapterPage({ params }: PageProps) {
 
           {/* Chat Messages */}
           <div className="flex-1 py-6 space-y-6">
+            {hasOlderMessages && (
+              <div className="text-center">
+                <button
+                  onClick={loadOlderMessages}
+                  disabled={isLoadingOlder}
+                  className="text-sm underline disabled:opacity-50"
+                  style={{ color: 'var(--tw-wave-blue)' }}
+                >
+                  {isLoadingOlder ? 'Loading earlier turns...' : 'Load earlier turns'}
+                </button>
+              </div>
+            )}
             {messages.map((msg, idx) => (
               <div key={idx} ref={msg.role === 'user' ? userMessageRef : null}>
                 <div className={`flex items-start space-x-3 ${
@@ -946,7 +1025,7 @@ export default function ChapterPage({ params }: PageProps) {
               </div>
             ))}
 
-            {isLoading && (
+            {isLoading && messages[messages.length - 1]?.role !== 'assistant' && (
               <div className="flex items-start space-x-3">
                 <div className="w-8 h-8 rounded-full flex items-center justify-center text-white text-sm font-medium" style={{ background: 'linear-gradient(to bottom right, var(--tw-sapphire-blue), var(--tw-wave-blue))' }}>
                   DM
@@ -34,7 +34,7 @@ export default function BookOverviewPage({ params }: PageProps) {
 
       try {
         setIsLoading(true);
-        const bookData = await getBook(bookId);
+        const bookData = await getBook(bookId, { includeTranscripts: false });
         setBook(bookData);
       } catch (err) {
         console.error('Error loading book:', err);
@@ -122,7 +122,7 @@ export default function BookOverviewPage({ params }: PageProps) {
       await deleteChapter(chapterToDelete);
 
       // Refresh the book data to show updated chapter list
-      const updatedBook = await getBook(bookId);
+      const updatedBook = await getBook(bookId, { includeTranscripts: false });
       setBook(updatedBook);
 
       setSuccessMessage('Chapter deleted successfully');
@@ -76,7 +76,7 @@ export default function ReadingModePage({ params }: PageProps) {
 
       try {
         setIsLoading(true);
-        const bookData = await getBook(bookId);
+        const bookData = await getBook(bookId, { includeTranscripts: false });
         setBook(bookData);
       } catch (err) {
         console.error('Error loading book:', err);
@@ -189,12 +189,13 @@ export default function OnboardingStepPage({ params }: PageProps) {
   };
 
   // Prologue generation handler for Step 4
-  const handleGeneratePrologue = async (questTemplate: any, tone: any, customPrompt?: string) => {
+  const handleGeneratePrologue = async (questTemplate: any, tone: any, customPrompt?: string, regenerate?: boolean) => {
     try {
       // Build request with all onboarding context for stateless generation
       const response = await generatePrologue({
         quest_template: questTemplate,
         custom_prompt: customPrompt,
+        regenerate,
         // Pass onboarding data for context
         mode: draftConfig.mode,
         tone: tone,
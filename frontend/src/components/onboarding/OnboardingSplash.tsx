@@ -2,14 +2,14 @@
 
 import { useRouter } from 'next/navigation';
 import { useState, useEffect } from 'react';
-import { listBooks, deleteBook, getBook, type BookResponse } from '@/lib/api';
+import { listBooks, deleteBook, getBook, type BookSummaryResponse } from '@/lib/api';
 import jsPDF from 'jspdf';
 
 export default function OnboardingSplash() {
   const router = useRouter();
-  const [books, setBooks] = useState<BookResponse[]>([]);
+  const [books, setBooks] = useState<BookSummaryResponse[]>([]);
   const [isLoadingBooks, setIsLoadingBooks] = useState(true);
-  const [bookToDelete, setBookToDelete] = useState<BookResponse | null>(null);
+  const [bookToDelete, setBookToDelete] = useState<BookSummaryResponse | null>(null);
   const [isDeleting, setIsDeleting] = useState(false);
   const [exportingBookId, setExportingBookId] = useState<string | null>(null);
 
@@ -28,7 +28,7 @@ export default function OnboardingSplash() {
     loadBooks();
   }, []);
 
-  const handleDeleteClick = (e: React.MouseEvent, book: BookResponse) => {
+  const handleDeleteClick = (e: React.MouseEvent, book: BookSummaryResponse) => {
     e.stopPropagation();
     setBookToDelete(book);
   };
@@ -53,14 +53,14 @@ export default function OnboardingSplash() {
     setBookToDelete(null);
   };
 
-  const handleExportBook = async (e: React.MouseEvent, book: BookResponse) => {
+  const handleExportBook = async (e: React.MouseEvent, book: BookSummaryResponse) => {
     e.stopPropagation();
 
     try {
       setExportingBookId(book.id);
 
       // Get fresh book data with all chapters
-      const fullBook = await getBook(book.id);
+      const fullBook = await getBook(book.id, { includeTranscripts: false });
 
       const doc = new jsPDF();
 
@@ -7,7 +7,7 @@ import { ContentValidationResponse } from '@/lib/api';
 interface StepFourProps {
   initialData?: Partial<StoryConfig> & { tone?: Tone };
   onDataChange: (data: Partial<StoryConfig> & { tone?: Tone }) => void;
-  onGeneratePrologue: (questTemplate: QuestType, tone: Tone, customPrompt?: string) => Promise<void>;
+  onGeneratePrologue: (questTemplate: QuestType, tone: Tone, customPrompt?: string, regenerate?: boolean) => Promise<void>;
   onValidatePrologue: (prologueText: string, questTemplate: QuestType, tone: Tone) => Promise<void>;
   prologueRef: React.RefObject<HTMLDivElement | null>;
   validationResults?: ContentValidationResponse | null;
@@ -134,7 +134,8 @@ export default function StepFour({ initialData, onDataChange, onGeneratePrologue
 
     setIsGenerating(true);
     try {
-      await onGeneratePrologue(selectedQuest, selectedTone, customPrompt || undefined);
+      // This is the "Regenerate" button, so ask for a fresh prologue rather than the cached one
+      await onGeneratePrologue(selectedQuest, selectedTone, customPrompt || undefined, true);
       // Note: The parent component should update initialData.prologue, which will update generatedPrologue
       setCustomPrompt(''); // Clear custom prompt after generation
       setIsEditing(false);
@@ -70,6 +70,61 @@ export async function sendChatMessage(
   return response.json();
 }
 
+// Like sendChatMessage, but calls onText with the DM's reply as it is written.
+// Resolves with the final response, whose text replaces what was streamed.
+export async function sendChatMessageStream(
+  message: string,
+  sessionId: string | undefined,
+  onText: (text: string) => void
+): Promise<ChatResponse> {
+  const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      message,
+      session_id: sessionId,
+    }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`API error: ${response.statusText}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = raw.match(/^data: (.*)$/m)?.[1];
+      if (!event || data === undefined) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'text') {
+        onText(payload.text);
+      } else if (event === 'done') {
+        return payload as ChatResponse;
+      } else if (event === 'error') {
+        throw new Error(`API error: ${payload.error}`);
+      }
+    }
+  }
+
+  throw new Error('API error: stream ended before the response was complete');
+}
+
 export async function healthCheck(): Promise<{ status: string }> {
   const response = await fetch(`${API_BASE_URL}/health`);
   return response.json();
@@ -129,6 +184,7 @@ export interface PrologueGenerationResponse {
 export interface PrologueGenerationRequest {
   quest_template: QuestType;
   custom_prompt?: string;
+  regenerate?: boolean;  // skip the server's cache of identical requests
   // Onboarding context (optional - used for stateless generation)
   mode?: string;
   tone?: string;
@@ -177,6 +233,7 @@ export interface ContentValidationRequest {
   alignment: string;
   character_role: string;
   quest_template: string;
+  regenerate?: boolean;  // skip the server's cache of identical requests
 }
 
 export async function validateContent(
@@ -353,7 +410,29 @@ export interface BookResponse {
   total_word_count: number;
 }
 
-export async function listBooks(): Promise<BookResponse[]> {
+// Library listing entry - chapter headers only, no transcripts or state
+export interface BookSummaryResponse {
+  id: string;
+  user_id: string;
+  title: string;
+  subtitle?: string;
+  game_config: GameConfig;
+  chapters: Array<{
+    id: string;
+    number: number;
+    title: string;
+    status: 'draft' | 'in_progress' | 'complete' | 'published';
+    word_count: number;
+    last_edited: string;
+    created_at: string;
+    updated_at: string;
+  }>;
+  created_at: string;
+  updated_at: string;
+  total_word_count: number;
+}
+
+export async function listBooks(): Promise<BookSummaryResponse[]> {
   const response = await fetch(`${API_BASE_URL}/books`);
 
   if (!response.ok) {
@@ -363,8 +442,29 @@ export async function listBooks(): Promise<BookResponse[]> {
   return response.json();
 }
 
-export async function getBook(bookId: string): Promise<BookResponse> {
-  const response = await fetch(`${API_BASE_URL}/books/${bookId}`);
+// One page of the library, newest first; pass nextCursor back to get the following page
+export async function listBooksPage(
+  limit: number,
+  cursor?: string
+): Promise<{ books: BookSummaryResponse[]; nextCursor: string | null }> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set('cursor', cursor);
+
+  const response = await fetch(`${API_BASE_URL}/books?${params}`);
+
+  if (!response.ok) {
+    throw new Error(`Failed to list books: ${response.statusText}`);
+  }
+
+  return { books: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+}
+
+export async function getBook(
+  bookId: string,
+  options: { includeTranscripts?: boolean } = {}
+): Promise<BookResponse> {
+  const query = options.includeTranscripts === false ? '?include_transcripts=false' : '';
+  const response = await fetch(`${API_BASE_URL}/books/${bookId}${query}`);
 
   if (!response.ok) {
     throw new Error(`Failed to get book: ${response.statusText}`);
@@ -408,8 +508,9 @@ export async function updateBook(bookId: string, updates: UpdateBookRequest): Pr
 }
 
 // Chapter API
-export async function getChapter(chapterId: string) {
-  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}`);
+export async function getChapter(chapterId: string, options: { transcriptLimit?: number } = {}) {
+  const query = options.transcriptLimit ? `?transcript_limit=${options.transcriptLimit}` : '';
+  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}${query}`);
 
   if (!response.ok) {
     throw new Error(`Failed to get chapter: ${response.statusText}`);
@@ -418,6 +519,38 @@ export async function getChapter(chapterId: string) {
   return response.json();
 }
 
+export interface TranscriptMessage {
+  role: 'user' | 'assistant';
+  content: string;
+  timestamp: string;
+  seq: number;
+  quick_actions?: QuickAction[] | null;
+}
+
+export interface TranscriptPage {
+  messages: TranscriptMessage[]; // oldest first
+  has_more: boolean;
+}
+
+// Page through a chapter transcript by message seq: `before` scrolls back, `after` catches up
+export async function getChapterMessages(
+  chapterId: string,
+  options: { before?: number; after?: number; limit?: number } = {}
+): Promise<TranscriptPage> {
+  const params = new URLSearchParams();
+  if (options.before !== undefined) params.set('before', String(options.before));
+  if (options.after !== undefined) params.set('after', String(options.after));
+  if (options.limit !== undefined) params.set('limit', String(options.limit));
+
+  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}/messages?${params}`);
+
+  if (!response.ok) {
+    throw new Error(`Failed to get chapter messages: ${response.statusText}`);
+  }
+
+  return response.json();
+}
+
 export interface ChapterCompilationResponse {
   narrative: string;
   chapter_id: string;
@@ -425,30 +558,75 @@ export interface ChapterCompilationResponse {
   compiled_at: string;
 }
 
-export async function compileChapter(chapterId: string): Promise<ChapterCompilationResponse> {
-  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}/compile`, {
-    method: 'POST',
-  });
+// Background jobs: long operations are submitted with ?async=true and polled, so they
+// don't depend on one HTTP request staying open for minutes
+export interface Job {
+  id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+  progress: number;
+  progress_message?: string | null;
+  attempts: number;
+  max_attempts: number;
+  error?: string | null;
+  created_at: string;
+  updated_at: string;
+  finished_at?: string | null;
+}
 
-  if (!response.ok) {
-    throw new Error(`Failed to compile chapter: ${response.statusText}`);
-  }
+const JOB_POLL_INTERVAL_MS = 2000;
 
-  return response.json();
+async function runJob<T>(
+  path: string,
+  method: string,
+  failureMessage: string,
+  onProgress?: (job: Job) => void
+): Promise<T> {
+  const separator = path.includes('?') ? '&' : '?';
+  const submitted = await fetch(`${API_BASE_URL}${path}${separator}async=true`, { method });
+  if (!submitted.ok) {
+    throw new Error(`${failureMessage}: ${submitted.statusText}`);
+  }
+  const job: Job = await submitted.json();
+
+  while (true) {
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const response = await fetch(`${API_BASE_URL}/jobs/${job.id}/result`);
+    if (response.status === 202) {
+      onProgress?.(await response.json());
+      continue;
+    }
+    if (!response.ok) {
+      const body = await response.json().catch(() => null);
+      throw new Error(`${failureMessage}: ${body?.detail?.error || response.statusText}`);
+    }
+    return response.json();
+  }
 }
 
-export async function compileChapterDmNarrative(chapterId: string): Promise<ChapterCompilationResponse> {
-  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}/compile-dm-narrative`, {
-    method: 'POST',
-  });
+export async function cancelJob(jobId: string): Promise<Job> {
+  const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/cancel`, { method: 'POST' });
 
   if (!response.ok) {
-    throw new Error(`Failed to compile chapter DM narrative: ${response.statusText}`);
+    throw new Error(`Failed to cancel job: ${response.statusText}`);
   }
 
   return response.json();
 }
 
+// revisePrevious: revise the chapter's current authored content instead of compiling from scratch
+export async function compileChapter(chapterId: string, revisePrevious = false): Promise<ChapterCompilationResponse> {
+  return runJob(
+    `/chapters/${chapterId}/compile?revise_previous=${revisePrevious}`, 'POST', 'Failed to compile chapter'
+  );
+}
+
+export async function compileChapterDmNarrative(chapterId: string, revisePrevious = false): Promise<ChapterCompilationResponse> {
+  return runJob(
+    `/chapters/${chapterId}/compile-dm-narrative?revise_previous=${revisePrevious}`, 'POST', 'Failed to compile chapter DM narrative'
+  );
+}
+
 export interface SimulateGameplayResponse {
   success: boolean;
   message: string;
@@ -457,21 +635,14 @@ export interface SimulateGameplayResponse {
 }
 
 export async function simulateGameplay(chapterId: string): Promise<SimulateGameplayResponse> {
-  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}/simulate-gameplay`, {
-    method: 'POST',
-  });
-
-  if (!response.ok) {
-    throw new Error(`Failed to simulate gameplay: ${response.statusText}`);
-  }
-
-  return response.json();
+  return runJob(`/chapters/${chapterId}/simulate-gameplay`, 'POST', 'Failed to simulate gameplay');
 }
 
 export interface UpdateChapterRequest {
   authored_content?: string;
   title?: string;
   status?: 'draft' | 'in_progress' | 'complete' | 'published';
+  version?: number; // Only save if the chapter is still at this version
 }
 
 export async function updateChapter(chapterId: string, updates: UpdateChapterRequest) {
@@ -483,6 +654,10 @@ export async function updateChapter(chapterId: string, updates: UpdateChapterReq
     body: JSON.stringify(updates),
   });
 
+  if (response.status === 409) {
+    throw new Error('This chapter was changed elsewhere since you opened it. Reload to see the latest version.');
+  }
+
   if (!response.ok) {
     throw new Error(`Failed to update chapter: ${response.statusText}`);
   }
@@ -495,8 +670,8 @@ export interface GenerateTitleResponse {
   generated_title: string;
 }
 
-export async function generateChapterTitle(chapterId: string): Promise<GenerateTitleResponse> {
-  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}/generate-title`, {
+export async function generateChapterTitle(chapterId: string, regenerate = false): Promise<GenerateTitleResponse> {
+  const response = await fetch(`${API_BASE_URL}/chapters/${chapterId}/generate-title${regenerate ? '?regenerate=true' : ''}`, {
     method: 'POST',
   });
 
@@ -591,12 +766,44 @@ export interface BookValidationResponse {
 }
 
 export async function validateBook(bookId: string): Promise<BookValidationResponse> {
-  const response = await fetch(`${API_BASE_URL}/books/${bookId}/validate`, {
-    method: 'POST',
-  });
+  return runJob(`/books/${bookId}/validate`, 'POST', 'Failed to validate book');
+}
+
+// Full-text search
+export interface SearchHit {
+  book_id: string;
+  book_title: string;
+  chapter_id: string;
+  chapter_number: number;
+  chapter_title: string;
+  kind: 'message' | 'authored' | 'summary';
+  message_seq: number | null;
+  snippet: string;
+  highlights: [number, number][]; // [start, end) offsets of matched terms in snippet
+  score: number;
+}
+
+export interface SearchResponse {
+  query: string;
+  total: number;
+  limit: number;
+  offset: number;
+  results: SearchHit[];
+}
+
+export async function searchLibrary(
+  query: string,
+  options: { bookId?: string; limit?: number; offset?: number } = {}
+): Promise<SearchResponse> {
+  const params = new URLSearchParams({ q: query });
+  if (options.limit !== undefined) params.set('limit', String(options.limit));
+  if (options.offset !== undefined) params.set('offset', String(options.offset));
+
+  const path = options.bookId ? `/books/${options.bookId}/search` : '/search';
+  const response = await fetch(`${API_BASE_URL}${path}?${params}`);
 
   if (!response.ok) {
-    throw new Error(`Failed to validate book: ${response.statusText}`);
+    throw new Error(`Failed to search: ${response.statusText}`);
   }
 
   return response.json();
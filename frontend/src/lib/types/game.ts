@@ -169,6 +169,7 @@ export interface GameMessage {
   role: 'user' | 'assistant';
   content: string;
   timestamp: string;
+  seq?: number; // Position in the chapter transcript
 }
 
 export type ChapterStatus = 'draft' | 'in_progress' | 'complete' | 'published';
@@ -183,6 +184,8 @@ export interface Chapter {
   // Gameplay data
   session_id: string;
   game_transcript: GameMessage[];
+  transcript_has_more?: boolean; // Older messages exist beyond a windowed game_transcript
+  version?: number; // Bumped by every edit; send it back to detect conflicting saves
   initial_state: Record<string, any>;
   final_state: Record<string, any>;
 